@@ -1,6 +1,10 @@
+import numpy as np
+
+from . import bitarrayhelper as bah
 from .key import Key
 from .configuration import Configuration_v1, Configuration_v2, Configuration_v2b, Configuration_Lightpix_v1
 from .packet import Packet_v1, Packet_v2
+from .packet import parity
 
 class Chip(object):
     '''
@@ -74,18 +78,13 @@ class Chip(object):
         conf = self.config
         if registers is None:
             registers = range(conf.num_registers)
+        if self.asic_version != 1:
+            return self._get_configuration_packets_v2(packet_type, registers)
         packets = []
-        if self.asic_version == 1:
-            packet_register_data = enumerate(conf.all_data())
-        elif self.asic_version in (2, 'lightpix-1', '2b'):
-            packet_register_data = zip(*conf.some_data(registers))
-        for i, data in packet_register_data:
+        for i, data in enumerate(conf.all_data()):
             if i not in registers:
                 continue
-            if self.asic_version == 1:
-                packet = Packet_v1()
-            else:
-                packet = Packet_v2()
+            packet = Packet_v1()
             packet.packet_type = packet_type
             packet.chip_id = self.chip_id
             packet.chip_key = self.chip_key
@@ -100,6 +99,38 @@ class Chip(object):
             packets.append(packet)
         return packets
 
+    def _get_configuration_packets_v2(self, packet_type, registers):
+        '''
+        Build the v2 configuration packets as an array of 64-bit words and
+        assign the parity of all packets in one pass
+
+        '''
+        if packet_type not in (Packet_v2.CONFIG_WRITE_PACKET,
+                Packet_v2.CONFIG_READ_PACKET):
+            raise ValueError('incorrect packet_type for configuration packets')
+        addrs, data = [], []
+        for i, register_data in zip(*self.config.some_data(registers)):
+            if i not in registers:
+                continue
+            addrs.append(i)
+            if packet_type == Packet_v2.CONFIG_WRITE_PACKET:
+                data.append(bah.touint(register_data, endian=Packet_v2.endian))
+            else:
+                data.append(0)
+        words = np.zeros(len(addrs), dtype=np.uint64)
+        for (shift, mask), values in (
+                (Packet_v2._packet_type_shift_mask, packet_type),
+                (Packet_v2._chip_id_shift_mask, self.chip_id),
+                (Packet_v2._register_address_shift_mask, addrs),
+                (Packet_v2._register_data_shift_mask, data)):
+            words |= (np.asarray(values, dtype=np.uint64) & np.uint64(mask)) \
+                << np.uint64(shift)
+        packets = parity.words_to_packets(parity.assign_parity(words))
+        chip_key = self.chip_key
+        for packet in packets:
+            packet.chip_key = chip_key
+        return packets
+
     def get_configuration_write_packets(self, registers=None):
         '''
         Return a list of Packet objects to write corresponding to the specified
@@ -45,12 +45,16 @@ class BaseConfiguration_v2(BaseConfiguration):
         '''
         bits = []
         addrs = []
+        # multi-address registers are only generated once
+        register_data_cache = dict()
         for register in registers:
             if isinstance(register, int):
                 register_name = self.register_map_inv[register][0]
-                register_data = getattr(self, register_name+'_data')
             elif isinstance(register, str):
-                register_data = getattr(self, register+'_data')
+                register_name = register
+            if register_name not in register_data_cache:
+                register_data_cache[register_name] = getattr(self, register_name+'_data')
+            register_data = register_data_cache[register_name]
             for register_addr, register_bits in register_data:
                 if isinstance(register, int) and register_addr != register:
                     continue
@@ -4,13 +4,14 @@ import time
 import json
 import math
 import networkx as nx
+import numpy as np
 from copy import copy
 
 from . import configs
 from .key import Key
 from .chip import Chip
 from .configuration import Configuration_v1, Configuration_v2, Configuration_Lightpix_v1
-from .packet import Packet_v1, Packet_v2, PacketCollection
+from .packet import Packet_v1, Packet_v2, PacketCollection, PacketArray
 from . import bitarrayhelper as bah
 
 
@@ -138,6 +139,11 @@ class Controller(object):
     - ``network``: a collection of networkx directed graph objects representing
       the miso_us, miso_ds, and mosi connections between chips (not applicable
       for v1 asics)
+    - ``duplicate_filter``: optional ``larpix.packet.DuplicateFilter`` used by
+      ``read`` to drop repeated config read replies (e.g. when packets are
+      double sent) before they are logged or stored. The filter is reset by
+      each ``send``, so that replies to a new request are kept. Disabled
+      (``None``) by default.
 
     '''
     network_names = ('miso_us', 'miso_ds', 'mosi')
@@ -165,6 +171,7 @@ class Controller(object):
         self.nreads = 0
         self.io = None
         self.logger = None
+        self.duplicate_filter = None
 
     def __getitem__(self, key):
         '''
@@ -909,6 +916,9 @@ class Controller(object):
 
         '''
         timestamp = time.time()
+        if self.duplicate_filter is not None:
+            # replies to a new request are not duplicates of earlier replies
+            self.duplicate_filter.reset()
         #for packet in packets:
         #    print(packet)
         if self.io:
@@ -938,23 +948,31 @@ class Controller(object):
         else:
             warnings.warn('no IO object exists, you have done nothing', RuntimeWarning)
 
-    def read(self):
+    def read(self, as_array=False):
         '''
         Read any packets that have arrived and return (packets,
         bytestream) where bytestream is the bytes that were received.
 
         The returned list will contain packets that arrived since the
         last call to ``read`` or ``start_listening``, whichever was most
-        recent.
+        recent. If ``duplicate_filter`` is set, duplicate packets are
+        removed.
+
+        :param as_array: optional, if ``True`` return the packets as a ``PacketArray`` (using ``IO.empty_queue_array``) instead of a list of packet objects
 
         '''
         timestamp = time.time()
-        packets = []
+        packets = PacketArray() if as_array else []
         bytestream = b''
         if self.io:
-            packets, bytestream = self.io.empty_queue()
+            if as_array:
+                packets, bytestream = self.io.empty_queue_array()
+            else:
+                packets, bytestream = self.io.empty_queue()
         else:
             warnings.warn('no IO object exists, no packets will be received', RuntimeWarning)
+        if self.duplicate_filter is not None:
+            packets = self.duplicate_filter.filter(packets)
         if self.logger:
             self.logger.record(packets, direction=self.logger.READ)
         return packets, bytestream
@@ -1432,6 +1450,107 @@ class Controller(object):
         chip_key_register_pairs = [(chip_key, range(self[chip_key].config.num_registers)) for chip_key in chip_keys]
         return self.enforce_registers(chip_key_register_pairs, timeout=timeout, connection_delay=connection_delay, n=n, n_verify=n_verify)
 
+    def reliable_write_configuration(self, chip_reg_pairs, timeout=0.1,
+                                     connection_delay=0.02, max_rounds=5,
+                                     message=None):
+        '''
+        Write configuration registers and confirm their delivery with config
+        reads, retransmitting only the registers that were not confirmed.
+
+        Each round sends the pending config writes once, followed by a
+        config read of each of the same registers, and then listens for
+        ``timeout`` seconds. A register is confirmed once a config read
+        reply carries the written value. Unconfirmed registers are sent
+        again in the next round, for at most ``max_rounds`` rounds. This
+        confirms delivery on lossy links (e.g. due to the 512 bug).
+
+        Writing ``N`` registers costs ``2N`` packets in the first round (a
+        write and a read of each register), the same as writing them with
+        ``PACMAN_IO.double_send_packets``, plus ``2M`` packets for each
+        later round with ``M`` unconfirmed registers. Unlike double sending
+        the writes are verified, so no separate ``verify_registers`` pass is
+        needed. ``double_send_packets`` should be disabled when using this
+        method, since it doubles every round.
+
+        Each round is a separate ``send``, which resets the
+        ``duplicate_filter`` (and ``PACMAN_IO.duplicate_filter``), so the
+        readback of a retried register is not dropped as a repeat of its
+        readback in the previous round.
+
+        ``chip_reg_pairs`` uses the same format as
+        ``Controller.multi_write_configuration``. The received packets of
+        each round are stored in the ``reads`` data member.
+
+        :param chip_reg_pairs: ``list`` of chip keys or ``(chip_key, registers)`` pairs
+
+        :param timeout: how long to wait for the config read replies in each round, in seconds
+
+        :param connection_delay: how long to wait after starting to listen, in seconds
+
+        :param max_rounds: maximum number of times a register is sent
+
+        :returns: 2-``tuple`` with same format as ``controller.verify_registers``, containing the registers that could not be confirmed
+
+        '''
+        if message is None:
+            message = 'reliable configuration write'
+        else:
+            message = 'reliable configuration write: ' + message
+        pending = OrderedDict()
+        for chip_reg_pair in chip_reg_pairs:
+            if not isinstance(chip_reg_pair, tuple):
+                chip_reg_pair = (chip_reg_pair, None)
+            chip_key, registers = chip_reg_pair
+            chip = self[chip_key]
+            if registers is None:
+                registers = list(range(chip.config.num_registers))
+            elif isinstance(registers, int):
+                registers = [registers]
+            for packet in chip.get_configuration_write_packets(registers):
+                pending[(chip.chip_key, packet.register_address)] = packet
+        read_data = dict()
+
+        already_listening = False
+        if self.io:
+            already_listening = self.io.is_listening
+        if not already_listening:
+            self.start_listening()
+            time.sleep(connection_delay)
+        for i_round in range(max_rounds):
+            if not pending:
+                break
+            write_packets = list(pending.values())
+            read_registers = OrderedDict()
+            for chip_key, register in pending:
+                read_registers.setdefault(chip_key, []).append(register)
+            read_packets = [
+                packet
+                for chip_key, registers in read_registers.items()
+                for packet in self[chip_key].get_configuration_read_packets(registers)
+                ]
+            self.send(write_packets + read_packets)
+            time.sleep(timeout)
+            packets, bytestream = self.read()
+            self.store_packets(packets, bytestream, message)
+            for packet in packets:
+                if not (hasattr(packet, 'CONFIG_READ_PACKET')
+                        and packet.packet_type == packet.CONFIG_READ_PACKET):
+                    continue
+                key = (packet.chip_key, packet.register_address)
+                if key not in pending:
+                    continue
+                read_data[key] = packet.register_data
+                if packet.register_data == pending[key].register_data:
+                    del pending[key]
+        if not already_listening:
+            self.stop_listening()
+
+        different_fields = dict()
+        for (chip_key, register), packet in pending.items():
+            different_fields.setdefault(chip_key, dict())[register] = (
+                packet.register_data, read_data.get((chip_key, register)))
+        return (not pending, different_fields)
+
     def enable_analog_monitor(self, chip_key, channel):
         '''
         Enable the analog monitor on a single channel on the specified chip.
@@ -1620,3 +1739,62 @@ class Controller(object):
         with open(filename, 'w') as outfile:
             json.dump(data, outfile, indent=4,
                       separators=(',', ':'), sort_keys=True)
+
+    def save_output_binary(self, filename, message):
+        '''
+        Save the data read by each chip to the specified file in a compact
+        binary format (an uncompressed numpy ``.npz`` file). Each read is
+        stored as a ``PacketArray`` along with its message, read id, and
+        bytestream. Use ``load_output_binary`` to read the file.
+
+        :raises ValueError: if a read contains packets that cannot be stored in a ``PacketArray``
+
+        '''
+        arrays = [collection.to_array() for collection in self.reads]
+        bytestreams = [collection.bytestream for collection in self.reads]
+        data = dict(
+            packets=PacketArray.concatenate(arrays).data,
+            read_offsets=np.cumsum([0] + [len(arr) for arr in arrays]),
+            read_ids=np.array([-1 if arr.read_id is None else arr.read_id
+                for arr in arrays], dtype=np.int64),
+            read_messages=np.array([arr.message for arr in arrays], dtype=str),
+            bytestreams=np.frombuffer(b''.join(bytestream or b''
+                for bytestream in bytestreams), dtype=np.uint8),
+            bytestream_offsets=np.cumsum([0] + [len(bytestream or b'')
+                for bytestream in bytestreams]),
+            has_bytestream=np.array([bytestream is not None
+                for bytestream in bytestreams], dtype=bool),
+            chips=np.array([repr(chip) for chip in self.chips.values()], dtype=str),
+            message=np.array(message, dtype=str)
+            )
+        with open(filename, 'wb') as outfile:
+            np.savez(outfile, **data)
+
+    @staticmethod
+    def load_output_binary(filename):
+        '''
+        Load a file created by ``save_output_binary``.
+
+        :returns: ``dict`` with keys ``'reads'`` containing a list of ``PacketCollection``, ``'chips'`` containing a list of the chip representations, and ``'message'``
+
+        '''
+        with np.load(filename, allow_pickle=False) as f:
+            data = dict((key, f[key]) for key in f.files)
+        reads = []
+        for i, read_id in enumerate(data['read_ids']):
+            start, end = data['read_offsets'][i:i+2]
+            arr = PacketArray(data['packets'][start:end],
+                message=str(data['read_messages'][i]),
+                read_id=None if read_id < 0 else int(read_id))
+            bytestream = None
+            if data['has_bytestream'][i]:
+                start, end = data['bytestream_offsets'][i:i+2]
+                bytestream = data['bytestreams'][start:end].tobytes()
+            collection = PacketCollection([])
+            collection.from_array(arr, bytestream=bytestream)
+            reads.append(collection)
+        return dict(
+            reads=reads,
+            chips=[str(chip) for chip in data['chips']],
+            message=str(data['message'])
+            )
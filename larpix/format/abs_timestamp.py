@@ -0,0 +1,225 @@
+'''
+Reconstruction of absolute packet timestamps.
+
+LArPix data packets only carry a 31-bit timestamp that is reset by each
+PACMAN sync (``SyncPacket`` with ``sync_type=b'S'``) and rolls over if no
+sync occurs. This module reconstructs a monotonic ``abs_timestamp`` (in
+clock ticks since the start of the data for each io group) by summing the
+sync periods and timestamp rollovers preceding each packet::
+
+    abs_timestamp = <sum of previous sync periods> + <rollovers> * 2**31 + timestamp
+
+where the length of each sync period is the timestamp of the sync packet
+plus any rollovers that occurred during the period.
+
+The calculation is vectorized and works on chunks of the LArPix+HDF5
+``packets`` dataset (or ``PacketArray`` batches). A ``state`` dict carries
+the per-io group sync and rollover counters from one chunk to the next, so
+arbitrarily large files can be processed in pieces::
+
+    import larpix.format.abs_timestamp as abs_timestamp
+
+    # add an 'abs_timestamp' dataset to an existing LArPix+HDF5 file
+    abs_timestamp.to_file('data.h5')
+
+    # or process a stream of packet arrays
+    state = dict()
+    for arr in batches:
+        arr = abs_timestamp.add_abs_timestamp(arr, state=state) # adds an 'abs_timestamp' field
+
+Data (``packet_type == 0``) and trigger packets receive an absolute
+timestamp. Trigger packets carry a 32-bit PACMAN timestamp, so their
+rollovers are counted separately from the data packets, with a period of
+``2**32``. Sync packets receive the absolute timestamp of the end of the
+sync period they close. All other packets (e.g. config packets, and
+``TimestampPacket`` message headers that are in unix time) are assigned
+``0``.
+
+.. note:: Packets are assigned to sync periods in the order they appear in
+    the data, so a packet from before a sync that is received after the
+    sync packet will be assigned to the following sync period.
+
+'''
+import h5py
+import numpy as np
+
+from ..packet.packet_array import PacketArray
+
+#: rollover period of the LArPix timestamp
+timestamp_rollover = 2**31
+
+#: rollover period of the PACMAN timestamp of trigger packets
+trigger_timestamp_rollover = 2**32
+
+#: ``sync_type`` of sync packets that reset the LArPix timestamps
+default_sync_type = b'S'
+
+_data_packet_type = 0
+_trigger_packet_type = 7
+_sync_packet_type = 6
+
+def _new_state():
+    return dict(offset=0, period=0, last_timestamp=None, n_rollovers=0,
+        last_trigger_timestamp=None, n_trigger_rollovers=0)
+
+def _count_rollovers(timestamp, period, state_period, last_timestamp,
+        n_rollovers, rollover):
+    '''
+    Count the rollovers preceding each timestamp of a single clock, restarting
+    the count at each new sync period.
+
+    :returns: ``int64`` array of rollover counts
+
+    '''
+    # first entry carries the state from the previous chunk
+    timestamp = np.r_[timestamp[0] if last_timestamp is None else last_timestamp,
+        timestamp]
+    period = np.r_[state_period, period]
+    same_period = period[1:] == period[:-1]
+    diff = np.diff(timestamp)
+    half = rollover // 2
+    # late packets from before a rollover step back down
+    step = np.r_[n_rollovers,
+        ((diff < -half) & same_period).astype(np.int64)
+        - ((diff > half) & same_period).astype(np.int64)]
+    cumulative = np.cumsum(step)
+    new_period = np.r_[True, ~same_period]
+    start = np.maximum.accumulate(np.where(new_period, np.arange(len(step)), 0))
+    count = cumulative - cumulative[start] + step[start]
+    # a step back down without a preceding rollover (e.g. after a large jump
+    # at the start of a period) is not a late packet, so the running count is
+    # clamped at 0. The running minimum of each period is found in one pass
+    # by shifting each period below all of the preceding ones
+    shift = np.cumsum(new_period) * (2 * np.abs(step).sum() + 1)
+    running_min = np.minimum.accumulate(count - shift) + shift
+    return (count - np.minimum(running_min, 0))[1:]
+
+def _calc_io_group(rows, state, sync_code):
+    packet_type = rows['packet_type']
+    timestamp = rows['timestamp'].astype(np.int64)
+    is_sync = (packet_type == _sync_packet_type) & (rows['trigger_type'] == sync_code)
+
+    period = state['period'] + np.cumsum(is_sync)
+
+    abs_timestamp = np.zeros(len(rows), dtype=np.int64)
+    rollovers = dict()
+    for timed_type, rollover, last_key, n_key in (
+            (_data_packet_type, timestamp_rollover, 'last_timestamp', 'n_rollovers'),
+            (_trigger_packet_type, trigger_timestamp_rollover,
+                'last_trigger_timestamp', 'n_trigger_rollovers')):
+        index = np.flatnonzero(packet_type == timed_type)
+        n_rollovers = np.zeros(0, dtype=np.int64)
+        if len(index):
+            n_rollovers = _count_rollovers(timestamp[index], period[index],
+                state['period'], state.get(last_key), state.get(n_key, 0), rollover)
+        rollovers[timed_type] = (index, n_rollovers, rollover, last_key, n_key)
+    timed_index, n_rollovers = rollovers[_data_packet_type][:2]
+
+    # each sync closes a period of <rollovers> * 2**31 + <sync timestamp> ticks
+    sync_index = np.flatnonzero(is_sync)
+    sync_rollovers = np.zeros(len(sync_index), dtype=np.int64)
+    if len(sync_index):
+        last_timed = np.searchsorted(timed_index, sync_index) - 1
+        closed_period = period[sync_index] - 1
+        has_timed = last_timed >= 0
+        has_timed[has_timed] = period[timed_index[last_timed[has_timed]]] == closed_period[has_timed]
+        sync_rollovers[has_timed] = n_rollovers[last_timed[has_timed]]
+        continued = ~has_timed & (closed_period == state['period'])
+        sync_rollovers[continued] = state['n_rollovers']
+    period_length = np.zeros(len(rows), dtype=np.int64)
+    period_length[sync_index] = sync_rollovers * timestamp_rollover + timestamp[sync_index]
+    offset = state['offset'] + np.cumsum(period_length)
+
+    abs_timestamp[sync_index] = offset[sync_index]
+    for index, n_rollovers, rollover, last_key, n_key in rollovers.values():
+        if len(index):
+            abs_timestamp[index] = (offset[index]
+                + n_rollovers * rollover + timestamp[index])
+            if period[index[-1]] == period[-1]:
+                state[last_key] = timestamp[index[-1]]
+                state[n_key] = n_rollovers[-1]
+            else:
+                state[last_key] = None
+                state[n_key] = 0
+        elif len(rows) and period[-1] != state['period']:
+            state[last_key] = None
+            state[n_key] = 0
+
+    if len(rows):
+        state['offset'] = offset[-1]
+        state['period'] = period[-1]
+    return abs_timestamp
+
+def calc_abs_timestamp(packets, state=None, sync_type=default_sync_type):
+    '''
+    Calculate the absolute timestamp of each packet in a chunk of packets.
+
+    :param packets: numpy structured array using the LArPix+HDF5 ``packets`` layout (version 2.2 or newer), or a ``PacketArray``
+
+    :param state: optional, ``dict`` used to carry counters between chunks. Pass the same (initially empty) ``dict`` for each consecutive chunk of a data set.
+
+    :param sync_type: optional, ``sync_type`` of the sync packets that reset the timestamps
+
+    :returns: numpy ``uint64`` array of absolute timestamps
+
+    '''
+    data = packets.data if isinstance(packets, PacketArray) else packets
+    if state is None:
+        state = dict()
+    sync_code = np.frombuffer(sync_type, dtype=np.uint8)[0]
+    abs_timestamp = np.zeros(len(data), dtype=np.uint64)
+    io_group = data['io_group']
+    for group in np.unique(io_group):
+        index = np.flatnonzero(io_group == group)
+        group_state = state.setdefault(int(group), _new_state())
+        abs_timestamp[index] = _calc_io_group(data[index], group_state, sync_code)
+    return abs_timestamp
+
+def add_abs_timestamp(packets, state=None, sync_type=default_sync_type):
+    '''
+    Copy a chunk of packets into a new structured array with an additional
+    ``abs_timestamp`` field. See ``calc_abs_timestamp``.
+
+    :returns: numpy structured array (or ``PacketArray`` if ``packets`` is a ``PacketArray``)
+
+    '''
+    data = packets.data if isinstance(packets, PacketArray) else packets
+    abs_timestamp = calc_abs_timestamp(data, state=state, sync_type=sync_type)
+    new_dtype = np.dtype([(name, data.dtype[name]) for name in data.dtype.names
+        if name != 'abs_timestamp'] + [('abs_timestamp', 'u8')])
+    new_data = np.empty(len(data), dtype=new_dtype)
+    for name in data.dtype.names:
+        new_data[name] = data[name]
+    new_data['abs_timestamp'] = abs_timestamp
+    if isinstance(packets, PacketArray):
+        return PacketArray(new_data, message=packets.message,
+            read_id=packets.read_id)
+    return new_data
+
+def to_file(filename, chunk_size=2**20, dset_name='abs_timestamp',
+        sync_type=default_sync_type):
+    '''
+    Calculate the absolute timestamp of each packet in a LArPix+HDF5 file
+    and store it in a new ``uint64`` dataset with one entry per row of the
+    ``packets`` dataset. The file is processed ``chunk_size`` rows at a
+    time. An existing dataset of the same name is replaced.
+
+    :param filename: LArPix+HDF5 file (version 2.2 or newer)
+
+    :param chunk_size: optional, number of packets to process at a time
+
+    :param dset_name: optional, name of the new dataset
+
+    :param sync_type: optional, ``sync_type`` of the sync packets that reset the timestamps
+
+    '''
+    with h5py.File(filename, 'a') as f:
+        packets = f['packets']
+        if dset_name in f:
+            del f[dset_name]
+        dset = f.create_dataset(dset_name, shape=packets.shape, dtype='u8')
+        state = dict()
+        for start in range(0, len(packets), chunk_size):
+            chunk = packets[start:start+chunk_size]
+            dset[start:start+len(chunk)] = calc_abs_timestamp(chunk,
+                state=state, sync_type=sync_type)
@@ -349,7 +349,7 @@ import h5py
 import numpy as np
 import struct
 
-from larpix.larpix import Packet_v1, Packet_v2, TimestampPacket, MessagePacket, SyncPacket, TriggerPacket, Chip, Configuration_Lightpix_v1, Key
+from larpix.larpix import Packet_v1, Packet_v2, PacketView, TimestampPacket, MessagePacket, SyncPacket, TriggerPacket, Chip, Configuration_Lightpix_v1, Key, PacketArray
 from larpix.logger import Logger
 from .. import bitarrayhelper as bah
 _max_config_registers = Configuration_Lightpix_v1.num_registers
@@ -762,6 +762,7 @@ _format_method_lookup = {
     '2.0': {
         'packets': {
             Packet_v2: _format_packets_packet_v2_0,
+            PacketView: _format_packets_packet_v2_0,
             TimestampPacket: _format_packets_packet_v2_0,
             MessagePacket: _format_packets_packet_v2_0
         },
@@ -772,6 +773,7 @@ _format_method_lookup = {
     '2.1': {
         'packets': {
             Packet_v2: _format_packets_packet_v2_1,
+            PacketView: _format_packets_packet_v2_1,
             TimestampPacket: _format_packets_packet_v2_1,
             MessagePacket: _format_packets_packet_v2_1
         },
@@ -782,6 +784,7 @@ _format_method_lookup = {
     '2.2': {
         'packets': {
             Packet_v2: _format_packets_packet_v2_1,
+            PacketView: _format_packets_packet_v2_1,
             TimestampPacket: _format_packets_packet_v2_1,
             MessagePacket: _format_packets_packet_v2_1,
             SyncPacket: _format_packets_packet_v2_2,
@@ -794,6 +797,7 @@ _format_method_lookup = {
     '2.3': {
         'packets': {
             Packet_v2: _format_packets_packet_v2_3,
+            PacketView: _format_packets_packet_v2_3,
             TimestampPacket: _format_packets_packet_v2_3,
             MessagePacket: _format_packets_packet_v2_3,
             SyncPacket: _format_packets_packet_v2_3,
@@ -806,6 +810,7 @@ _format_method_lookup = {
     '2.4': {
         'packets': {
             Packet_v2: _format_packets_packet_v2_3,
+            PacketView: _format_packets_packet_v2_3,
             TimestampPacket: _format_packets_packet_v2_3,
             MessagePacket: _format_packets_packet_v2_3,
             SyncPacket: _format_packets_packet_v2_3,
@@ -933,7 +938,10 @@ def to_file(filename, packet_list=None, chip_list=None, mode='a', version=None,
 
     :param filename: the name of the file to save to
     :param packet_list: any iterable of objects of type ``Packet``,
-        ``TimestampPacket``, ``SyncPacket``, or ``TriggerPacket``.
+        ``TimestampPacket``, ``SyncPacket``, or ``TriggerPacket``, or a
+        ``PacketArray`` (or numpy structured array with the same
+        dtype, e.g. from ``pacman_msg_format.parse_many``). Arrays are
+        written directly, without creating packet objects.
     :param chip_list: any iterable of objects of type ``Chip``.
     :param mode: optional, the "file mode" to open the data file
         (default: ``'a'``)
@@ -948,6 +956,8 @@ def to_file(filename, packet_list=None, chip_list=None, mode='a', version=None,
     '''
     if packet_list is None: packet_list = []
     if chip_list is None: chip_list = []
+    if isinstance(packet_list, PacketArray):
+        packet_list = packet_list.data
     if workers is None:
       workers = max(min(os.cpu_count(), int(len(packet_list)//10000)),1)
 
@@ -1010,6 +1020,13 @@ def to_file(filename, packet_list=None, chip_list=None, mode='a', version=None,
         encoded_packets = []
         messages = []
 
+        if isinstance(packet_list, np.ndarray):
+            if packet_list.dtype == np.dtype(packet_dtype):
+                packet_dset[start_index:] = packet_list
+                return
+            # e.g. an older file version
+            packet_list = PacketArray(packet_list).to_packets()
+
         if workers > 1:
             packet_args = zip(packet_list, [version]*len(packet_list), [packet_dset_name]*len(packet_list))
             with multiprocessing.Pool(workers) as p:
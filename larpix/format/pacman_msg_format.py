@@ -46,12 +46,24 @@ that when formatting messages, packets' ``io_group`` field is ignored, and when
 parsing messages, an ``io_group`` value needs to be specified at the time of
 parsing.
 
+To decode many messages at once without creating any packet objects, use
+``parse_many(msgs, io_group=None)``. This returns a numpy structured array with
+the same layout as the ``larpix.format.hdf5format`` ``packets`` dataset (see
+``larpix.packet.packet_array.packet_dtype()``). E.g.::
+
+    arr = pacman_msg_fmt.parse_many(msgs, io_group=[1, 2, ...]) # one io group per message
+    arr = pacman_msg_fmt.parse_many(buffer, offsets=offsets, io_group=io_groups) # concatenated messages
+    PacketArray(arr) # wrap in a PacketArray
+
 '''
 import struct
 from bidict import bidict
 import time
 
-from larpix import Packet_v2, TriggerPacket, SyncPacket, TimestampPacket
+import numpy as np
+
+from larpix import Packet_v2, TriggerPacket, SyncPacket, TimestampPacket, PacketView
+from larpix.packet.packet_array import packet_dtype, words_to_array
 
 #: Most up-to-date message format version.
 latest_version = '0.0'
@@ -111,6 +123,9 @@ word_fmt_table = dict(
     PONG='<c15x',
     ERR='<cB14s'
     )
+_u32_mask = np.uint64(0xffffffff)
+_u8_mask = np.uint64(0xff)
+
 word_struct_table = dict([
     (word_type, struct.Struct(word_fmt))
     for word_type, word_fmt in word_fmt_table.items()
@@ -161,7 +176,7 @@ def parse_word(msg_type, word):
     first item is always the word type
 
     '''
-    word_type = word_type_table[msg_type].inv[word[0:1]]
+    word_type = word_type_table[msg_type].inv[bytes(word[0:1])]
     return (word_type,) + tuple(word_struct_table[word_type].unpack(word)[1:])
 
 def format_msg(msg_type, msg_words):
@@ -169,10 +184,45 @@ def format_msg(msg_type, msg_words):
     ``msg_words`` should be a list of tuples that can be unpacked and passed into ``format_word``
 
     '''
-    bytestream = format_header(msg_type, len(msg_words))
-    for msg_word in msg_words:
-        bytestream += format_word(msg_type, *msg_word)
-    return bytestream
+    msg = bytearray(HEADER_LEN + WORD_LEN * len(msg_words))
+    msg_header_struct.pack_into(msg, 0, msg_type_table[msg_type],
+        int(time.time()), len(msg_words))
+    word_types = word_type_table[msg_type]
+    offset = HEADER_LEN
+    for word_type, *data in msg_words:
+        word_struct_table[word_type].pack_into(msg, offset,
+            word_types[word_type], *data)
+        offset += WORD_LEN
+    return bytes(msg)
+
+def format_words(words, io_channel=0, msg_type='REQ', receipt_timestamp=0):
+    '''
+    Generates a message bytestring with one data (or ``'TX'``) word per
+    64-bit packet word, without creating any packet objects. E.g.::
+
+        words = np.array([...], dtype=np.uint64) # e.g. from larpix.packet.parity.assign_parity
+        msg = format_words(words, io_channel=[1, 2, ...])
+
+    :param words: array-like of ``uint64`` packet words
+
+    :param io_channel: scalar or array of io channel for each word
+
+    :param msg_type: message type, ``'REQ'``, ``'REP'``, or ``'DATA'``
+
+    :param receipt_timestamp: scalar or array of receipt timestamp for each word (``'DATA'`` messages only)
+
+    '''
+    words = np.asarray(words, dtype=np.uint64)
+    msg = np.empty(HEADER_LEN // 8 + len(words) * (WORD_LEN // 8), dtype='<u8')
+    msg[0] = np.frombuffer(format_header(msg_type, len(words)), dtype='<u8')[0]
+    word_header = np.uint64(WORD_TYPE_DATA[0]) \
+        | ((np.asarray(io_channel, dtype=np.uint64) & _u8_mask) << np.uint64(8))
+    if msg_type == 'DATA':
+        word_header = word_header \
+            | ((np.asarray(receipt_timestamp, dtype=np.uint64) & _u32_mask) << np.uint64(16))
+    msg[1::2] = word_header
+    msg[2::2] = words
+    return msg.tobytes()
 
 def parse_msg(msg):
     '''
@@ -225,10 +275,20 @@ def format(packets, msg_type='REQ', ts_pacman=0):
     Note:: For request messages, this method only formats ``Packet_v2`` objects. For data messages, this method only formats ``Packet_v2``, ``SyncPacket``, and ``TriggerPacket`` objects.
 
     '''
-    get_data = _packet_data_req
-    if msg_type == 'DATA':
-        get_data = _packet_data_data
-
+    if msg_type != 'DATA' or all(isinstance(packet, Packet_v2) for packet in packets):
+        # only Packet_v2 words, so the message can be built in one pass
+        packets = [packet for packet in packets if isinstance(packet, Packet_v2)]
+        receipt_timestamp = 0
+        if msg_type == 'DATA':
+            receipt_timestamp = [getattr(packet, 'receipt_timestamp', ts_pacman)
+                for packet in packets]
+        return format_words(
+            np.fromiter((packet.as_int() for packet in packets),
+                dtype=np.uint64, count=len(packets)),
+            io_channel=[packet.io_channel or 0 for packet in packets],
+            msg_type=msg_type, receipt_timestamp=receipt_timestamp)
+
+    get_data = _packet_data_data
     word_datas = list()
     for packet in packets:
         word_data = get_data(packet, ts_pacman)
@@ -236,7 +296,7 @@ def format(packets, msg_type='REQ', ts_pacman=0):
         word_datas.append(word_data)
     return format_msg(msg_type, word_datas)
 
-def parse(msg, io_group=None):
+def parse(msg, io_group=None, views=False, duplicate_filter=None):
     '''
     Converts a PACMAN message into larpix packets
 
@@ -245,7 +305,17 @@ def parse(msg, io_group=None):
     trigger words are parsed into ``TriggerPacket`` objects,
     and sync words are parsed into ``SyncPacket`` objects.
 
+    If ``views=True``, data words are instead returned as read-only
+    ``PacketView`` objects that refer back into ``msg`` and are only decoded
+    when accessed.
+
+    If a ``larpix.packet.DuplicateFilter`` is given, data words that it
+    flags as duplicates are skipped before any packet object is created.
+
     '''
+    if views:
+        return _parse_views(msg, io_group=io_group,
+            duplicate_filter=duplicate_filter)
     packets = list()
     header, word_datas = parse_msg(msg)
     packets.append(TimestampPacket(timestamp=header[1]))
@@ -253,6 +323,9 @@ def parse(msg, io_group=None):
     for word_data in word_datas:
         packet = None
         if word_data[0] in ('TX', 'DATA'):
+            if duplicate_filter is not None and duplicate_filter.is_duplicate(
+                    word_data[-1], io_group, word_data[1]):
+                continue
             packet = Packet_v2(word_data[-1])
             packet.receipt_timestamp = word_data[2]
             packet.io_group = io_group
@@ -267,8 +340,144 @@ def parse(msg, io_group=None):
             packets.append(packet)
     return packets
 
+_data_word_type = WORD_TYPE_DATA[0]
+
+def _parse_views(msg, io_group=None, duplicate_filter=None):
+    '''
+    Converts a PACMAN message into larpix packets, using ``PacketView`` objects
+    for data words (see ``parse``)
+
+    '''
+    msg_type = msg_type_table.inv[bytes(msg[0:1])]
+    packets = [TimestampPacket(timestamp=msg_header_struct.unpack(msg[:HEADER_LEN])[1])]
+    packets[0].io_group = io_group
+    buffer = memoryview(msg)
+    for idx in range(HEADER_LEN,len(msg),WORD_LEN):
+        if msg[idx] == _data_word_type:
+            if duplicate_filter is not None and duplicate_filter.is_duplicate(
+                    buffer[idx+8:idx+16], io_group, msg[idx+1]):
+                continue
+            packets.append(PacketView(
+                buffer,
+                offset=idx+8,
+                io_group=io_group,
+                io_channel=msg[idx+1],
+                receipt_timestamp=int.from_bytes(buffer[idx+2:idx+6], 'little')
+                ))
+        else:
+            word_data = parse_word(msg_type, msg[idx:idx+WORD_LEN])
+            packet = None
+            if word_data[0] == 'TRIG':
+                packet = TriggerPacket(trigger_type=word_data[1], timestamp=word_data[2])
+                packet.io_group = io_group
+            elif word_data[0] == 'SYNC':
+                packet = SyncPacket(sync_type=word_data[1], clk_source=word_data[2] & 0x01, timestamp=word_data[3])
+                packet.io_group = io_group
+            if packet is not None:
+                packets.append(packet)
+    return packets
+
+def _aligned_buffer(msgs, offsets):
+    '''
+    :returns: tuple of a ``uint64`` view of the concatenated messages, and the start of each message (in 8-byte units)
+
+    '''
+    if offsets is None:
+        lengths = np.fromiter((len(msg) for msg in msgs), dtype=np.int64,
+            count=len(msgs))
+        buffer = b''.join(msgs)
+        starts = np.cumsum(lengths) - lengths
+    else:
+        buffer = msgs
+        starts = np.asarray(offsets, dtype=np.int64)
+        lengths = np.diff(np.r_[starts, len(buffer)])
+        if len(buffer) % 8 or np.any(starts % 8):
+            # re-pack so that every word starts on an 8-byte boundary
+            buffer = b''.join(bytes(buffer[start:start+length])
+                for start, length in zip(starts.tolist(), lengths.tolist()))
+            starts = np.cumsum(lengths) - lengths
+    if len(buffer) % 8 or np.any(lengths < HEADER_LEN) or np.any((lengths - HEADER_LEN) % WORD_LEN):
+        raise ValueError('invalid pacman message length')
+    return np.frombuffer(buffer, dtype='<u8'), starts // 8, (lengths - HEADER_LEN) // WORD_LEN
+
+def parse_many(msgs, io_group=None, offsets=None, duplicate_filter=None):
+    '''
+    Converts many PACMAN messages into a single numpy structured array, using
+    the ``larpix.format.hdf5format`` ``packets`` layout (see
+    ``larpix.packet.packet_array.packet_dtype()``).
+
+    The rows are equivalent to the packets returned by ``parse`` for each
+    message in turn: a timestamp row (``packet_type == 4``) for each message
+    header, followed by a row for each data, trigger, and sync word.
 
+    :param msgs: list of PACMAN messages, or a single ``bytes``-like buffer of concatenated messages (requires ``offsets``)
 
+    :param io_group: optional, io group of all messages or an array with the io group of each message
 
+    :param offsets: optional, start of each message within ``msgs`` if ``msgs`` is a single buffer
 
+    :param duplicate_filter: optional, a ``larpix.packet.DuplicateFilter`` used to skip duplicate data words
 
+    :returns: numpy structured array with dtype ``packet_dtype()``
+
+    '''
+    buffer, starts, n_words = _aligned_buffer(msgs, offsets)
+    n_msgs = len(starts)
+    io_group = np.broadcast_to(
+        np.asarray(0 if io_group is None else io_group, dtype=np.uint8), (n_msgs,))
+
+    header = buffer[starts]
+    msg_type = (header & _u8_mask).astype(np.uint8)
+    msg_timestamp = (header >> np.uint64(8)) & _u32_mask
+
+    # each word is two uint64: a PACMAN header and the word content
+    word_msg = np.repeat(np.arange(n_msgs), n_words)
+    word_start = np.cumsum(n_words) - n_words
+    word_index = (np.arange(len(word_msg)) - word_start[word_msg]) * (WORD_LEN // 8) \
+        + starts[word_msg] + HEADER_LEN // 8
+    word_header = buffer[word_index]
+    word_content = buffer[word_index + 1]
+    word_type = (word_header & _u8_mask).astype(np.uint8)
+    word_io_group = io_group[word_msg]
+
+    is_data = word_type == WORD_TYPE_DATA[0]
+    is_data_msg = msg_type[word_msg] == MSG_TYPE_DATA[0]
+    is_trig = (word_type == WORD_TYPE_TRIG[0]) & is_data_msg
+    is_sync = (word_type == WORD_TYPE_SYNC[0]) & is_data_msg
+    if duplicate_filter is not None:
+        packet_type = (word_content & np.uint64(0b11)).astype(np.uint8)
+        io_channel = ((word_header >> np.uint64(8)) & _u8_mask).astype(np.uint8)
+        for i in np.flatnonzero(is_data & np.isin(packet_type, duplicate_filter.packet_types)).tolist():
+            if duplicate_filter.is_duplicate(int(word_content[i]), int(word_io_group[i]), int(io_channel[i])):
+                is_data[i] = False
+    keep = is_data | is_trig | is_sync
+
+    # a timestamp row for each message followed by the kept words
+    n_kept = np.bincount(word_msg[keep], minlength=n_msgs)
+    msg_row = np.cumsum(n_kept + 1) - (n_kept + 1)
+    kept_rank = np.cumsum(keep) - 1
+    kept_before_msg = np.r_[0, np.cumsum(keep)][word_start]
+    word_row = msg_row[word_msg] + 1 + kept_rank - kept_before_msg[word_msg]
+
+    arr = np.zeros(n_msgs + np.count_nonzero(keep), dtype=packet_dtype())
+    arr['packet_type'][msg_row] = 4
+    arr['timestamp'][msg_row] = msg_timestamp
+    arr['io_group'][msg_row] = io_group
+
+    rows = word_row[is_data]
+    data_header = word_header[is_data]
+    arr[rows] = words_to_array(word_content[is_data],
+        io_group=word_io_group[is_data],
+        io_channel=(data_header >> np.uint64(8)) & _u8_mask,
+        receipt_timestamp=(data_header >> np.uint64(16)) & _u32_mask)
+
+    for mask, packet_type in ((is_trig, 7), (is_sync, 6)):
+        rows = word_row[mask]
+        other_header = word_header[mask]
+        arr['packet_type'][rows] = packet_type
+        arr['io_group'][rows] = word_io_group[mask]
+        arr['trigger_type'][rows] = (other_header >> np.uint64(8)) & _u8_mask
+        arr['timestamp'][rows] = (other_header >> np.uint64(32)) & _u32_mask
+        if packet_type == 6:
+            arr['dataword'][rows] = (other_header >> np.uint64(16)) & np.uint64(0x01)
+    return arr
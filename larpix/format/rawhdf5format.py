@@ -24,6 +24,43 @@ the same length as the ``msgs`` list and passed into the file at the same time::
     rd['msgs'] # [b'message from 1', b'message from 2']
     rd['msg_headers']['io_groups'] # [1, 2]
 
+Many small batches of messages are written much more efficiently by keeping
+the file open with a ``RawFileWriter``, which grows the datasets
+geometrically and only flushes the file after a configurable time or number
+of bytes::
+
+    with RawFileWriter('raw.h5', flush_interval=1., flush_size=2**24) as writer:
+        writer.write(msgs, msg_headers={'io_groups': io_groups})
+
+Long data runs can be split into a sequence of files with a
+``RotatingRawFileWriter``. A new file is started once the current file reaches
+a number of bytes or messages, or has been open for a given time. A small JSON
+manifest next to the files records the name, message range, and time span of
+each file (see ``load_manifest``), so that the files can be converted or
+transferred independently::
+
+    with RotatingRawFileWriter('raw.h5', max_bytes=2**30) as writer:
+        writer.write(msgs, msg_headers={'io_groups': io_groups}) # writes to raw_0000.h5, raw_0001.h5, ...
+
+    for entry in load_manifest('raw.h5'): # reads raw_manifest.json
+        rd = from_rawfile(entry['filename'])
+
+Data from several io groups can also be sharded into one file per io group
+(e.g. ``raw_iog1.h5``, ``raw_iog2.h5``, ... for ``raw.h5``, see
+``shard_filename``), so that each file can be written by a separate process.
+Each message of a shard stores its position in the combined stream in the
+``stream_index`` message header, so shards are written with file version
+``shard_version`` (0.1) rather than the default version, and a small JSON
+index ``<stem>_shards.json`` lists the shards (see ``write_shard_index``).
+``from_rawfile`` and ``len_rawfile`` accept the index filename and treat the
+shards (including any files from rotating the shards) as a single file::
+
+    write_shard_index('raw.h5', io_groups=[1, 2]) # writes raw_shards.json
+    to_rawfile(shard_filename('raw.h5', 1), msgs=msgs_1, msg_headers={'io_groups': [1, 1], 'stream_index': [0, 2]}, version='0.1')
+    to_rawfile(shard_filename('raw.h5', 2), msgs=msgs_2, msg_headers={'io_groups': [2], 'stream_index': [1]}, version='0.1')
+
+    rd = from_rawfile('raw_shards.json') # msgs_1[0], msgs_2[0], msgs_1[1]
+
 File versioning
 ---------------
 
@@ -42,7 +79,7 @@ than the requested file version::
     to_rawfile('raw_v0_0.h5', version='0.1') # fails due to minor version incompatibility
     to_rawfile('raw_v0_0.h5', version='1.0') # fails due to major version incompatibility
 
-By default, the most recent file version is used.
+By default, new files are created with version ``latest_version`` (0.0).
 
 On the file read side, a version number can be requested and the file will be
 parsed assuming a specific version::
@@ -93,6 +130,15 @@ case, to convert to the standard ``larpix.format.hdf5format``::
         pkts.extend(parse(msg, io_group=io_group))
     to_file('new_filename.h5', packet_list=pkts)
 
+or, much faster, decode all of the messages into a single array with
+``parse_many``, which ``to_file`` writes directly::
+
+    from larpix.format.pacman_msg_format import parse_many
+
+    rd = from_rawfile('raw.h5')
+    arr = parse_many(rd['msgs'], io_group=rd['msg_headers']['io_groups'])
+    to_file('new_filename.h5', packet_list=arr)
+
 but as always, the most efficient means of accessing the data is to operate on
 the data itself, rather than converting between types.
 
@@ -108,6 +154,8 @@ The group ``meta`` contains file metadata stored as attributes:
 
     - ``io_version``: ``str``, optional version for message bytestring encoding, formatted as ``'major.minor'``
 
+    - ``n_msgs``: ``int``, optional number of valid messages at the start of the datasets. Only present while (or if) a ``RawFileWriter`` keeps the datasets preallocated beyond the written messages; if missing, all rows are valid
+
 Datasets (v0.0)
 ---------------
 The hdf5 format contains two datasets ``msgs`` and ``msg_headers``:
@@ -118,19 +166,31 @@ The hdf5 format contains two datasets ``msgs`` and ``msg_headers``:
 
         - ``'io_group'``: ``uint1`` representing the ``io_group`` associated with each message
 
+Datasets (v0.1)
+---------------
+Same as v0.0, with an additional ``msg_headers`` field:
+
+        - ``'stream_index'``: ``uint8`` position of each message within the combined stream of a sharded data set (``0`` if not used)
+
 '''
 import time
 import warnings
 import os
+import json
+from collections import OrderedDict
 os.environ['HDF5_USE_FILE_LOCKING'] = 'FALSE' # needed for error-free SWMR writer access
 _file_read_reattempts = 100 # also needed to ignore inevitable reader errors for SWMR mode
 
 import h5py
 import numpy as np
 
-#: Most up-to-date raw larpix hdf5 format version.
+#: Default raw larpix hdf5 format version of new files.
 latest_version = '0.0'
 
+#: Raw larpix hdf5 format version of the files of a sharded data set (the
+#: first version with a ``stream_index`` message header)
+shard_version = '0.1'
+
 #: Description of the datasets and their dtypes used in each version of the raw larpix hdf5 format.
 #:
 #: Structured as ``dataset_dtypes['<version>']['<dataset>'] = <dtype>``.
@@ -140,6 +200,13 @@ dataset_dtypes = {
         'msg_headers': np.dtype([
             ('io_groups','u1')
             ])
+    },
+    '0.1': {
+        'msgs': h5py.vlen_dtype(np.dtype('u1')),
+        'msg_headers': np.dtype([
+            ('io_groups','u1'),
+            ('stream_index','u8')
+            ])
     }
 }
 def _store_msgs_v0_0(msgs, version):
@@ -213,6 +280,25 @@ def _parse_msg_headers(msg_headers, version):
     '''
     return _parse_msg_headers_v0_0(msg_headers, version)
 
+def _fill_msg_headers(msgs, msg_headers, version):
+    '''
+    Check the message header keys and lengths, and fill any missing
+    message header fields with ``0``
+
+    :returns: ``dict`` with an iterable for each field in ``dataset_dtypes[version]['msg_headers'].names``
+
+    '''
+    headers = dict()
+    for key in (msg_headers if msg_headers is not None else dict()):
+        headers[key] = msg_headers[key]
+        if key not in dataset_dtypes[version]['msg_headers'].names:
+            raise RuntimeError('Encountered unknown message header key {}'.format(key))
+    for key in dataset_dtypes[version]['msg_headers'].names:
+        if key not in headers:
+            headers[key] = np.zeros(len(msgs))
+        assert len(headers[key]) == len(msgs), 'Data length mismatch! msgs is length {}, but msg_headers field {} is length {}'.format(len(msgs),key,len(headers[key]))
+    return headers
+
 def to_rawfile(filename, msgs=None, version=None, msg_headers=None, io_version=None):
     '''
     Write a list of bytestring messages to an hdf5 file. If the file exists,
@@ -220,7 +306,7 @@ def to_rawfile(filename, msgs=None, version=None, msg_headers=None, io_version=N
 
     :param filename: desired filename for the file to write or update
 
-    :param msgs: iterable of variable-length bytestrings to write to the file. If ``None`` specified, will only create file and update metadata.
+    :param msgs: iterable of variable-length bytestrings (or other bytes-like objects, e.g. ``memoryview``) to write to the file. If ``None`` specified, will only create file and update metadata.
 
     :param version: a string of major.minor version desired. If ``None`` specified, will use the latest file format version (if new file) or version in file (if updating an existing file).
 
@@ -263,20 +349,14 @@ def to_rawfile(filename, msgs=None, version=None, msg_headers=None, io_version=N
 
         # update data
         if msgs is not None:
-            headers = dict()
-            for key in msg_headers:
-                headers[key] = msg_headers[key]
-                if key not in dataset_dtypes[version]['msg_headers'].names:
-                    raise RuntimeError('Encountered unknown message header key {}'.format(key))
-            for key in dataset_dtypes[version]['msg_headers'].names:
-                if key not in headers:
-                    headers[key] = np.zeros(len(msgs))
-                assert len(headers[key]) == len(msgs), 'Data length mismatch! msgs is length {}, but msg_headers field {} is length {}'.format(len(msgs),key,len(headers[key]))
+            headers = _fill_msg_headers(msgs, msg_headers, version)
 
             # resize datasets
-            curr_idx = len(f['msgs'])
+            curr_idx = _len_msgs(f)
             f['msgs'].resize((curr_idx+len(msgs),))
             f['msg_headers'].resize((curr_idx+len(msgs),))
+            if 'n_msgs' in f['meta'].attrs:
+                f['meta'].attrs['n_msgs'] = curr_idx + len(msgs)
 
             # store in file
             msgs_array = _store_msgs(
@@ -284,7 +364,7 @@ def to_rawfile(filename, msgs=None, version=None, msg_headers=None, io_version=N
                 version=version
                 )
             msg_headers_array = _store_msg_headers(
-                msg_headers,
+                headers,
                 version=version
                 )
 
@@ -311,23 +391,36 @@ def _synchronize(attempts, *dsets):
     if not success:
         raise RuntimeError('Could not achieve a stable file state after {} attempts!'.format(attempts))
 
+def _len_msgs(f):
+    '''
+    :returns: number of valid messages in an open raw file, excluding rows preallocated by a ``RawFileWriter``
+
+    '''
+    length = len(f['msgs'])
+    if 'n_msgs' in f['meta'].attrs:
+        return min(int(f['meta'].attrs['n_msgs']), length)
+    return length
+
 def len_rawfile(filename, attempts=1):
     '''
     Check the total number of messages in a file
 
-    :param filename: filename to check
+    :param filename: filename to check (or the index of a sharded data set, see ``write_shard_index``)
 
     :param attempts: a parameter only relevant if file is being actively written to by another process, specifies number of refreshes to try if a synchronized state between the datasets is not achieved. A value less than ``0`` busy blocks until a synchronized state is achieved. A value greater than ``0`` tries to achieve synchronization a max of ``attempts`` before throwing a ``RuntimeError``. And a value of ``0`` does not attempt to synchronize (not recommended).
 
     :returns: ``int`` number of messages in file
 
     '''
+    if is_shard_index(filename):
+        return sum(len_rawfile(shard_file, attempts=attempts)
+            for shard_file in _shard_files(filename))
     err = None
     for _ in range(_file_read_reattempts):
         try:
             with h5py.File(filename, 'r', swmr=True, libver='latest') as f:
                 _synchronize(attempts, f['msgs'], f['msg_headers'])
-                return len(f['msgs'])
+                return _len_msgs(f)
         except OSError as e:
             if e.errno is None:
                 warnings.warn(str(e) + '\ntrying again...', RuntimeWarning)
@@ -340,7 +433,7 @@ def from_rawfile(filename, start=None, end=None, version=None, io_version=None,
     '''
     Read a chunk of bytestring messages from an existing file
 
-    :param filename: filename to read bytestrings from
+    :param filename: filename to read bytestrings from. If the index of a sharded data set is given (see ``write_shard_index``), the messages of all shards are read as a single file, ordered by their ``stream_index``.
 
     :param start: index for the start position when reading from the file (default = ``None``). If a value less than 0 is specified, index is relative to the end of the file. If ``None`` is specified, data is read from the start of the file. If a ``mask`` is specified, does nothing.
 
@@ -359,6 +452,10 @@ def from_rawfile(filename, start=None, end=None, version=None, io_version=None,
     :returns: ``dict`` with keys for ``'created'``, ``'modified'``, ``'version'``, and ``'io_version'`` metadata, along with ``'msgs'`` (a ``list`` of bytestring messages) and ``'msg_headers'`` (a dict with message header field name: ``list`` of message header field data, 1 per message)
 
     '''
+    if is_shard_index(filename):
+        return _from_shards(filename, start=start, end=end, version=version,
+            io_version=io_version, msg_headers_only=msg_headers_only,
+            mask=mask, attempts=attempts)
     err = None
     for _ in range(_file_read_reattempts):
         try:
@@ -384,9 +481,18 @@ def from_rawfile(filename, start=None, end=None, version=None, io_version=None,
                 _synchronize(attempts, f['msgs'], f['msg_headers'])
 
                 # define chunk of data to load
+                n_msgs = _len_msgs(f)
                 start = int(start) if start is not None else 0
-                end = int(end) if end is not None else len(f['msgs'])
-                mask = mask if mask is not None else slice(start,end)
+                end = int(end) if end is not None else n_msgs
+                start = max(start + n_msgs, 0) if start < 0 else min(start, n_msgs)
+                end = max(end + n_msgs, 0) if end < 0 else min(end, n_msgs)
+                if mask is not None:
+                    # pad to the preallocated length of the datasets
+                    mask = np.asarray(mask, dtype=bool)
+                    mask = np.concatenate([mask[:n_msgs],
+                        np.zeros(len(f['msgs']) - min(len(mask), n_msgs), dtype=bool)])
+                else:
+                    mask = slice(start, end)
 
                 # get data from file
                 msg_headers = _parse_msg_headers(f['msg_headers'][mask], version)
@@ -408,3 +514,569 @@ def from_rawfile(filename, start=None, end=None, version=None, io_version=None,
                 raise e
         raise err
 
+class RawFileWriter(object):
+    '''
+    Appends messages to a raw file while keeping the file open, for
+    applications that write many small batches of messages (e.g. the
+    ``PACMAN_IO`` raw file worker).
+
+    Unlike ``to_rawfile``, the file is only opened (and put into SWMR mode)
+    once. The datasets are grown geometrically as messages are written,
+    so they are rarely resized, and the file is only flushed once
+    ``flush_interval`` seconds have passed or ``flush_size`` bytes of
+    messages have been written since the last flush::
+
+        with RawFileWriter('raw.h5', flush_interval=1.) as writer:
+            writer.write(msgs, msg_headers={'io_groups': io_groups})
+            ...
+
+    While the writer is open, the number of valid messages is stored in the
+    ``n_msgs`` file metadata and updated on each flush, so ``from_rawfile``
+    (e.g. from another process) reads exactly the flushed messages. The
+    datasets keep their preallocated size until the writer is closed, when
+    they are trimmed to the written messages.
+
+    :param filename: file to create or append to
+
+    :param version: optional, file format version (see ``to_rawfile``)
+
+    :param io_version: optional, io format version of the messages (see ``to_rawfile``)
+
+    :param flush_interval: optional, maximum time in seconds between flushes of written data
+
+    :param flush_size: optional, maximum number of message bytes written between flushes
+
+    :param growth_factor: optional, factor by which the datasets are enlarged when they are full
+
+    '''
+    def __init__(self, filename, version=None, io_version=None,
+            flush_interval=1., flush_size=2**24, growth_factor=2):
+        self.filename = filename
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.growth_factor = growth_factor
+
+        # create file or check existing file compatibility
+        to_rawfile(filename, version=version, io_version=io_version)
+        self._file = h5py.File(filename, 'a', libver='latest')
+        self.version = self._file['meta'].attrs['version']
+        self._msgs = self._file['msgs']
+        self._msg_headers = self._file['msg_headers']
+
+        #: number of messages written to the file
+        self.n_msgs = _len_msgs(self._file)
+        #: number of message bytes written since the writer was opened
+        self.n_bytes = 0
+        self._capacity = len(self._msgs)
+        # attributes cannot be created once in SWMR mode
+        self._file['meta'].attrs['n_msgs'] = self.n_msgs
+        self._file.swmr_mode = True
+        self._unflushed_bytes = 0
+        self._last_flush = time.time()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def closed(self):
+        return self._file is None
+
+    def write(self, msgs, msg_headers=None):
+        '''
+        Append messages to the file, and flush if required by the flush
+        policy
+
+        :param msgs: list of bytes-like messages
+
+        :param msg_headers: optional, ``dict`` of iterables with the header of each message (see ``to_rawfile``)
+
+        '''
+        headers = _fill_msg_headers(msgs, msg_headers, self.version)
+        n = len(msgs)
+        if n:
+            if self.n_msgs + n > self._capacity:
+                self._resize(max(self.n_msgs + n,
+                    int(self._capacity * self.growth_factor)))
+            self._msgs[self.n_msgs:self.n_msgs + n] = _store_msgs(msgs,
+                version=self.version)
+            self._msg_headers[self.n_msgs:self.n_msgs + n] = _store_msg_headers(
+                headers, version=self.version)
+            self.n_msgs += n
+            nbytes = sum(len(msg) for msg in msgs)
+            self.n_bytes += nbytes
+            self._unflushed_bytes += nbytes
+        if self._unflushed_bytes >= self.flush_size or self.time_to_flush() == 0:
+            self.flush()
+
+    def time_to_flush(self):
+        '''
+        :returns: seconds until the next flush is due
+
+        '''
+        return max(self._last_flush + self.flush_interval - time.time(), 0)
+
+    def flush(self):
+        '''
+        Flush the written messages to the file
+
+        '''
+        self._msgs.flush()
+        self._msg_headers.flush()
+        # only expose the messages once they are in the file
+        self._file['meta'].attrs['n_msgs'] = self.n_msgs
+        self._file['meta'].attrs['modified'] = time.time()
+        self._file.flush()
+        self._unflushed_bytes = 0
+        self._last_flush = time.time()
+
+    def close(self):
+        '''
+        Flush and close the file
+
+        '''
+        if self.closed:
+            return
+        if self._capacity != self.n_msgs:
+            self._resize(self.n_msgs)
+        self.flush()
+        self._file.close()
+        self._file = None
+
+    def _resize(self, length):
+        self._msgs.resize((length,))
+        self._msg_headers.resize((length,))
+        self._capacity = length
+
+def manifest_filename(filename):
+    '''
+    :returns: name of the manifest file of a ``RotatingRawFileWriter`` with base filename ``filename``
+
+    '''
+    stem, ext = os.path.splitext(filename)
+    return stem + '_manifest.json'
+
+def load_manifest(filename):
+    '''
+    Load the manifest of a sequence of files written by a
+    ``RotatingRawFileWriter``.
+
+    Each entry is a ``dict`` with the keys:
+
+        - ``'filename'``: path of the file (relative to the working directory)
+        - ``'first_msg'``: index of the first message of the file within the full sequence
+        - ``'n_msgs'``: number of messages in the file
+        - ``'n_bytes'``: number of message bytes in the file
+        - ``'start_time'``, ``'end_time'``: unix time of the first and last write to the file
+        - ``'closed'``: ``False`` if the file is still being written to
+
+    :param filename: base filename used for the ``RotatingRawFileWriter`` (or the manifest filename)
+
+    :returns: ``list`` of ``dict``, one for each file in order
+
+    '''
+    if not filename.endswith('_manifest.json'):
+        filename = manifest_filename(filename)
+    with open(filename, 'r') as f:
+        files = json.load(f)['files']
+    directory = os.path.dirname(filename)
+    for entry in files:
+        entry['filename'] = os.path.join(directory, entry['filename'])
+    return files
+
+class RotatingRawFileWriter(object):
+    '''
+    Writes messages to a sequence of raw files, starting a new file when the
+    current file reaches ``max_bytes`` bytes of messages or ``max_msgs``
+    messages, or when it has been open for ``max_duration`` seconds. Files
+    are named ``<stem>_<index><ext>`` after the base ``filename`` (e.g.
+    ``raw_0000.h5``, ``raw_0001.h5``, ... for ``raw.h5``), and are listed in
+    a JSON manifest ``<stem>_manifest.json`` (see ``load_manifest``) that is
+    updated whenever a file is opened or closed.
+
+    Batches of messages are not split across files, so files may exceed
+    ``max_bytes`` or ``max_msgs`` by up to one batch. If a manifest for
+    ``filename`` already exists, the sequence is continued.
+
+    The other keyword arguments are passed to the ``RawFileWriter`` of each
+    file.
+
+    :param filename: base filename
+
+    :param max_bytes: optional, number of message bytes after which a new file is started
+
+    :param max_msgs: optional, number of messages after which a new file is started
+
+    :param max_duration: optional, number of seconds after which a new file is started
+
+    '''
+    def __init__(self, filename, max_bytes=None, max_msgs=None,
+            max_duration=None, **writer_kwargs):
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.max_msgs = max_msgs
+        self.max_duration = max_duration
+        self._writer_kwargs = writer_kwargs
+        self._writer = None
+        self._entry = None
+
+        self.manifest_filename = manifest_filename(filename)
+        self._files = list()
+        if os.path.exists(self.manifest_filename):
+            with open(self.manifest_filename, 'r') as f:
+                self._files = json.load(f)['files']
+            for entry in self._files:
+                entry['closed'] = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def filenames(self):
+        '''
+        Paths of the files written so far
+
+        '''
+        directory = os.path.dirname(self.filename)
+        return [os.path.join(directory, entry['filename']) for entry in self._files]
+
+    def write(self, msgs, msg_headers=None):
+        '''
+        Append messages to the current file, starting a new file if required
+
+        :param msgs: list of bytes-like messages
+
+        :param msg_headers: optional, ``dict`` of iterables with the header of each message (see ``to_rawfile``)
+
+        '''
+        if self._writer is not None and self.max_duration is not None \
+                and time.time() >= self._entry['start_time'] + self.max_duration:
+            self.rotate()
+        if self._writer is None:
+            self._open()
+        self._writer.write(msgs, msg_headers=msg_headers)
+        self._entry['n_msgs'] = self._writer.n_msgs
+        self._entry['n_bytes'] = self._writer.n_bytes
+        self._entry['end_time'] = time.time()
+        if (self.max_bytes is not None and self._writer.n_bytes >= self.max_bytes) \
+                or (self.max_msgs is not None and self._writer.n_msgs >= self.max_msgs):
+            self.rotate()
+
+    def time_to_flush(self):
+        '''
+        :returns: seconds until the next flush of the current file is due (``None`` if no file is open)
+
+        '''
+        if self._writer is None:
+            return None
+        return self._writer.time_to_flush()
+
+    def flush(self):
+        '''
+        Flush the current file
+
+        '''
+        if self._writer is not None:
+            self._writer.flush()
+
+    def rotate(self):
+        '''
+        Close the current file. The next write starts a new file.
+
+        '''
+        if self._writer is None:
+            return
+        self._writer.close()
+        self._writer = None
+        self._entry['closed'] = True
+        self._entry = None
+        self._write_manifest()
+
+    def close(self):
+        '''
+        Close the current file
+
+        '''
+        self.rotate()
+
+    def _open(self):
+        stem, ext = os.path.splitext(os.path.basename(self.filename))
+        index = len(self._files)
+        first_msg = 0
+        if self._files:
+            first_msg = self._files[-1]['first_msg'] + self._files[-1]['n_msgs']
+        now = time.time()
+        self._entry = dict(filename='{}_{:04d}{}'.format(stem, index, ext),
+            first_msg=first_msg, n_msgs=0, n_bytes=0, start_time=now,
+            end_time=now, closed=False)
+        self._files.append(self._entry)
+        self._writer = RawFileWriter(self.filenames[-1], **self._writer_kwargs)
+        self._write_manifest()
+
+    def _write_manifest(self):
+        # replace the manifest in a single step so readers never see a partial file
+        tmp_filename = self.manifest_filename + '.tmp'
+        with open(tmp_filename, 'w') as f:
+            json.dump(dict(files=self._files), f, indent=4)
+        os.replace(tmp_filename, self.manifest_filename)
+
+def shard_filename(filename, io_group):
+    '''
+    :returns: name of the shard of ``io_group`` for base filename ``filename`` (e.g. ``raw_iog1.h5`` for ``raw.h5``)
+
+    '''
+    stem, ext = os.path.splitext(filename)
+    return '{}_iog{}{}'.format(stem, io_group, ext)
+
+def shard_index_filename(filename):
+    '''
+    :returns: name of the index of a sharded data set with base filename ``filename``
+
+    '''
+    stem, ext = os.path.splitext(filename)
+    return stem + '_shards.json'
+
+def is_shard_index(filename):
+    '''
+    :returns: ``True`` if ``filename`` is the index of a sharded data set
+
+    '''
+    return str(filename).endswith('_shards.json')
+
+def write_shard_index(filename, io_groups):
+    '''
+    Create (or replace) the index of a data set that is sharded by io group.
+    The shard of each io group is written to ``shard_filename(filename,
+    io_group)``, either as a single file or as a sequence of files with a
+    ``RotatingRawFileWriter``. Shards that have not been created yet are
+    ignored when reading.
+
+    :param filename: base filename of the data set
+
+    :param io_groups: io groups of the shards
+
+    :returns: filename of the index
+
+    '''
+    index_filename = shard_index_filename(filename)
+    shards = [dict(io_group=int(io_group),
+        filename=os.path.basename(shard_filename(filename, io_group)))
+        for io_group in io_groups]
+    # replace the index in a single step so readers never see a partial file
+    tmp_filename = index_filename + '.tmp'
+    with open(tmp_filename, 'w') as f:
+        json.dump(dict(shards=shards), f, indent=4)
+    os.replace(tmp_filename, index_filename)
+    return index_filename
+
+def load_shard_index(filename):
+    '''
+    Load the index of a sharded data set.
+
+    Each entry is a ``dict`` with the keys:
+
+        - ``'io_group'``: io group of the shard
+        - ``'filename'``: path of the shard (relative to the working directory). If the shard was rotated, this is the base filename of its ``RotatingRawFileWriter``.
+
+    :param filename: base filename of the data set (or the index filename)
+
+    :returns: ``list`` of ``dict``, one for each shard
+
+    '''
+    if not is_shard_index(filename):
+        filename = shard_index_filename(filename)
+    with open(filename, 'r') as f:
+        shards = json.load(f)['shards']
+    directory = os.path.dirname(filename)
+    for entry in shards:
+        entry['filename'] = os.path.join(directory, entry['filename'])
+    return shards
+
+def _shard_files(filename):
+    '''
+    :returns: ``list`` of the existing files of all shards of a data set
+
+    '''
+    files = list()
+    for shard in load_shard_index(filename):
+        if os.path.exists(manifest_filename(shard['filename'])):
+            files.extend(entry['filename'] for entry in load_manifest(shard['filename']))
+        elif os.path.exists(shard['filename']):
+            files.append(shard['filename'])
+    return files
+
+def next_stream_index(filename, attempts=1):
+    '''
+    Find the ``stream_index`` with which to continue writing a sharded
+    data set, i.e. one more than the largest ``stream_index`` stored in
+    its shards, so that the messages of a new writer are ordered after the
+    existing messages.
+
+    :param filename: base filename of the data set (or the index filename)
+
+    :returns: ``int``, ``0`` if the data set does not exist or has no messages
+
+    '''
+    if not is_shard_index(filename):
+        filename = shard_index_filename(filename)
+    if not os.path.exists(filename):
+        return 0
+    index = 0
+    for shard_file in _shard_files(filename):
+        # messages of each file are stored in stream order
+        rd = from_rawfile(shard_file, start=-1, msg_headers_only=True, attempts=attempts)
+        if 'stream_index' not in rd['msg_headers']:
+            raise RuntimeError('Shards require file version 0.1 or newer, found {}'.format(rd['version']))
+        if rd['msg_headers']['stream_index']:
+            index = max(index, rd['msg_headers']['stream_index'][-1] + 1)
+    return int(index)
+
+class _ShardOrder(object):
+    '''
+    Merged stream order of the messages of all shards of a data set. The
+    message headers of each file are only read once, and only the messages
+    appended since the last ``update`` are read on later updates.
+
+    '''
+    def __init__(self, filename, version=None, io_version=None):
+        self.filename = filename
+        self.version = version
+        self.io_version = io_version
+        #: files of the shards, in the order used by ``file_id``
+        self.files = list()
+        self._file_headers = dict()
+        self.lengths = np.zeros(0, dtype=int)
+        self.file_id = np.zeros(0, dtype=int)
+        self.row = np.zeros(0, dtype=int)
+        self.order = np.zeros(0, dtype=int)
+
+    def update(self, attempts=1):
+        '''
+        Read the message headers that were added to the shards since the last
+        update, and merge them into ``order``
+
+        '''
+        files = _shard_files(self.filename)
+        changed = files != self.files
+        for shard_file in files:
+            length = len_rawfile(shard_file, attempts=attempts)
+            headers = self._file_headers.get(shard_file)
+            if headers is not None and length == len(headers['stream_index']):
+                continue
+            if headers is None or length < len(headers['stream_index']):
+                # new (or replaced) file
+                headers = dict(stream_index=np.zeros(0, dtype='u8'))
+            rd = from_rawfile(shard_file, start=len(headers['stream_index']),
+                end=length, version=self.version, io_version=self.io_version,
+                msg_headers_only=True, attempts=attempts)
+            if 'stream_index' not in rd['msg_headers']:
+                raise RuntimeError('Shards require file version 0.1 or newer, found {}'.format(rd['version']))
+            rd['stream_index'] = np.concatenate([headers['stream_index'],
+                np.array(rd['msg_headers'].pop('stream_index'), dtype='u8')])
+            self._file_headers[shard_file] = rd
+            changed = True
+        if not changed:
+            return
+        for shard_file in set(self._file_headers) - set(files):
+            del self._file_headers[shard_file]
+        self.files = files
+        stream_index = [self._file_headers[shard_file]['stream_index'] for shard_file in files]
+        self.lengths = np.array([len(index) for index in stream_index], dtype=int)
+        self.file_id = np.repeat(np.arange(len(files)), self.lengths)
+        self.row = np.concatenate([np.arange(length) for length in self.lengths]) \
+            if len(files) else np.zeros(0, dtype=int)
+        self.order = np.argsort(np.concatenate(stream_index), kind='stable') \
+            if len(files) else np.zeros(0, dtype=int)
+
+    def headers(self):
+        '''
+        :returns: ``list`` of the ``from_rawfile`` metadata of each file
+
+        '''
+        return [self._file_headers[shard_file] for shard_file in self.files]
+
+#: cached ``_ShardOrder`` of the most recently read sharded data sets
+_shard_orders = OrderedDict()
+_max_shard_orders = 8
+
+def _shard_order(filename, version=None, io_version=None, attempts=1):
+    '''
+    :returns: up-to-date ``_ShardOrder`` of a sharded data set, reusing the cached order of earlier reads
+
+    '''
+    key = (os.path.abspath(filename), version, io_version)
+    order = _shard_orders.pop(key, None)
+    if order is None:
+        order = _ShardOrder(filename, version=version, io_version=io_version)
+    _shard_orders[key] = order
+    while len(_shard_orders) > _max_shard_orders:
+        _shard_orders.popitem(last=False)
+    order.update(attempts=attempts)
+    return order
+
+def _from_shards(filename, start=None, end=None, version=None, io_version=None,
+        msg_headers_only=False, mask=None, attempts=1):
+    '''
+    Read a chunk of messages from the shards of a data set, see ``from_rawfile``
+
+    '''
+    shard_order = _shard_order(filename, version=version,
+        io_version=io_version, attempts=attempts)
+    files = shard_order.files
+    if not files:
+        names = dataset_dtypes[shard_version if version is None else version]['msg_headers'].names
+        return dict(created=None, modified=None, version=version,
+            io_version=io_version, msgs=None if msg_headers_only else [],
+            msg_headers=dict((name, []) for name in names))
+
+    # order the messages of all files by their position in the stream
+    headers = shard_order.headers()
+    order = shard_order.order
+    if mask is not None:
+        selected = order[np.asarray(mask, dtype=bool)]
+    else:
+        start = int(start) if start is not None else 0
+        end = int(end) if end is not None else len(order)
+        selected = order[start:end]
+
+    # messages of each file are stored in stream order
+    msgs = [None] * len(selected) if not msg_headers_only else None
+    msg_headers = dict((key, [None] * len(selected))
+        for key in list(headers[0]['msg_headers']) + ['stream_index'])
+    selected_file_id = shard_order.file_id[selected]
+    for i, shard_file in enumerate(files):
+        index = np.flatnonzero(selected_file_id == i)
+        if not len(index):
+            continue
+        rows = shard_order.row[selected[index]]
+        if mask is not None:
+            file_mask = np.zeros(shard_order.lengths[i], dtype=bool)
+            file_mask[rows] = True
+            rd = from_rawfile(shard_file, version=version, io_version=io_version,
+                msg_headers_only=msg_headers_only, mask=file_mask, attempts=attempts)
+            rows = np.arange(len(index))
+        else:
+            # a contiguous chunk of the stream is a contiguous chunk of each file
+            first_row = int(rows.min())
+            rd = from_rawfile(shard_file, start=first_row, end=int(rows.max()) + 1,
+                version=version, io_version=io_version,
+                msg_headers_only=msg_headers_only, attempts=attempts)
+            rows = rows - first_row
+        for j, k in zip(rows.tolist(), index.tolist()):
+            if msgs is not None:
+                msgs[k] = rd['msgs'][j]
+            for key in msg_headers:
+                msg_headers[key][k] = rd['msg_headers'][key][j]
+    return dict(
+        created=min(rd['created'] for rd in headers),
+        modified=max(rd['modified'] for rd in headers),
+        version=min(rd['version'] for rd in headers),
+        io_version=headers[0]['io_version'],
+        msgs=msgs,
+        msg_headers=msg_headers
+        )
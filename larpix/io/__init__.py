@@ -4,3 +4,5 @@ from larpix.io.serialport import *
 from larpix.io.multizmq_io import *
 from larpix.io.zmq_io import *
 from larpix.io.pacman_io import *
+from larpix.io.pacman_emulator import *
+from larpix.io.replay_io import *
@@ -1,6 +1,7 @@
 import bidict
 
 from larpix import configs
+from larpix import PacketArray
 
 class IO(object):
     '''
@@ -104,4 +105,19 @@ class IO(object):
         '''
         pass
 
+    def empty_queue_array(self):
+        '''
+        Read and remove the current items in the internal queue, as with
+        ``empty_queue``, but return the packets as a ``PacketArray``.
+
+        The default implementation converts the output of ``empty_queue``.
+        IO classes that can decode the received data directly into an
+        array should override this method.
+
+        :returns: ``tuple`` of (``PacketArray``, raw bytestream)
+
+        '''
+        packets, bytestream = self.empty_queue()
+        return PacketArray.from_packets(packets), bytestream
+
 
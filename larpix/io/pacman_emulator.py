@@ -0,0 +1,286 @@
+import time
+import threading
+from collections import deque
+
+import zmq
+import numpy as np
+
+import larpix.format.pacman_msg_format as pacman_msg_format
+from larpix import Packet_v2
+from larpix.packet.parity import assign_parity
+
+class PACMANEmulator(object):
+    '''
+    A pure-python stand-in for a PACMAN board, used to exercise ``PACMAN_IO``
+    (e.g. for throughput benchmarks) without hardware.
+
+    The emulator binds the same command (``zmq.REP``) and data
+    (``zmq.PUB``) endpoints as a PACMAN and serves them from a background
+    thread::
+
+        emulator = PACMANEmulator(address='127.0.0.1', msg_rate=1000, packets_per_msg=64)
+        emulator.start()
+        ... # connect a PACMAN_IO to 127.0.0.1
+        emulator.stop()
+
+    Requests are answered following ``larpix.format.pacman_msg_format``:
+    ``PING`` words with ``PONG``, ``WRITE`` and ``READ`` words access an
+    emulated register space (``registers``), and ``TX`` words are echoed
+    back. Each register write is recorded, in order, as a ``(time,
+    register, value)`` tuple in ``register_writes``. If ``loopback`` is
+    set, transmitted config write packets are stored per chip and config
+    read packets are answered with a config read reply on the data socket,
+    like a network of LArPix chips would. A fraction ``tx_loss`` of the transmitted packets is randomly lost before
+    reaching the chips, to emulate an unreliable link. The number of
+    transmitted packets is counted in ``n_tx_packets``.
+
+    While running, synthetic ``DATA`` messages of ``packets_per_msg`` data
+    packets (spread over ``n_io_channels`` io channels) are published at
+    ``msg_rate`` messages per second (as fast as possible if ``0``, and not
+    at all if ``None``), up to ``max_msgs`` messages. Sync and trigger
+    messages are published every ``sync_period`` and ``trigger_period``
+    seconds, if set. The number of messages and packets that were published
+    are counted in ``n_data_msgs`` and ``n_data_packets``.
+
+    :param address: address to bind to
+
+    :param cmdserver_port: port of the command server, or ``None`` to bind to a random free port (stored in ``cmdserver_port`` once started)
+
+    :param dataserver_port: port of the data server, or ``None`` to bind to a random free port (stored in ``dataserver_port`` once started)
+
+    :param msg_rate: data messages per second
+
+    :param packets_per_msg: data packets in each message
+
+    :param n_io_channels: number of io channels the data packets are spread over
+
+    :param max_msgs: optional, stop publishing data messages after this many messages
+
+    :param sync_period: optional, time between sync messages in seconds
+
+    :param trigger_period: optional, time between trigger messages in seconds
+
+    :param loopback: emulate the config registers of the chips
+
+    :param hwm: high water mark of the data socket
+
+    :param tx_loss: fraction of transmitted packets that are lost
+
+    '''
+    n_templates = 16
+
+    def __init__(self, address='127.0.0.1', cmdserver_port='5555',
+            dataserver_port='5556', msg_rate=None, packets_per_msg=64,
+            n_io_channels=4, max_msgs=None, sync_period=None,
+            trigger_period=None, loopback=True, hwm=20000, tx_loss=0.):
+        self.address = address
+        self.cmdserver_port = str(cmdserver_port) if cmdserver_port is not None else None
+        self.dataserver_port = str(dataserver_port) if dataserver_port is not None else None
+        self.msg_rate = msg_rate
+        self.packets_per_msg = packets_per_msg
+        self.n_io_channels = n_io_channels
+        self.max_msgs = max_msgs
+        self.sync_period = sync_period
+        self.trigger_period = trigger_period
+        self.loopback = loopback
+        self.hwm = hwm
+        self.tx_loss = tx_loss
+
+        self.registers = dict()
+        self.register_writes = list()
+        self.chip_registers = dict()
+        self.n_requests = 0
+        self.n_data_msgs = 0
+        self.n_data_packets = 0
+        self.n_tx_packets = 0
+
+        self._rng = np.random.default_rng()
+        self._templates = self._data_templates()
+        self._replies = deque()
+        self._stop = threading.Event()
+        self._data_start = None
+        self._thread = None
+        self._context = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        '''
+        Bind the sockets and start serving requests and publishing data
+
+        '''
+        self._context = zmq.Context()
+        self._cmd_socket = self._context.socket(zmq.REP)
+        self._data_socket = self._context.socket(zmq.PUB)
+        self._data_socket.set_hwm(self.hwm)
+        try:
+            self.cmdserver_port = self._bind(self._cmd_socket, self.cmdserver_port)
+            self.dataserver_port = self._bind(self._data_socket, self.dataserver_port)
+        except zmq.ZMQError:
+            self._cmd_socket.close(linger=0)
+            self._data_socket.close(linger=0)
+            self._context.term()
+            raise
+        self._stop.clear()
+        self._data_start = time.time()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _bind(self, socket, port):
+        '''
+        :returns: port that ``socket`` was bound to
+
+        '''
+        if port is None:
+            return str(socket.bind_to_random_port('tcp://{}'.format(self.address)))
+        socket.bind('tcp://{}:{}'.format(self.address, port))
+        return port
+
+    def stop(self):
+        '''
+        Stop the emulator and close the sockets
+
+        '''
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self._cmd_socket.close(linger=0)
+        self._data_socket.close(linger=0)
+        self._context.term()
+
+    def start_data(self, msg_rate=0, max_msgs=None):
+        '''
+        (Re)start publishing data messages at ``msg_rate`` messages per
+        second, and reset the data counters
+
+        '''
+        self.n_data_msgs = 0
+        self.n_data_packets = 0
+        self.max_msgs = max_msgs
+        self._data_start = time.time()
+        self.msg_rate = msg_rate
+
+    def stop_data(self):
+        '''
+        Stop publishing data messages
+
+        '''
+        self.msg_rate = None
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _data_templates(self):
+        '''
+        Pre-generate the synthetic data messages, so that publishing is cheap
+
+        '''
+        rng = np.random.default_rng(0)
+        templates = list()
+        n = self.packets_per_msg
+        for _ in range(self.n_templates):
+            words = (
+                np.uint64(Packet_v2.DATA_PACKET)
+                | (rng.integers(0, 256, n, dtype=np.uint64) << np.uint64(Packet_v2.chip_id_bits.start))
+                | (rng.integers(0, 64, n, dtype=np.uint64) << np.uint64(Packet_v2.channel_id_bits.start))
+                | (np.sort(rng.integers(0, 2**31, n, dtype=np.uint64)) << np.uint64(Packet_v2.timestamp_bits.start))
+                | (rng.integers(0, 256, n, dtype=np.uint64) << np.uint64(Packet_v2.dataword_bits.start))
+                | (np.uint64(1) << np.uint64(Packet_v2.downstream_marker_bits.start))
+                )
+            io_channel = np.arange(n) % self.n_io_channels + 1
+            templates.append(pacman_msg_format.format_words(assign_parity(words),
+                io_channel=io_channel, msg_type='DATA',
+                receipt_timestamp=np.arange(n)))
+        return templates
+
+    def _reply(self, msg):
+        '''
+        :returns: reply message to a request
+
+        '''
+        header, words = pacman_msg_format.parse_msg(msg)
+        reply = list()
+        for word in words:
+            if word[0] == 'PING':
+                reply.append(('PONG',))
+            elif word[0] == 'WRITE':
+                self.registers[word[1]] = word[2]
+                self.register_writes.append((time.time(), word[1], word[2]))
+                reply.append(word)
+            elif word[0] == 'READ':
+                reply.append(('READ', word[1], self.registers.get(word[1], 0)))
+            elif word[0] == 'TX':
+                self.n_tx_packets += 1
+                if self.loopback and not (self.tx_loss and self._rng.random() < self.tx_loss):
+                    self._loopback(word[1], word[2])
+                reply.append(word)
+            else:
+                reply.append(('ERR', 0, b'unknown word'))
+        return pacman_msg_format.format_msg('REP', reply)
+
+    def _loopback(self, io_channel, data):
+        packet = Packet_v2(data)
+        key = (io_channel, packet.chip_id, packet.register_address)
+        if packet.packet_type == Packet_v2.CONFIG_WRITE_PACKET:
+            self.chip_registers[key] = packet.register_data
+        elif packet.packet_type == Packet_v2.CONFIG_READ_PACKET:
+            reply = Packet_v2()
+            reply.packet_type = Packet_v2.CONFIG_READ_PACKET
+            reply.chip_id = packet.chip_id
+            reply.register_address = packet.register_address
+            reply.register_data = self.chip_registers.get(key, 0)
+            reply.downstream_marker = 1
+            reply.assign_parity()
+            self._replies.append((io_channel, reply.as_int()))
+
+    def _publish_replies(self):
+        if not self._replies:
+            return
+        replies = [self._replies.popleft() for _ in range(len(self._replies))]
+        self._data_socket.send(pacman_msg_format.format_words(
+            [word for _, word in replies],
+            io_channel=[io_channel for io_channel, _ in replies],
+            msg_type='DATA'))
+
+    def _run(self):
+        poller = zmq.Poller()
+        poller.register(self._cmd_socket, zmq.POLLIN)
+        start = time.time()
+        next_sync = start if self.sync_period else None
+        next_trigger = start if self.trigger_period else None
+        while not self._stop.is_set():
+            now = time.time()
+            # publish data messages that are due
+            n_due = 0
+            msg_rate = self.msg_rate
+            if msg_rate is not None:
+                n_due = 1000 if not msg_rate else int((now - self._data_start) * msg_rate) - self.n_data_msgs
+                if self.max_msgs is not None:
+                    n_due = min(n_due, self.max_msgs - self.n_data_msgs)
+            for _ in range(max(n_due, 0)):
+                self._data_socket.send(self._templates[self.n_data_msgs % self.n_templates])
+                self.n_data_msgs += 1
+                self.n_data_packets += self.packets_per_msg
+            if next_sync is not None and now >= next_sync:
+                self._data_socket.send(pacman_msg_format.format_msg('DATA',
+                    [('SYNC', b'S', 0, int((now - start) * 1e7) & 0xffffffff)]))
+                next_sync += self.sync_period
+            if next_trigger is not None and now >= next_trigger:
+                self._data_socket.send(pacman_msg_format.format_msg('DATA',
+                    [('TRIG', b'\x01', int((now - start) * 1e7) & 0xffffffff)]))
+                next_trigger += self.trigger_period
+
+            # serve requests
+            timeout = 0 if n_due > 0 and msg_rate == 0 else 1
+            if poller.poll(timeout):
+                msg = self._cmd_socket.recv()
+                self.n_requests += 1
+                self._cmd_socket.send(self._reply(msg))
+                self._publish_replies()
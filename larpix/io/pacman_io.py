@@ -2,8 +2,10 @@ import itertools
 import zmq
 import bidict
 import time
-from collections import defaultdict
+from collections import defaultdict, deque
 import multiprocessing
+import threading
+import weakref
 import sys
 if sys.version_info[0] >= 3:
     from queue import Empty
@@ -11,11 +13,23 @@ else:
     from Queue import Empty
 import os
 
+import numpy as np
+import h5py
+
 from larpix.io import IO
 from larpix.configs import load
 import larpix.format.pacman_msg_format as pacman_msg_format
 import larpix.format.rawhdf5format as rawhdf5format
-from larpix import Packet_v2
+from larpix import Packet_v2, DuplicateFilter, PacketArray
+
+# raw file workers are forked where possible, so that (as with the original
+# eager workers) the main module is not re-imported in the worker. Workers
+# are launched on demand, when the receiver and telemetry threads may already
+# be running, so threads that use h5py hold _h5py_fork_lock and workers are
+# only forked while it is free, so the child never inherits a held HDF5 lock
+_raw_file_mp_context = multiprocessing.get_context(
+    'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn')
+_h5py_fork_lock = threading.Lock()
 
 class PACMAN_IO(IO):
     '''
@@ -26,14 +40,21 @@ class PACMAN_IO(IO):
     formatted messages to/from the PACMAN boards. If you want more
     info on how messages are formatted, see ``larpix.format.pacman_msg_format``.
 
-    The PACMAN_IO object has five flags for optimizing communications
+    The PACMAN_IO object has twelve flags for optimizing communications
     which you may or may not want to enable:
 
         - ``group_packets_by_io_group``
         - ``interleave_packets_by_io_channel``
         - ``double_send_packets``
         - ``enable_raw_file_writing``
+        - ``enable_raw_file_rotation``
+        - ``enable_raw_file_sharding``
         - ``disable_packet_parsing``
+        - ``disable_bytestream``
+        - ``enable_packet_views``
+        - ``drop_duplicate_packets``
+        - ``enable_pipelined_requests``
+        - ``enable_receiver_thread``
 
     To enable each option set the flag to ``True``; to disable, set to
     ``False``.
@@ -42,12 +63,40 @@ class PACMAN_IO(IO):
 
         - The ``interleave_packets_by_io_channel`` option is enabled by default and interleaves packets within a given message to each io_channel on a given io_group. E.g. 3 packets destined for ``io_channel=1``, ``io_channel=1``, and ``io_channel=2`` will be reordered to ``io_channel=1``, ``io_channel=2``, and ``io_channel=1``. The order of the packets is preserved for each io_channel. This increases the data throughput by about a factor of N, where N is the number of io channels in the message.
 
-        - The ``double_send_packets`` option is disabled by default and duplicates each packet sent to the PACMAN by a call to ``send()``. This is potentially useful for working around the 512 bug when you need to insure that a packet reaches a chip, but you don't care about introducing extra packets into the system (i.e. when configuring chips).
+        - The ``double_send_packets`` option is disabled by default and duplicates each packet sent to the PACMAN by a call to ``send()``. This is potentially useful for working around the 512 bug when you need to insure that a packet reaches a chip, but you don't care about introducing extra packets into the system (i.e. when configuring chips). For config writes, ``Controller.reliable_write_configuration`` is usually preferable: it sends each write once, confirms delivery with config reads, and only retransmits the registers that were not confirmed.
+
+        - The ``enable_raw_file_writing`` option will directly dump data to a larpix raw hdf5 formatted file. This is used as a more performant means of logging data (see ``larpix.format.rawhdf5format``). The data file name can be accessed or changed via the ``raw_filename`` attribute, or can be set when creating the ``PACMAN_IO`` object with the ``raw_directory`` and ``raw_filename`` keyword args. The file is written by a separate worker process that keeps the file open (see ``larpix.format.rawhdf5format.RawFileWriter``) and flushes it at least every ``raw_file_flush_interval`` seconds or ``raw_file_flush_size`` bytes of messages. The worker runs until ``join()`` is called (or the ``raw_filename`` is changed), so call ``join()`` to make sure that all data have been written before reading the file. The worker is forked on POSIX systems. On platforms without ``fork`` (e.g. Windows) it is spawned instead, which re-imports the main module, so scripts that enable raw file writing there must protect their top-level code with ``if __name__ == '__main__':``.
 
-        - The ``enable_raw_file_writing`` option will directly dump data to a larpix raw hdf5 formatted file. This is used as a more performant means of logging data (see ``larpix.format.rawhdf5format``). The data file name can be accessed or changed via the ``raw_filename`` attribute, or can be set when creating the ``PACMAN_IO`` object with the ``raw_directory`` and ``raw_filename`` keyword args.
+        - The ``enable_raw_file_rotation`` option is disabled by default and splits the raw data into a sequence of files named after the ``raw_filename`` (e.g. ``raw_0000.h5``, ``raw_0001.h5``, ... for ``raw.h5``, see ``larpix.format.rawhdf5format.RotatingRawFileWriter``). A new file is started when the current file reaches ``raw_file_max_bytes`` bytes or ``raw_file_max_msgs`` messages, when it has been open for ``raw_file_max_duration`` seconds (each limit is ignored if ``None``), or when ``rotate_raw_file()`` is called. Files are closed by the raw file worker, so rotation does not stall receiving data. The name, message range, and time span of each file are kept in a JSON manifest (``raw_manifest_filename``), so that the files can be converted or transferred one by one while data taking continues.
+
+        - The ``enable_raw_file_sharding`` option is disabled by default and writes the raw data of each io group to a separate file (e.g. ``raw_iog1.h5``, ``raw_iog2.h5``, ... for ``raw.h5``) with a separate worker process, so that the file writing throughput scales with the number of PACMANs. Each message keeps its position in the combined stream (continuing after the last stored message if the shards of ``raw_filename`` already exist), and an index of the shards (``raw_shard_index_filename``) can be passed to ``larpix.format.rawhdf5format.from_rawfile`` to read all shards as a single file (see ``larpix.format.rawhdf5format.write_shard_index``). Can be combined with ``enable_raw_file_rotation``, in which case each shard is rotated independently.
 
         - The ``disable_packet_parsing`` option will skip converting PACMAN messages into ``larpix.packet`` types. Thus if ``disable_packet_parsing=True``, every call to ``empty_queue`` will return ``[], b''``. Typically used in conjunction with ``enable_raw_file_writing``, this allows the PACMAN_IO class to read data much faster.
 
+        - The ``disable_bytestream`` option is disabled by default and skips joining the received messages into the bytestream returned by ``empty_queue`` (``b''`` is returned instead). Received messages are kept as zero-copy ``memoryview`` objects of the ZMQ frames, so if the bytestream is not needed the data are not copied at all for parsing.
+
+        - The ``enable_packet_views`` option is disabled by default and returns received data packets as read-only ``larpix.packet.PacketView`` objects that refer back into the received messages rather than copying each packet into a new ``Packet_v2``. Packet fields are then only decoded when accessed, which is much faster if only a fraction of the received packets are inspected.
+
+        - The ``drop_duplicate_packets`` option is disabled by default and skips received packets that the ``duplicate_filter`` (a ``larpix.packet.DuplicateFilter``) flags as exact repeats of a recent packet from the same io group and io channel. By default only config read packets are filtered, which removes the doubled replies caused by ``double_send_packets``. The filter is reset by each ``send``, so replies should be read with ``empty_queue`` before a request is repeated. Duplicates are removed before packet objects are created, but are still written to the raw file and bytestream.
+
+        - The ``enable_pipelined_requests`` option is disabled by default and sends the messages of a call to ``send()`` over a separate ``zmq.DEALER`` connection, keeping up to ``pipeline_window`` requests outstanding per io group instead of waiting for each reply before sending the next message. This keeps the PACMAN command server busy during large transfers that are split into several messages. Each request is tagged with a sequence number that the server returns with the reply, so replies are matched back to their requests. The window starts at ``pipeline_window`` and adapts to the measured reply latency (between 1 and ``max_pipeline_window``): it grows while replies come back at the minimum observed latency and shrinks when requests start to queue up at the server.
+
+        - The ``enable_receiver_thread`` option is disabled by default and, while listening, continuously drains the data sockets from a background thread into a bounded in-memory buffer of up to ``receive_buffer_length`` messages. Calls to ``empty_queue`` then just collect the buffered messages. This prevents messages from being dropped by ZMQ (beyond ``hwm``) when ``empty_queue`` is not called for a long time, e.g. during the ``time.sleep`` calls in ``Controller.run``. If the buffer is full, the oldest messages are dropped. The number of dropped messages and the largest number of messages held in the buffer are available from ``n_dropped_msgs`` and ``receive_buffer_high_water``.
+
+    The PACMAN supply rails can be monitored during a run with
+    ``start_telemetry``, which samples the VDDD, VDDA, and Vplus ADCs of
+    every io group at a fixed interval from a background thread over its own
+    command connections, so that control messages are not delayed. The most
+    recent values (``get_telemetry``) and a bounded history of each rail
+    (``get_telemetry_history``) can be read at any time without waiting for
+    the PACMANs, and the samples can also be appended to an HDF5 file.
+
+    Received data can also be read with ``empty_queue_array``, which decodes
+    all waiting messages directly into a ``larpix.packet.PacketArray`` in a
+    single vectorized pass rather than creating a packet object for each
+    word. This is the fastest way to inspect large volumes of data in
+    python (e.g. with ``Controller.read(as_array=True)``).
+
 
     '''
     default_filepath = 'io/pacman.json'
@@ -61,7 +110,31 @@ class PACMAN_IO(IO):
     interleave_packets_by_io_channel = True
     double_send_packets = False
     enable_raw_file_writing = False
+    enable_raw_file_rotation = False
+    enable_raw_file_sharding = False
     disable_packet_parsing = False
+    disable_bytestream = False
+    enable_packet_views = False
+    drop_duplicate_packets = False
+    enable_pipelined_requests = False
+
+    enable_receiver_thread = False
+
+    raw_file_flush_interval = 1.
+    raw_file_flush_size = 2**24
+    raw_file_max_bytes = 2**30
+    raw_file_max_msgs = None
+    raw_file_max_duration = None
+
+    _raw_file_stop = 'stop'
+    _raw_file_rotate = 'rotate'
+
+    #: nominal larpix master clock frequency (Hz), used to wait for reset pulses to finish
+    larpix_mclk_frequency = 10e6
+
+    pipeline_window = 4
+    max_pipeline_window = 32
+    receive_buffer_length = 2**18
 
     _base_ctrl_reg = 0x10
     _clk_ctrl_reg = 0x1010
@@ -91,6 +164,7 @@ class PACMAN_IO(IO):
             self.senders[address] = self.context.socket(zmq.REQ)
             self.receivers[address] = self.context.socket(zmq.SUB)
         self.hwm = hwm
+        self.timeout = timeout
         for receiver in self.receivers.values():
             receiver.set_hwm(self.hwm)
             receiver.setsockopt(zmq.CONNECT_TIMEOUT,max(timeout,0))
@@ -109,24 +183,42 @@ class PACMAN_IO(IO):
             self.senders[address].connect(send_address)
             self.receivers[address].connect(receive_address)
         self._sender_replies = defaultdict(list)
+        self._pipeline_senders = bidict.bidict()
+        self._pipeline_state = dict()
+        self._pipeline_seq = itertools.count()
+        self.duplicate_filter = DuplicateFilter()
         self.poller = zmq.Poller()
         for receiver in self.receivers.values():
             self.poller.register(receiver, zmq.POLLIN)
-
-        self._raw_file_queue = multiprocessing.Queue()
+        self._receive_buffer = _MessageBuffer(self.receive_buffer_length)
+        self._receiver_thread = None
+        self._stop_receiver = threading.Event()
+        self._telemetry_sampler = None
+
+        self._raw_file_queue = _raw_file_mp_context.Queue()
+        self._raw_file_worker = None
+        self._raw_file_finalizer = None
+        self._raw_file_shards = dict()
+        # stream index of the next message, continues an existing shard set
+        self._raw_file_n_msgs = None
         self.raw_filename = os.path.join(
             raw_directory,
             raw_filename if raw_filename is not None \
                 else time.strftime(self.default_raw_filename_fmt)
         )
-        self._launch_raw_file_worker()
 
     def send(self, packets):
         '''
         Sends a request message to PACMAN boards to send designated
         packets.
 
+        Messages to different io groups are sent concurrently, and ``send``
+        returns once every PACMAN has replied to all of its messages. The
+        ``duplicate_filter`` is reset, so that replies to the new packets are
+        not dropped as repeats of earlier replies.
+
         '''
+        self.duplicate_filter.reset()
         msg_packets = list()
         # group packets into messages destined for a single io group (otherwise 1pkt = 1msg)
         if self.group_packets_by_io_group:
@@ -153,16 +245,127 @@ class PACMAN_IO(IO):
             msg_packets = doubled_msg_packets
 
         # convert packets to messages
-        resp_addresses = list()
+        msgs = list()
         for packets in msg_packets:
             io_group = packets[0].io_group
             for i in range(0, len(packets), self.max_msg_length):
                 #for packet in packets: print(packet)
                 msg_len = min(len(packets)-i, self.max_msg_length)
                 msg = pacman_msg_format.format(packets[i:i+msg_len], msg_type='REQ')
-                address = self._io_group_table[io_group]
-                self.senders[address].send(msg)
-                self._sender_replies[address].append(self.senders[address].recv())
+                msgs.append((self._io_group_table[io_group], msg))
+        self._send_msgs(msgs)
+
+    def _send_msgs(self, msgs):
+        '''
+        Send request messages and collect the replies in ``_sender_replies``.
+
+        Messages to different addresses are in flight at the same time, so
+        the total time is set by the slowest PACMAN rather than the sum over
+        all PACMANs. Messages to the same address are sent in order, each
+        after the reply to the previous one has been received.
+
+        :param msgs: list of ``(address, msg)`` tuples
+
+        '''
+        if self.enable_pipelined_requests:
+            return self._send_msgs_pipelined(msgs)
+        queues = defaultdict(deque)
+        for address, msg in msgs:
+            queues[address].append(msg)
+        poller = zmq.Poller()
+        for address, queue in queues.items():
+            self.senders[address].send(queue.popleft())
+            poller.register(self.senders[address], zmq.POLLIN)
+        n_waiting = len(queues)
+        while n_waiting:
+            events = poller.poll(self.timeout)
+            if not events:
+                raise zmq.Again()
+            for socket, _ in events:
+                address = self.senders.inv[socket]
+                self._sender_replies[address].append(socket.recv())
+                if queues[address]:
+                    socket.send(queues[address].popleft())
+                else:
+                    poller.unregister(socket)
+                    n_waiting -= 1
+
+    def _pipeline_sender(self, address):
+        if address not in self._pipeline_senders:
+            sender = self.context.socket(zmq.DEALER)
+            sender.setsockopt(zmq.LINGER,0)
+            sender.setsockopt(zmq.CONNECT_TIMEOUT,max(self.timeout,0))
+            sender.setsockopt(zmq.SNDTIMEO,self.timeout)
+            sender.connect('tcp://' + address + ':' + self.cmdserver_port)
+            self._pipeline_senders[address] = sender
+            self._pipeline_state[address] = dict(window=self.pipeline_window,
+                base_latency=None)
+        return self._pipeline_senders[address]
+
+    def _update_pipeline_window(self, address, latency):
+        '''
+        Adapt the number of outstanding requests based on how much the reply
+        latency exceeds the minimum observed latency, i.e. on how many
+        requests are queued at the server
+
+        '''
+        state = self._pipeline_state[address]
+        if state['base_latency'] is None or latency < state['base_latency']:
+            state['base_latency'] = latency
+        queued = state['window'] * (1 - state['base_latency'] / max(latency, 1e-9))
+        if queued < 1:
+            state['window'] = min(state['window'] + 1, self.max_pipeline_window)
+        elif queued > 3:
+            state['window'] = max(state['window'] - 1, 1)
+
+    def _send_msgs_pipelined(self, msgs):
+        '''
+        Send request messages with several outstanding requests per address
+        (see ``enable_pipelined_requests``) and collect the replies in
+        ``_sender_replies`` in the order of the requests.
+
+        :param msgs: list of ``(address, msg)`` tuples
+
+        '''
+        queues = defaultdict(deque)
+        for address, msg in msgs:
+            queues[address].append(msg)
+        poller = zmq.Poller()
+        sent = defaultdict(dict) # {address: {seq: send time}}
+        replies = defaultdict(dict) # {address: {seq: reply}}
+
+        def fill(address):
+            sender = self._pipeline_sender(address)
+            while queues[address] and len(sent[address]) < self._pipeline_state[address]['window']:
+                seq = next(self._pipeline_seq)
+                sender.send_multipart([seq.to_bytes(8, 'little'), b'',
+                    queues[address].popleft()])
+                sent[address][seq] = time.time()
+
+        for address in queues:
+            fill(address)
+            poller.register(self._pipeline_senders[address], zmq.POLLIN)
+        n_waiting = len(queues)
+        while n_waiting:
+            events = poller.poll(self.timeout)
+            if not events:
+                raise zmq.Again()
+            for socket, _ in events:
+                address = self._pipeline_senders.inv[socket]
+                frames = socket.recv_multipart()
+                seq = int.from_bytes(frames[0], 'little')
+                if seq not in sent[address]:
+                    # stale reply to an earlier request that timed out
+                    continue
+                self._update_pipeline_window(address, time.time() - sent[address].pop(seq))
+                replies[address][seq] = frames[-1]
+                fill(address)
+                if not sent[address]:
+                    poller.unregister(socket)
+                    n_waiting -= 1
+        for address in replies:
+            self._sender_replies[address].extend(
+                reply for seq, reply in sorted(replies[address].items()))
 
     def start_listening(self):
         '''
@@ -174,6 +377,12 @@ class PACMAN_IO(IO):
         super(PACMAN_IO, self).start_listening()
         for receiver in self.receivers.values():
             receiver.setsockopt(zmq.SUBSCRIBE, b'')
+        if self.enable_receiver_thread:
+            self._receive_buffer.maxlen = self.receive_buffer_length
+            self._stop_receiver.clear()
+            self._receiver_thread = threading.Thread(target=self._receive,
+                daemon=True)
+            self._receiver_thread.start()
 
     def stop_listening(self):
         '''
@@ -183,9 +392,64 @@ class PACMAN_IO(IO):
         if not self.is_listening:
             raise RuntimeError('Already not listening')
         super(PACMAN_IO, self).stop_listening()
+        self._stop_receiver_thread()
         for receiver in self.receivers.values():
             receiver.setsockopt(zmq.UNSUBSCRIBE, b'')
 
+    @property
+    def n_dropped_msgs(self):
+        '''
+        Number of received messages dropped because the receiver thread
+        buffer was full
+
+        '''
+        return self._receive_buffer.n_dropped
+
+    @property
+    def receive_buffer_high_water(self):
+        '''
+        Largest number of messages held in the receiver thread buffer
+
+        '''
+        return self._receive_buffer.high_water
+
+    def _receive(self):
+        '''
+        Receiver thread loop, moves messages from the data sockets into the
+        receive buffer until stopped
+
+        '''
+        while not self._stop_receiver.is_set():
+            if self.poller.poll(10):
+                self._receive_buffer.extend(self._recv_msgs())
+        self._receive_buffer.extend(self._recv_msgs())
+
+    def _stop_receiver_thread(self):
+        if self._receiver_thread is not None:
+            self._stop_receiver.set()
+            self._receiver_thread.join()
+            self._receiver_thread = None
+
+    def _recv_msgs(self, n_max=None):
+        '''
+        Receive waiting messages from the data sockets
+
+        :param n_max: maximum number of messages to receive (default is ``hwm``)
+
+        :returns: list of ``(address, message)`` tuples, messages are ``memoryview`` objects of the received ZMQ frames
+
+        '''
+        if n_max is None:
+            n_max = self.hwm
+        msgs = list()
+        while self.poller.poll(0) and len(msgs) < n_max:
+            events = dict(self.poller.poll(0))
+            for socket, n_events in events.items():
+                for _ in range(n_events):
+                    msgs.append((self.receivers.inv[socket],
+                        socket.recv(copy=False).buffer))
+        return msgs
+
     @staticmethod
     def _group_by_attr(packets, attr):
         '''
@@ -226,28 +490,81 @@ class PACMAN_IO(IO):
 
         '''
         packets = []
-        address_list = list()
-        bytestream_list = list()
-        bytestream = b''
-        n_recv = 0
-        while self.poller.poll(0) and n_recv < self.hwm:
-            events = dict(self.poller.poll(0))
-            for socket, n_events in events.items():
-                for _ in range(n_events):
-                    message = socket.recv()
-                    n_recv += 1
-                    bytestream_list += [message]
-                    address_list += [self.receivers.inv[socket]]
+        bytestream_list, io_groups, bytestream = self._empty_queue_msgs()
         if not self.disable_packet_parsing:
-            for message, address in zip(bytestream_list, address_list):
-                packets += pacman_msg_format.parse(message, io_group=self._io_group_table.inv[address])
-            bytestream = b''.join(bytestream_list)
-        if self.enable_raw_file_writing:
-            self._raw_file_queue.put((bytestream_list, [self._io_group_table.inv[address] for address in address_list]))
-            if not self._raw_file_worker.is_alive():
+            for message, io_group in zip(bytestream_list, io_groups):
+                packets += pacman_msg_format.parse(message, io_group=io_group, views=self.enable_packet_views,
+                    duplicate_filter=self._active_duplicate_filter())
+        return packets,bytestream
+
+    def empty_queue_array(self):
+        '''
+        Fetch waiting messages on pacman data socket and decode them directly
+        into a ``PacketArray`` (using ``pacman_msg_format.parse_many``),
+        without creating a packet object for each word. ``parse_many``
+        already decodes all words with vectorized numpy operations, so no
+        separate compiled kernel is needed
+
+        returns tuple of ``PacketArray``, full bytestream of all messages
+
+        '''
+        bytestream_list, io_groups, bytestream = self._empty_queue_msgs()
+        if self.disable_packet_parsing:
+            return PacketArray(), bytestream
+        return PacketArray(pacman_msg_format.parse_many(bytestream_list, io_group=io_groups,
+            duplicate_filter=self._active_duplicate_filter())), bytestream
+
+    def _active_duplicate_filter(self):
+        return self.duplicate_filter if self.drop_duplicate_packets else None
+
+    def _empty_queue_msgs(self):
+        '''
+        Collect the received messages, queue them for the raw file worker, and
+        build the bytestream
+
+        :returns: ``tuple`` of (``list`` of messages, ``list`` of io groups, bytestream)
+
+        '''
+        bytestream = b''
+        msgs = self._receive_buffer.swap()
+        if self._receiver_thread is None:
+            msgs += self._recv_msgs()
+        io_groups = [self._io_group_table.inv[address] for address, message in msgs]
+        bytestream_list = [message for address, message in msgs]
+        joined = None
+        if not self.disable_packet_parsing and not self.disable_bytestream:
+            bytestream = joined = b''.join(bytestream_list)
+        if self.enable_raw_file_writing and self.enable_raw_file_sharding:
+            self._queue_raw_file_shards(bytestream_list, io_groups)
+        elif self.enable_raw_file_writing:
+            # a single buffer is much cheaper to pass to the worker process
+            if joined is None:
+                joined = b''.join(bytestream_list)
+            self._raw_file_queue.put((joined, [len(message) for message in bytestream_list], dict(io_groups=io_groups)))
+            if self._raw_file_finalizer is None or not self._raw_file_worker.is_alive():
                 self._launch_raw_file_worker()
+        return bytestream_list, io_groups, bytestream
 
-        return packets,bytestream
+    def _queue_raw_file_shards(self, msgs, io_groups):
+        '''
+        Pass the messages of each io group to the raw file worker of its
+        shard, tagged with their position in the combined stream
+
+        '''
+        if self._raw_file_n_msgs is None:
+            self._raw_file_n_msgs = rawhdf5format.next_stream_index(self.raw_filename)
+        shard_msgs = defaultdict(list)
+        shard_index = defaultdict(list)
+        for i, (io_group, msg) in enumerate(zip(io_groups, msgs), self._raw_file_n_msgs):
+            shard_msgs[io_group].append(msg)
+            shard_index[io_group].append(i)
+        self._raw_file_n_msgs += len(msgs)
+        for io_group, msgs in shard_msgs.items():
+            shard = self._raw_file_shards.get(io_group)
+            if shard is None or not shard[1].is_alive():
+                shard = self._launch_raw_file_shard(io_group)
+            shard[0].put((b''.join(msgs), [len(msg) for msg in msgs],
+                dict(io_groups=[io_group]*len(msgs), stream_index=shard_index[io_group])))
 
     def cleanup(self):
         '''
@@ -257,43 +574,166 @@ class PACMAN_IO(IO):
         ``PACMAN_IO`` object.
 
         '''
+        self._stop_receiver_thread()
+        self.stop_telemetry()
         for address in self.senders.keys():
             self.senders[address].close(linger=0)
             self.receivers[address].close(linger=0)
+        for sender in self._pipeline_senders.values():
+            sender.close(linger=0)
         self.context.term()
 
     @staticmethod
-    def _to_raw_file(queue_, filename, timeout=1, max_msgs=100000):
-        start_time = time.time()
-        while (time.time() < start_time + timeout or not queue_.empty()):
-            # wait for data
-            try:
-                msgs, io_groups = queue_.get(timeout=timeout)
-            except Empty:
-                continue
-            # buffer data
-            while len(msgs) < max_msgs:
+    def _to_raw_file(queue_, filename, rotate=False, writer_kwargs=dict(), max_msgs=100000):
+        writer = None
+        try:
+            while True:
+                # wait for data, or until the next flush is due
                 try:
-                    new_msgs, new_io_groups = queue_.get(False)
-                    msgs.extend(new_msgs)
-                    io_groups.extend(new_io_groups)
+                    item = queue_.get(timeout=writer.time_to_flush() if writer is not None else None)
                 except Empty:
+                    writer.flush()
+                    continue
+                # buffer data
+                msgs = list()
+                msg_headers = defaultdict(list)
+                while isinstance(item, tuple):
+                    data, lengths, new_msg_headers = item
+                    msgs.extend(PACMAN_IO._split_msgs(data, lengths))
+                    for key, values in new_msg_headers.items():
+                        msg_headers[key].extend(values)
+                    item = None
+                    if len(msgs) < max_msgs:
+                        try:
+                            item = queue_.get(False)
+                        except Empty:
+                            pass
+                # write to file
+                if len(msgs):
+                    if writer is None:
+                        writer_cls = rawhdf5format.RotatingRawFileWriter if rotate else rawhdf5format.RawFileWriter
+                        writer = writer_cls(filename, io_version=pacman_msg_format.latest_version, **writer_kwargs)
+                    writer.write(msgs, msg_headers=msg_headers)
+                if item == PACMAN_IO._raw_file_stop:
                     break
-            # write to file
-            if len(msgs):
-                rawhdf5format.to_rawfile(filename, msgs=msgs, msg_headers={'io_groups': io_groups}, io_version=pacman_msg_format.latest_version)
-                start_time = time.time()
+                if item == PACMAN_IO._raw_file_rotate and rotate and writer is not None:
+                    writer.rotate()
+        finally:
+            if writer is not None:
+                writer.close()
+
+    @staticmethod
+    def _stop_raw_file_worker(queue_, worker):
+        if worker.is_alive():
+            queue_.put(PACMAN_IO._raw_file_stop)
+        worker.join()
+
+    @staticmethod
+    def _split_msgs(data, lengths):
+        '''
+        Split a joined bytestream into ``memoryview`` objects of each message
+
+        '''
+        buffer = memoryview(data)
+        msgs = list()
+        start = 0
+        for length in lengths:
+            msgs.append(buffer[start:start+length])
+            start += length
+        return msgs
+
+    def _raw_file_writer_kwargs(self):
+        writer_kwargs = dict(flush_interval=self.raw_file_flush_interval, flush_size=self.raw_file_flush_size)
+        if self.enable_raw_file_rotation:
+            writer_kwargs.update(max_bytes=self.raw_file_max_bytes, max_msgs=self.raw_file_max_msgs,
+                max_duration=self.raw_file_max_duration)
+        return writer_kwargs
 
     def _launch_raw_file_worker(self):
-        self._raw_file_worker = multiprocessing.Process(target=self._to_raw_file, args=(self._raw_file_queue, self.raw_filename))
-        self._raw_file_worker.start()
+        if self._raw_file_finalizer is not None:
+            # previous worker has exited unexpectedly
+            self._raw_file_finalizer.detach()
+        self._raw_file_worker = _raw_file_mp_context.Process(target=self._to_raw_file, args=(self._raw_file_queue, self.raw_filename,
+            self.enable_raw_file_rotation, self._raw_file_writer_kwargs()))
+        with _h5py_fork_lock:
+            self._raw_file_worker.start()
+        # make sure that the worker writes all queued data and exits, even if join is never called
+        self._raw_file_finalizer = weakref.finalize(self, self._stop_raw_file_worker, self._raw_file_queue, self._raw_file_worker)
+
+    def _launch_raw_file_shard(self, io_group):
+        '''
+        Launch the raw file worker of an io group shard
+
+        :returns: ``tuple`` of the worker queue, process, and finalizer
+
+        '''
+        if io_group in self._raw_file_shards:
+            # previous worker has exited unexpectedly
+            self._raw_file_shards[io_group][2].detach()
+        io_groups = set(self._io_group_table) | set(self._raw_file_shards) | {io_group}
+        if os.path.exists(self.raw_shard_index_filename):
+            # keep the shards of an existing data set that is continued
+            io_groups |= set(shard['io_group'] for shard in rawhdf5format.load_shard_index(self.raw_filename))
+        rawhdf5format.write_shard_index(self.raw_filename, sorted(io_groups))
+        queue_ = _raw_file_mp_context.Queue()
+        writer_kwargs = self._raw_file_writer_kwargs()
+        writer_kwargs['version'] = rawhdf5format.shard_version
+        worker = _raw_file_mp_context.Process(target=self._to_raw_file, args=(queue_,
+            rawhdf5format.shard_filename(self.raw_filename, io_group),
+            self.enable_raw_file_rotation, writer_kwargs))
+        with _h5py_fork_lock:
+            worker.start()
+        finalizer = weakref.finalize(self, self._stop_raw_file_worker, queue_, worker)
+        self._raw_file_shards[io_group] = (queue_, worker, finalizer)
+        return self._raw_file_shards[io_group]
 
     def join(self):
         '''
-        Wait for raw file worker to finish
+        Wait for the raw file worker to write all queued data, close the file,
+        and exit. A new worker is launched when more data are received.
 
         '''
-        self._raw_file_worker.join()
+        if self._raw_file_finalizer is not None:
+            self._raw_file_finalizer()
+            self._raw_file_finalizer = None
+        for queue_, worker, finalizer in self._raw_file_shards.values():
+            finalizer()
+        self._raw_file_shards = dict()
+
+    def rotate_raw_file(self):
+        '''
+        Close the current raw file and continue with the next file of the
+        sequence once more data are received (e.g. at the start of a new
+        subrun). Only has an effect if ``enable_raw_file_rotation`` is set.
+
+        The file is closed by the raw file worker, so this does not wait for
+        the file to be written.
+
+        '''
+        if not self.enable_raw_file_rotation:
+            return
+        if self._raw_file_finalizer is not None:
+            self._raw_file_queue.put(self._raw_file_rotate)
+        for queue_, worker, finalizer in self._raw_file_shards.values():
+            queue_.put(self._raw_file_rotate)
+
+    @property
+    def raw_manifest_filename(self):
+        '''
+        Manifest of the raw files written with ``enable_raw_file_rotation``
+        (see ``larpix.format.rawhdf5format.load_manifest``)
+
+        '''
+        return rawhdf5format.manifest_filename(self.raw_filename)
+
+    @property
+    def raw_shard_index_filename(self):
+        '''
+        Index of the raw files written with ``enable_raw_file_sharding``
+        (see ``larpix.format.rawhdf5format.load_shard_index``)
+
+        '''
+        return rawhdf5format.shard_index_filename(self.raw_filename)
 
     @property
     def raw_filename(self):
@@ -302,23 +742,99 @@ class PACMAN_IO(IO):
     @raw_filename.setter
     def raw_filename(self,value):
         if hasattr(self,'_raw_filename') \
-                and value != self._raw_filename \
-                and self._raw_file_worker.is_alive():
+                and value != self._raw_filename:
             self.join()
+            self._raw_file_n_msgs = None
         self._raw_filename = value
 
+    def _io_groups(self, io_group=None):
+        return list(self._io_group_table) if io_group is None else [io_group]
+
+    def _reg_transaction(self, words):
+        '''
+        Send a single request message of register words to each io group.
+        Messages to different io groups are sent concurrently, and the words
+        within each message are executed in order.
+
+        :param words: ``dict`` of ``io_group: list of words``, e.g. ``('WRITE', reg, val)`` or ``('READ', reg, 0)``
+
+        :returns: ``dict`` of ``io_group: list of values`` read by the ``READ`` words
+
+        '''
+        msgs = list()
+        n_msgs = dict()
+        for io_group, io_group_words in words.items():
+            addr = self._io_group_table[io_group]
+            n_msgs[io_group] = 0
+            for i in range(0, len(io_group_words), self.max_msg_length):
+                msgs.append((addr, pacman_msg_format.format_msg('REQ', io_group_words[i:i+self.max_msg_length])))
+                n_msgs[io_group] += 1
+        self._send_msgs(msgs)
+
+        values = dict()
+        for io_group, io_group_words in words.items():
+            addr = self._io_group_table[io_group]
+            replies = self._sender_replies[addr][len(self._sender_replies[addr])-n_msgs[io_group]:] if n_msgs[io_group] else []
+            reply_words = [word for reply in replies for word in pacman_msg_format.parse_msg(reply)[1]]
+            if any(word[0] == 'ERR' for word in reply_words):
+                raise RuntimeError('Error received from server')
+            values[io_group] = [word[-1] for word in reply_words if word[0] == 'READ']
+            if len(values[io_group]) != sum(word[0] == 'READ' for word in io_group_words):
+                raise RuntimeError('Error received from server')
+        return values
+
+    def set_regs(self, regs, io_group=None):
+        '''
+        Set many 32-bit registers in the pacman PL, using a single message
+        for each io group. The registers are set in order, and messages to
+        different io groups are sent concurrently.
+
+        :param regs: ``list`` of ``(reg, val)`` tuples, or a ``dict`` of ``io_group: list of (reg, val)`` to set different registers on each io group
+
+        :param io_group: io group to set the registers on (default is all io groups), ignored if ``regs`` is a ``dict``
+
+        '''
+        if not isinstance(regs, dict):
+            regs = dict([(io_group, regs) for io_group in self._io_groups(io_group)])
+        self._reg_transaction(dict([
+            (io_group, [('WRITE', reg, val) for reg, val in io_group_regs])
+            for io_group, io_group_regs in regs.items()]))
+
+    def get_regs(self, regs, io_group=None):
+        '''
+        Read many 32-bit registers from the pacman PL, using a single
+        message for each io group. Messages to different io groups are sent
+        concurrently.
+
+        If no ``io_group`` is specified (or ``regs`` is a ``dict``), returns
+        a ``dict`` of ``io_group, list of reg values`` else returns a list
+        of reg values
+
+        :param regs: ``list`` of registers, or a ``dict`` of ``io_group: list of registers`` to read different registers from each io group
+
+        :param io_group: io group to read the registers from (default is all io groups), ignored if ``regs`` is a ``dict``
+
+        '''
+        if isinstance(regs, dict):
+            io_group = None
+        else:
+            regs = dict([(io_group, regs) for io_group in self._io_groups(io_group)])
+        values = self._reg_transaction(dict([
+            (io_group, [('READ', reg, 0) for reg in io_group_regs])
+            for io_group, io_group_regs in regs.items()]))
+        if io_group is None:
+            return values
+        return values[io_group]
+
     def set_reg(self, reg, val, io_group=None):
         '''
         Set a 32-bit register in the pacman PL
 
         '''
         #print('setting register {} to {}'.format(reg, val))
+        self.set_regs([(reg, val)], io_group=io_group)
         if io_group is None:
-            return dict([(io_group,self.set_reg(reg, val, io_group=io_group)) for io_group in self._io_group_table])
-        msg = pacman_msg_format.format_msg('REQ',[('WRITE',reg,val)])
-        addr = self._io_group_table[io_group]
-        self.senders[addr].send(msg)
-        self._sender_replies[addr].append(self.senders[addr].recv())
+            return dict([(io_group, None) for io_group in self._io_group_table])
 
     def get_reg(self, reg, io_group=None):
         '''
@@ -328,16 +844,10 @@ class PACMAN_IO(IO):
         else returns reg_value
 
         '''
+        values = self.get_regs([reg], io_group=io_group)
         if io_group is None:
-            return dict([(io_group, self.get_reg(reg, io_group=io_group)) for io_group in self._io_group_table])
-        msg = pacman_msg_format.format_msg('REQ',[('READ',reg,0)])
-        addr = self._io_group_table[io_group]
-        self.senders[addr].send(msg)
-        self._sender_replies[addr].append(self.senders[addr].recv())
-        msg_data = pacman_msg_format.parse_msg(self._sender_replies[addr][-1])
-        if msg_data[1][0][0] == 'READ':
-            return msg_data[1][0][-1]
-        raise RuntimeError('Error received from server')
+            return dict([(io_group, value[0]) for io_group, value in values.items()])
+        return values[0]
 
     def ping(self, io_group=None):
         '''
@@ -361,6 +871,12 @@ class PACMAN_IO(IO):
             print('IO error on {}: {}'.format(io_group,e))
         return False
 
+    def _get_adc(self, v_reg, i_reg, io_group=None):
+        values = self.get_regs([v_reg, i_reg], io_group=io_group)
+        if io_group is None:
+            return dict([(io_group, (self._adc2mv(v), self._adc2ma(i))) for io_group, (v, i) in values.items()])
+        return self._adc2mv(values[0]), self._adc2ma(values[1])
+
     def get_vddd(self, io_group=None):
         '''
         Gets PACMAN VDDD voltage
@@ -369,11 +885,7 @@ class PACMAN_IO(IO):
         a tuple of mV and mA respectively
 
         '''
-        if io_group is None:
-            return dict([(io_group, self.get_vddd(io_group=io_group)) for io_group in self._io_group_table])
-        mv = self._adc2mv(self.get_reg(self._vddd_adc_reg, io_group=io_group))
-        ma = self._adc2ma(self.get_reg(self._iddd_adc_reg, io_group=io_group))
-        return mv, ma
+        return self._get_adc(self._vddd_adc_reg, self._iddd_adc_reg, io_group=io_group)
 
     def set_vddd(self, vddd_dac=0xD5A3, io_group=None, settling_time=0.1):
         '''
@@ -385,9 +897,7 @@ class PACMAN_IO(IO):
         a tuple of mV and mA respectively
 
         '''
-        if io_group is None:
-            return dict([(io_group, self.set_vddd(vddd_dac, io_group=io_group)) for io_group in self._io_group_table])
-        self.set_reg(self._vddd_dac_reg, vddd_dac, io_group=io_group)
+        self.set_regs([(self._vddd_dac_reg, vddd_dac)], io_group=io_group)
         if settling_time:
             time.sleep(settling_time)
         return self.get_vddd(io_group=io_group)
@@ -400,11 +910,7 @@ class PACMAN_IO(IO):
         a tuple of mV and mA respectively
 
         '''
-        if io_group is None:
-            return dict([(io_group, self.get_vdda(io_group=io_group)) for io_group in self._io_group_table])
-        mv = self._adc2mv(self.get_reg(self._vdda_adc_reg, io_group=io_group))
-        ma = self._adc2ma(self.get_reg(self._idda_adc_reg, io_group=io_group))
-        return mv, ma
+        return self._get_adc(self._vdda_adc_reg, self._idda_adc_reg, io_group=io_group)
 
     def set_vdda(self, vdda_dac=0xD5A3, io_group=None, settling_time=0.1):
         '''
@@ -416,9 +922,7 @@ class PACMAN_IO(IO):
         a tuple of mV and mA respectively
 
         '''
-        if io_group is None:
-            return dict([(io_group, self.set_vdda(vdda_dac, io_group=io_group)) for io_group in self._io_group_table])
-        self.set_reg(self._vdda_dac_reg, vdda_dac, io_group=io_group)
+        self.set_regs([(self._vdda_dac_reg, vdda_dac)], io_group=io_group)
         if settling_time:
             time.sleep(settling_time)
         return self.get_vdda(io_group=io_group)
@@ -431,11 +935,106 @@ class PACMAN_IO(IO):
         a tuple of mV and mA respectively
 
         '''
+        return self._get_adc(self._vplus_adc_reg, self._iplus_adc_reg, io_group=io_group)
+
+    def start_telemetry(self, interval=1., buffer_length=3600, filename=None):
+        '''
+        Start sampling the PACMAN supply rail ADCs (VDDD, VDDA, and Vplus) of
+        all io groups every ``interval`` seconds in a background thread.
+
+        All ADC registers of an io group are read with a single message over
+        a separate command connection, so sampling does not hold up other
+        requests. Samples that time out are skipped and counted in the
+        ``n_errors`` of ``get_telemetry``.
+
+        :param interval: time between samples in seconds
+
+        :param buffer_length: number of samples kept in the history of each rail
+
+        :param filename: optional, HDF5 file to append the samples to (as the ``pacman_telemetry`` dataset). The file is kept open until ``stop_telemetry`` is called, so it should not be a file that is written by a logger at the same time
+
+        '''
+        self.stop_telemetry()
+        addresses = dict([(io_group, 'tcp://' + address + ':' + self.cmdserver_port)
+            for io_group, address in self._io_group_table.items()])
+        self._telemetry_sampler = _TelemetrySampler(self.context, addresses,
+            self._telemetry_rails(), interval=interval, buffer_length=buffer_length,
+            timeout=self.timeout, filename=filename)
+        self._telemetry_sampler.start()
+
+    def stop_telemetry(self):
+        '''
+        Stop sampling the PACMAN supply rails. The sampled values remain
+        available.
+
+        '''
+        if self._telemetry_sampler is not None and self._telemetry_sampler.is_alive():
+            self._telemetry_sampler.stop.set()
+            self._telemetry_sampler.join()
+
+    def get_telemetry(self, io_group=None):
+        '''
+        Get the most recent supply rail sample without communicating with
+        the PACMANs (see ``start_telemetry``)
+
+        If no ``io_group`` is specified, returns a ``dict`` of ``io_group, sample``
+        else returns the sample, where each sample is a ``dict`` with the
+        ``timestamp`` of the sample, the number of failed samples
+        ``n_errors``, and a tuple of mV and mA for each rail (``'vddd'``,
+        ``'vdda'``, ``'vplus'``). Returns ``None`` for an io group that has
+        not been sampled yet.
+
+        '''
+        if self._telemetry_sampler is None:
+            raise RuntimeError('Telemetry has not been started')
+        latest = self._telemetry_sampler.latest()
+        if io_group is None:
+            return latest
+        return latest.get(io_group)
+
+    def get_telemetry_history(self, rail, io_group):
+        '''
+        Get the sampled values of a supply rail (see ``start_telemetry``)
+
+        :param rail: ``'vddd'``, ``'vdda'``, or ``'vplus'``
+
+        :param io_group: io group of the rail
+
+        :returns: numpy array of shape ``(N, 3)`` with columns of unix timestamp, mV, and mA
+
+        '''
+        if self._telemetry_sampler is None:
+            raise RuntimeError('Telemetry has not been started')
+        return self._telemetry_sampler.history(rail, io_group)
+
+    def _telemetry_rails(self):
+        '''
+        :returns: ``list`` of ``(rail, voltage register, current register, voltage conversion, current conversion)``
+
+        '''
+        return [
+            (rail, v_reg, i_reg, self._adc2mv, self._adc2ma)
+            for rail, v_reg, i_reg in (
+                ('vddd', self._vddd_adc_reg, self._iddd_adc_reg),
+                ('vdda', self._vdda_adc_reg, self._idda_adc_reg),
+                ('vplus', self._vplus_adc_reg, self._iplus_adc_reg))
+            ]
+
+    def _update_tile_mask(self, update, io_group=None):
+        '''
+        Read-modify-write of the tile enable register, using one round trip
+        to read the register and one to write and read back the new value
+
+        '''
+        io_groups = self._io_groups(io_group)
+        vals = self.get_regs(dict([(io_group, [self._base_ctrl_reg]) for io_group in io_groups]))
+        new_vals = self._reg_transaction(dict([
+            (io_group, [('WRITE', self._base_ctrl_reg, update(vals[io_group][0])),
+                ('READ', self._base_ctrl_reg, 0)])
+            for io_group in io_groups]))
         if io_group is None:
-            return dict([(io_group, self.get_vplus(io_group=io_group)) for io_group in self._io_group_table])
-        mv = self._adc2mv(self.get_reg(self._vplus_adc_reg, io_group=io_group))
-        ma = self._adc2ma(self.get_reg(self._iplus_adc_reg, io_group=io_group))
-        return mv, ma
+            return dict([(io_group, val[0] & 0xFF) for io_group, val in new_vals.items()])
+        return new_vals[io_group][0] & 0xFF
 
     def enable_tile(self, tile_indices=None, io_group=None):
         '''
@@ -445,17 +1044,14 @@ class PACMAN_IO(IO):
         Returns the value of the new tile enable mask
 
         '''
-        if io_group is None:
-            return dict([(io_group, self.enable_tile(tile_indices=tile_indices, io_group=io_group)) for io_group in self._io_group_table])
         if tile_indices is None:
             tile_indices = list(range(8))
         elif isinstance(tile_indices,int):
             tile_indices = [tile_indices]
-        val = self.get_reg(self._base_ctrl_reg, io_group=io_group)
+        mask = 0
         for idx in tile_indices:
-            val = val | (1 << idx)
-        self.set_reg(self._base_ctrl_reg, val, io_group=io_group)
-        return (self.get_reg(self._base_ctrl_reg, io_group=io_group) & 0xFF)
+            mask = mask | (1 << idx)
+        return self._update_tile_mask(lambda val: val | mask, io_group=io_group)
 
     def disable_tile(self, tile_indices=None, io_group=None):
         '''
@@ -465,17 +1061,14 @@ class PACMAN_IO(IO):
         Returns the value of the new tile enable mask
 
         '''
-        if io_group is None:
-            return dict([(io_group, self.disable_tile(tile_indices=tile_indices, io_group=io_group)) for io_group in self._io_group_table])
         if tile_indices is None:
             tile_indices = list(range(8))
         elif isinstance(tile_indices,int):
             tile_indices = [tile_indices]
-        val = self.get_reg(self._base_ctrl_reg, io_group=io_group)
+        mask = 0
         for idx in tile_indices:
-            val = val & (0xFFFFFFFF & ~(1 << idx))
-        self.set_reg(self._base_ctrl_reg, val, io_group=io_group)
-        return (self.get_reg(self._base_ctrl_reg, io_group=io_group) & 0xFF)
+            mask = mask | (1 << idx)
+        return self._update_tile_mask(lambda val: val & (0xFFFFFFFF & ~mask), io_group=io_group)
 
     def set_uart_clock_ratio(self, channel, ratio, io_group=None):
         '''
@@ -488,11 +1081,38 @@ class PACMAN_IO(IO):
         Returns the value of the UART clock register that was set
 
         '''
-        if io_group is None:
-            return dict([(io_group, self.set_uart_clock_ratio(channel, ratio, io_group=io_group)) for io_group in self._io_group_table])
         reg = self._channel_size*channel + self._uart_clock_ratio_offset + self._channel_offset
-        self.set_reg(reg, ratio, io_group=io_group)
-        return self.get_reg(reg, io_group=io_group)
+        vals = self._reg_transaction(dict([
+            (io_group, [('WRITE', reg, ratio), ('READ', reg, 0)])
+            for io_group in self._io_groups(io_group)]))
+        if io_group is None:
+            return dict([(io_group, val[0]) for io_group, val in vals.items()])
+        return vals[io_group][0]
+
+    def _reset(self, clk_ctrl, length, words=None):
+        '''
+        Toggle the reset bit of each io group. The bit is only cleared once
+        the reset pulse of ``length`` MCLK cycles has finished, so any
+        register written after this returns takes effect after the reset.
+
+        :param clk_ctrl: ``dict`` of ``io_group: clock/reset control register value``
+
+        :param length: length of the reset pulse in MCLK cycles
+
+        :param words: optional, ``dict`` of ``io_group: list of words`` to send in the same message before the reset bit is set
+
+        :returns: ``dict`` of ``io_group: clock/reset control register value`` after the reset
+
+        '''
+        words = words if words is not None else dict()
+        self._reg_transaction(dict([
+            (io_group, list(words.get(io_group, [])) + [('WRITE', self._clk_ctrl_reg, val|4)])
+            for io_group, val in clk_ctrl.items()]))
+        time.sleep(length / self.larpix_mclk_frequency)
+        vals = self._reg_transaction(dict([
+            (io_group, [('WRITE', self._clk_ctrl_reg, val), ('READ', self._clk_ctrl_reg, 0)])
+            for io_group, val in clk_ctrl.items()]))
+        return dict([(io_group, val[0]) for io_group, val in vals.items()])
 
     def reset_larpix(self, length=256, io_group=None):
         '''
@@ -503,15 +1123,16 @@ class PACMAN_IO(IO):
         Returns the value of the clock/reset control register after the reset
 
         '''
-        if io_group is None:
-            return dict([(io_group, self.reset_larpix(length, io_group=io_group)) for io_group in self._io_group_table])
+        io_groups = self._io_groups(io_group)
         # set reset cycles
-        self.set_reg(self._sw_reset_cycles_reg, length, io_group=io_group)
-        # toggle reset bit
-        clk_ctrl = self.get_reg(self._clk_ctrl_reg, io_group=io_group)
-        self.set_reg(self._clk_ctrl_reg, clk_ctrl|4, io_group=io_group)
-        self.set_reg(self._clk_ctrl_reg, clk_ctrl, io_group=io_group)
-        return self.get_reg(self._clk_ctrl_reg, io_group=io_group)
+        clk_ctrl = self._reg_transaction(dict([
+            (io_group, [('WRITE', self._sw_reset_cycles_reg, length),
+                ('READ', self._clk_ctrl_reg, 0)])
+            for io_group in io_groups]))
+        vals = self._reset(dict([(io_group, val[0]) for io_group, val in clk_ctrl.items()]), length)
+        if io_group is None:
+            return vals
+        return vals[io_group]
 
     def reset_tiles(self, tiles=None, length=256, io_group=None):
         '''
@@ -522,25 +1143,188 @@ class PACMAN_IO(IO):
         
         '''
         
-        no_reset_tiles = set(range(1,9))-set(tiles)
+        no_reset_tiles = set(range(1,9))-set(tiles if tiles is not None else range(1,9))
 
         REG=0x101c
         reg_val=0
         for tile in no_reset_tiles: 
             reg_val += (1 << tile)
-    
-        prev_val = self.get_reg(REG, io_group=io_group)
-    
+
+        io_groups = self._io_groups(io_group)
+        prev_vals = self._reg_transaction(dict([
+            (io_group, [('READ', REG, 0),
+                ('WRITE', self._sw_reset_cycles_reg, length),
+                ('READ', self._clk_ctrl_reg, 0)])
+            for io_group in io_groups]))
+
         #We care about bits 16:23. These should always be 0 by default
         #Reset to 0 at the end of this
-        
-        new_val = prev_val + (reg_val << 15)
-        self.set_reg(REG, new_val, io_group=io_group)
-        self.reset_larpix(length=length, io_group=io_group)
-        self.set_reg(REG, prev_val, io_group=io_group)
+        self._reset(dict([(io_group, clk_ctrl) for io_group, (prev_val, clk_ctrl) in prev_vals.items()]),
+            length, words=dict([(io_group, [('WRITE', REG, prev_val + (reg_val << 15))])
+                for io_group, (prev_val, clk_ctrl) in prev_vals.items()]))
+        # only restore the mask once the reset has finished
+        self._reg_transaction(dict([(io_group, [('WRITE', REG, prev_val)])
+            for io_group, (prev_val, clk_ctrl) in prev_vals.items()]))
 
         return True
 
 
+class _MessageBuffer(object):
+    '''
+    A thread-safe, bounded buffer of received messages. If full, the oldest
+    messages are dropped.
+
+    :param maxlen: maximum number of messages held
+
+    '''
+    def __init__(self, maxlen):
+        self.maxlen = maxlen
+        self.n_dropped = 0
+        self.high_water = 0
+        self._lock = threading.Lock()
+        self._msgs = deque()
+
+    def extend(self, msgs):
+        with self._lock:
+            self._msgs.extend(msgs)
+            n_over = len(self._msgs) - self.maxlen
+            if n_over > 0:
+                self.n_dropped += n_over
+                for _ in range(n_over):
+                    self._msgs.popleft()
+            self.high_water = max(self.high_water, len(self._msgs))
+
+    def swap(self):
+        '''
+        :returns: a list of all buffered messages, and empties the buffer
 
- 
+        '''
+        with self._lock:
+            msgs, self._msgs = self._msgs, deque()
+        return list(msgs)
+
+class _TelemetrySampler(threading.Thread):
+    '''
+    Background thread that periodically reads the PACMAN ADC registers of
+    each io group over its own ``zmq.REQ`` connections (see
+    ``PACMAN_IO.start_telemetry``)
+
+    '''
+    def __init__(self, context, addresses, rails, interval=1., buffer_length=3600,
+            timeout=-1, filename=None):
+        super(_TelemetrySampler, self).__init__(daemon=True)
+        self.context = context
+        self.addresses = addresses
+        self.rails = rails
+        self.interval = interval
+        self.timeout = timeout if timeout >= 0 else int(max(interval, 1) * 1000)
+        self.filename = filename
+        self.stop = threading.Event()
+        self._lock = threading.Lock()
+        self._latest = dict()
+        self._history = dict([((rail[0], io_group), deque(maxlen=buffer_length))
+            for rail in rails for io_group in addresses])
+        self._n_errors = dict([(io_group, 0) for io_group in addresses])
+        self._file = None
+        words = list()
+        for rail, v_reg, i_reg, _, _ in rails:
+            words += [('READ', v_reg, 0), ('READ', i_reg, 0)]
+        self._msg = pacman_msg_format.format_msg('REQ', words)
+
+    def latest(self):
+        latest = dict()
+        with self._lock:
+            for io_group in self.addresses:
+                sample = self._latest.get(io_group)
+                if sample is not None:
+                    sample = dict(sample, n_errors=self._n_errors[io_group])
+                latest[io_group] = sample
+        return latest
+
+    def history(self, rail, io_group):
+        with self._lock:
+            return np.array(self._history[(rail, io_group)], dtype=float).reshape(-1, 3)
+
+    def _socket(self, io_group):
+        socket = self.context.socket(zmq.REQ)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.connect(self.addresses[io_group])
+        return socket
+
+    def run(self):
+        sockets = dict()
+        next_sample = time.time()
+        # one handle for the lifetime of the sampler, rather than reopening
+        # (and re-locking) the file for each sample
+        if self.filename is not None:
+            with _h5py_fork_lock:
+                self._file = h5py.File(self.filename, 'a')
+        try:
+            while not self.stop.wait(max(next_sample - time.time(), 0)):
+                next_sample += self.interval
+                self._sample(sockets)
+        finally:
+            for socket in sockets.values():
+                socket.close(linger=0)
+            if self._file is not None:
+                with _h5py_fork_lock:
+                    self._file.close()
+
+    def _sample(self, sockets):
+        poller = zmq.Poller()
+        waiting = dict()
+        for io_group in self.addresses:
+            if io_group not in sockets:
+                sockets[io_group] = self._socket(io_group)
+            sockets[io_group].send(self._msg)
+            poller.register(sockets[io_group], zmq.POLLIN)
+            waiting[sockets[io_group]] = io_group
+        timestamp = time.time()
+        samples = dict()
+        errors = list()
+        deadline = timestamp + self.timeout / 1000.
+        while waiting and time.time() < deadline:
+            for socket, _ in poller.poll(max(int((deadline - time.time()) * 1000), 0)):
+                io_group = waiting.pop(socket)
+                poller.unregister(socket)
+                values = [word[-1] for word in pacman_msg_format.parse_msg(socket.recv())[1]
+                    if word[0] == 'READ']
+                if len(values) != 2 * len(self.rails):
+                    errors.append(io_group)
+                    continue
+                samples[io_group] = dict(timestamp=timestamp)
+                for i, (rail, _, _, adc2mv, adc2ma) in enumerate(self.rails):
+                    samples[io_group][rail] = (adc2mv(values[2*i]), adc2ma(values[2*i+1]))
+        for socket, io_group in waiting.items():
+            # no reply, reconnect for the next sample
+            socket.close(linger=0)
+            del sockets[io_group]
+            errors.append(io_group)
+
+        with self._lock:
+            for io_group in errors:
+                self._n_errors[io_group] += 1
+            for io_group, sample in samples.items():
+                self._latest[io_group] = sample
+                for rail in sample:
+                    if rail != 'timestamp':
+                        self._history[(rail, io_group)].append((timestamp,) + sample[rail])
+        if self._file is not None and samples:
+            with _h5py_fork_lock:
+                self._to_file(samples)
+
+    def _to_file(self, samples):
+        dtype = np.dtype([('timestamp', 'f8'), ('io_group', 'u1')]
+            + [(rail[0] + unit, 'f8') for rail in self.rails for unit in ('_mv', '_ma')])
+        arr = np.zeros(len(samples), dtype=dtype)
+        for i, (io_group, sample) in enumerate(sorted(samples.items())):
+            arr[i]['timestamp'] = sample['timestamp']
+            arr[i]['io_group'] = io_group
+            for rail in self.rails:
+                arr[i][rail[0] + '_mv'], arr[i][rail[0] + '_ma'] = sample[rail[0]]
+        if 'pacman_telemetry' not in self._file:
+            self._file.create_dataset('pacman_telemetry', shape=(0,), maxshape=(None,), dtype=dtype)
+        dset = self._file['pacman_telemetry']
+        dset.resize((len(dset) + len(arr),))
+        dset[-len(arr):] = arr
+        self._file.flush()
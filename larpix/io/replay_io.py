@@ -0,0 +1,193 @@
+'''
+A module for the ReplayIO class.
+
+'''
+import time
+import bisect
+
+from larpix.io import IO
+from larpix import PacketArray
+import larpix.format.pacman_msg_format as pacman_msg_format
+import larpix.format.rawhdf5format as rawhdf5format
+
+class ReplayIO(IO):
+    '''
+    An IO stand-in that plays back the messages of a raw file (written by
+    ``PACMAN_IO`` with ``enable_raw_file_writing``, see
+    ``larpix.format.rawhdf5format``) as if they were received from the
+    PACMANs. Sharded data sets can be replayed by passing the index of the
+    shards.
+
+    The messages are returned by ``empty_queue`` (or ``empty_queue_array``)
+    in the same ``(packets, bytestream)`` format as ``PACMAN_IO``, so that a
+    ``Controller`` can be used to load-test the data handling (e.g. loggers
+    and monitoring) with recorded data::
+
+        c = Controller()
+        c.io = ReplayIO('raw.h5', speed=10) # replay at 10x real time
+        c.start_listening()
+        while not c.io.is_finished:
+            packets, bytestream = c.read()
+            ...
+        c.stop_listening()
+
+    The replay follows the time in the message headers: a message becomes
+    available once ``speed`` times the time spent listening since the first
+    call to ``start_listening`` has passed since the first message in the
+    file. The replay clock is paused while not listening. Message header
+    times have a resolution of 1 second, so messages of the same second
+    become available at once. If ``speed`` is ``None``, each call to
+    ``empty_queue`` returns the next ``block_size`` messages as fast as
+    possible.
+
+    If ``loop`` is set, the file is replayed again once all messages have
+    been returned, continuing the replay time.
+
+    Packets sent through ``send`` are discarded.
+
+    :param filename: raw file (or shard index) to replay
+
+    :param speed: optional, multiple of real time to replay the messages at (``None`` to replay as fast as possible)
+
+    :param block_size: optional, number of messages read from the file at a time
+
+    :param loop: optional, start again from the beginning of the file once all messages are replayed
+
+    '''
+    _valid_config_classes = ['ReplayIO']
+
+    def __init__(self, filename, speed=1., block_size=10240, loop=False):
+        super(ReplayIO, self).__init__()
+        self.filename = filename
+        self.speed = speed
+        self.block_size = block_size
+        self.loop = loop
+
+        #: number of messages in the file
+        self.n_msgs = rawhdf5format.len_rawfile(filename)
+        #: number of messages replayed so far
+        self.n_replayed = 0
+
+        self._next_msg = 0
+        self._block = ([], [], [])
+        self._block_pos = 0
+        self._first_time = None
+        self._last_time = None
+        self._time_offset = 0
+        self._elapsed = 0.
+        self._listen_start = None
+
+    @property
+    def is_finished(self):
+        '''
+        ``True`` if all messages have been replayed (never if ``loop`` is set)
+
+        '''
+        if self.loop and self.n_msgs:
+            return False
+        return self._next_msg >= self.n_msgs and self._block_pos >= len(self._block[0])
+
+    def start_listening(self):
+        '''
+        Start (or resume) the replay clock
+
+        '''
+        if not self.is_listening:
+            self._listen_start = time.time()
+        super(ReplayIO, self).start_listening()
+
+    def stop_listening(self):
+        '''
+        Pause the replay clock
+
+        '''
+        if self.is_listening:
+            self._elapsed += time.time() - self._listen_start
+        super(ReplayIO, self).stop_listening()
+
+    def replay_time(self):
+        '''
+        :returns: time in seconds since the first message up to which messages are replayed
+
+        '''
+        elapsed = self._elapsed
+        if self.is_listening:
+            elapsed += time.time() - self._listen_start
+        return elapsed * self.speed
+
+    def _read_block(self):
+        if self._next_msg >= self.n_msgs and self.loop and self.n_msgs:
+            # continue after the last message of the previous pass (the last
+            # block may be empty if fewer messages than expected were read)
+            if self._last_time is not None:
+                self._time_offset = self._last_time + 1
+            self._next_msg = 0
+        end = min(self._next_msg + self.block_size, self.n_msgs)
+        # the merged order of a shard index is cached by rawhdf5format, so
+        # each block only reads its own messages
+        rd = rawhdf5format.from_rawfile(self.filename, start=self._next_msg, end=end)
+        times = [pacman_msg_format.parse_header(msg)[1] for msg in rd['msgs']]
+        if self._first_time is None and times:
+            self._first_time = times[0]
+        times = [t - self._first_time + self._time_offset for t in times]
+        if times:
+            self._last_time = times[-1]
+        self._block = (rd['msgs'], rd['msg_headers']['io_groups'], times)
+        self._block_pos = 0
+        self._next_msg = end
+
+    def _replay_msgs(self):
+        '''
+        :returns: ``tuple`` of ``list`` of messages and ``list`` of io groups that are due
+
+        '''
+        msgs = list()
+        io_groups = list()
+        if self._listen_start is None:
+            # replay starts with the first call to start_listening
+            return msgs, io_groups
+        if self.speed is None:
+            n_max = self.block_size
+        else:
+            replay_time = self.replay_time()
+        while not self.is_finished:
+            if self._block_pos >= len(self._block[0]):
+                self._read_block()
+                if not len(self._block[0]):
+                    break
+            block_msgs, block_io_groups, block_times = self._block
+            end = len(block_msgs)
+            if self.speed is None:
+                end = min(end, self._block_pos + n_max - len(msgs))
+            else:
+                end = bisect.bisect_right(block_times, replay_time, lo=self._block_pos)
+            msgs.extend(block_msgs[self._block_pos:end])
+            io_groups.extend(block_io_groups[self._block_pos:end])
+            self._block_pos = end
+            if end < len(block_msgs):
+                break
+        self.n_replayed += len(msgs)
+        return msgs, io_groups
+
+    def empty_queue(self):
+        '''
+        Read the messages that are due for replay
+
+        :returns: ``tuple`` of (``list`` of ``Packet`` objects, raw bytestream)
+
+        '''
+        msgs, io_groups = self._replay_msgs()
+        packets = list()
+        for msg, io_group in zip(msgs, io_groups):
+            packets.extend(pacman_msg_format.parse(msg, io_group=io_group))
+        return packets, b''.join(msgs)
+
+    def empty_queue_array(self):
+        '''
+        Read the messages that are due for replay as a ``PacketArray``
+
+        :returns: ``tuple`` of (``PacketArray``, raw bytestream)
+
+        '''
+        msgs, io_groups = self._replay_msgs()
+        return PacketArray(pacman_msg_format.parse_many(msgs, io_group=io_groups)), b''.join(msgs)
@@ -17,11 +17,19 @@ class Key(object):
     A key can be specified by a string of ``'<io group>-<io channel>-<chip id>'``, by io group, io channel, and chip id, or by
     using other Keys.
 
+    Keys are interned: only one ``Key`` object exists for each combination of
+    io group, io channel, and chip id, so creating a key that already exists
+    returns the existing object. Each key packs its fields into a 24-bit
+    integer (``io_group << 16 | io_channel << 8 | chip_id``, see ``packed``)
+    that is used for comparisons between keys. The key string and hash are
+    computed once when the key is first created.
+
     Keys are hashed by their string representation and are equivalent to their
     string representation so::
 
         key = Key(1,1,1) # io group, io channel, chip id
         key == Key('1-1-1') # True
+        key is Key('1-1-1') # True
         key == Key(key) # True
 
         key == '1-1-1' # True
@@ -38,40 +46,89 @@ class Key(object):
     key_delimiter = '-'
     key_format = key_delimiter.join(('{io_group}', '{io_channel}', '{chip_id}'))
 
-    def __init__(self, *args):
-        self._initialized = False
+    # packed key -> Key
+    _registry = dict()
+    # (io_group, io_channel, chip_id) -> Key
+    _field_registry = dict()
+
+    def __new__(cls, *args):
         if len(args) == 3:
-            self.io_group = args[0]
-            self.io_channel = args[1]
-            self.chip_id = args[2]
+            try:
+                return cls._field_registry[args]
+            except (KeyError, TypeError):
+                pass
+            io_group, io_channel, chip_id = args
         elif len(args) == 1:
             if isinstance(args[0], Key):
-                self.io_group = args[0].io_group
-                self.io_channel = args[0].io_channel
-                self.chip_id = args[0].chip_id
+                return args[0]
             elif isinstance(args[0], bytes):
-                self.keystring = str(args[0].decode("utf-8"))
+                keystring = str(args[0].decode("utf-8"))
             else:
-                self.keystring = str(args[0])
+                keystring = str(args[0])
+            parsed_keystring = keystring.split(Key.key_delimiter)
+            if len(parsed_keystring) != 3:
+                raise ValueError('invalid keystring formatting')
+            io_group, io_channel, chip_id = parsed_keystring
         else:
             raise TypeError('Key() takes 1 or 3 arguments ({} given)'.format(len(args)))
-        self._initialized = True
+        io_group = cls._validate('io_group', io_group)
+        io_channel = cls._validate('io_channel', io_channel)
+        chip_id = cls._validate('chip_id', chip_id)
+        return cls.from_packed((io_group << 16) | (io_channel << 8) | chip_id)
+
+    @classmethod
+    def from_packed(cls, packed):
+        '''
+        Get the Key represented by a 24-bit packed integer
+        (``io_group << 16 | io_channel << 8 | chip_id``)
+
+        :returns: ``Key``
+        '''
+        try:
+            return cls._registry[packed]
+        except KeyError:
+            pass
+        key = object.__new__(cls)
+        object.__setattr__(key, '_io_group', (packed >> 16) & 0xFF)
+        object.__setattr__(key, '_io_channel', (packed >> 8) & 0xFF)
+        object.__setattr__(key, '_chip_id', packed & 0xFF)
+        object.__setattr__(key, '_packed', packed)
+        object.__setattr__(key, '_keystring', Key.key_format.format(
+            io_group=key._io_group, io_channel=key._io_channel,
+            chip_id=key._chip_id))
+        object.__setattr__(key, '_hash', hash(key._keystring))
+        key = cls._registry.setdefault(packed, key)
+        cls._field_registry[(key._io_group, key._io_channel, key._chip_id)] = key
+        return key
+
+    @staticmethod
+    def _validate(name, val):
+        val = int(val)
+        if val > 255 or val < 0:
+            raise ValueError('{} must be 1-byte ({} invalid)'.format(name, val))
+        return val
+
+    def __reduce__(self):
+        return (Key.from_packed, (self._packed,))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('{} cannot be modified'.format(name))
 
     def __repr__(self):
-        return 'Key(\'{}\')'.format(self.keystring)
+        return 'Key(\'{}\')'.format(self._keystring)
 
     def __str__(self):
-        return self.keystring
+        return self._keystring
 
     def __eq__(self, other):
+        if self is other:
+            return True
         if isinstance(other, Key):
-            return self.io_group == other.io_group and \
-            self.io_channel == other.io_channel \
-            and self.chip_id == other.chip_id
+            return self._packed == other._packed
         if isinstance(other, tuple):
             return self.io_group == other[0] and self.io_channel == other[1] \
             and self.chip_id == other[2]
-        if str(self) == str(other):
+        if self._keystring == str(other):
             return True
         return False
 
@@ -79,35 +136,26 @@ class Key(object):
         return not self == other
 
     def __hash__(self):
-        return hash(str(self))
+        return self._hash
 
     def __getitem__(self, index):
         return (self.io_group, self.io_channel, self.chip_id)[index]
 
+    @property
+    def packed(self):
+        '''
+        24-bit integer representation of the key
+        (``io_group << 16 | io_channel << 8 | chip_id``)
+        '''
+        return self._packed
+
     @property
     def keystring(self):
         '''
         Key string specifying key io group, io channel, and chip id in the
         format: ``'<io group>-<io channel>-<chip id>'``
         '''
-        return Key.key_format.format(
-                io_group = self.io_group,
-                io_channel = self.io_channel,
-                chip_id = self.chip_id
-            )
-
-    @keystring.setter
-    def keystring(self, val):
-        if self._initialized:
-            raise AttributeError('keystring cannot be modified')
-        if not isinstance(val, str):
-            raise TypeError('keystring must be str')
-        parsed_keystring = val.split(Key.key_delimiter)
-        if len(parsed_keystring) != 3:
-            raise ValueError('invalid keystring formatting')
-        self.io_group = int(parsed_keystring[0])
-        self.io_channel = int(parsed_keystring[1])
-        self.chip_id = int(parsed_keystring[2])
+        return self._keystring
 
     @property
     def chip_id(self):
@@ -117,15 +165,6 @@ class Key(object):
         '''
         return self._chip_id
 
-    @chip_id.setter
-    def chip_id(self, val):
-        if self._initialized:
-            raise AttributeError('chipid cannot be modified')
-        chip_id = int(val)
-        if chip_id > 255 or chip_id < 0:
-            raise ValueError('chip_id must be 1-byte ({} invalid)'.format(chip_id))
-        self._chip_id = chip_id
-
     @property
     def io_channel(self):
         '''
@@ -135,15 +174,6 @@ class Key(object):
         '''
         return self._io_channel
 
-    @io_channel.setter
-    def io_channel(self, val):
-        if self._initialized:
-            raise AttributeError('io_channel cannot be modified')
-        io_channel = int(val)
-        if io_channel > 255 or io_channel < 0:
-            raise ValueError('io_channel must be 1-byte ({} invalid)'.format(io_channel))
-        self._io_channel = io_channel
-
     @property
     def io_group(self):
         '''
@@ -152,15 +182,6 @@ class Key(object):
         '''
         return self._io_group
 
-    @io_group.setter
-    def io_group(self, val):
-        if self._initialized:
-            raise AttributeError('io_group cannot be modified')
-        io_group = int(val)
-        if io_group > 255 or io_group < 0:
-            raise ValueError('io_group must be 1-byte ({} invalid)'.format(io_group))
-        self._io_group = io_group
-
     @staticmethod
     def is_valid_keystring(keystring):
         '''
@@ -11,7 +11,7 @@ import numpy as np
 import h5py
 
 from larpix.logger import Logger
-from larpix import Packet, TimestampPacket, Packet_v1, Packet_v2, SyncPacket, TriggerPacket
+from larpix import Packet, TimestampPacket, Packet_v1, Packet_v2, PacketView, SyncPacket, TriggerPacket, PacketArray
 from larpix.format.hdf5format import to_file, latest_version
 
 class HDF5Logger(Logger):
@@ -41,6 +41,7 @@ class HDF5Logger(Logger):
     data_desc_map = {
         Packet_v1: 'packets',
         Packet_v2: 'packets',
+        PacketView: 'packets',
         TimestampPacket: 'packets',
         SyncPacket: 'packets',
         TriggerPacket: 'packets'
@@ -96,7 +97,9 @@ class HDF5Logger(Logger):
         .. note:: buffer is flushed after all ``data`` is placed in buffer, this
             means that the buffer size will exceed the set value temporarily
 
-        :param data: list of data to be written to log
+        :param data: list of data or ``PacketArray`` to be written to log.
+            A ``PacketArray`` is passed to the file writer as a whole
+            rather than added to the buffer.
         :param direction: ``Logger.WRITE`` if packets were sent to
             ASICs, ``Logger.READ`` if packets
             were received from ASICs. (default: ``Logger.WRITE``)
@@ -104,6 +107,14 @@ class HDF5Logger(Logger):
         '''
         if not self.is_enabled():
             return
+        if isinstance(data, PacketArray):
+            data['direction'][:] = direction
+            # write any buffered packets first to keep the packet order
+            self.flush(block=False)
+            self._worker_queue.put(data)
+            if self._worker is None:
+                self._launch_worker()
+            return
         if not isinstance(data, list):
             raise ValueError('data must be a list')
 
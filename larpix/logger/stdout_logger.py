@@ -2,6 +2,7 @@ from __future__ import print_function
 import time
 
 from larpix.logger import Logger
+from larpix import PacketArray
 
 class StdoutLogger(Logger):
     '''
@@ -22,13 +23,13 @@ class StdoutLogger(Logger):
         '''
         Send the specified data to stdout
 
-        :param data: list of data to be written to log
+        :param data: list of data (or ``PacketArray``) to be written to log
         :param direction: 0 if packets were sent to ASICs, 1 if packets
             were received from ASICs. optional, default=0
         '''
         if not self.is_enabled():
             return
-        if not isinstance(data,list):
+        if not isinstance(data,(list,PacketArray)):
             raise ValueError('data must be a list')
 
         self._buffer += ['Record: {}'.format(str(data_obj)) for data_obj in data]
@@ -6,4 +6,7 @@ from .trigger_packet import *
 from .sync_packet import *
 Packet = Packet_v2
 
+from .packet_view import *
+from .duplicate_filter import *
 from .packet_collection import *
+from .packet_array import *
@@ -0,0 +1,111 @@
+from collections import deque
+
+import numpy as np
+
+from .packet_v2 import Packet_v2
+from .packet_array import PacketArray
+
+class DuplicateFilter(object):
+    '''
+    Drops repeated copies of the same packet received within a short
+    sliding window.
+
+    When packets are sent twice (e.g. with ``PACMAN_IO.double_send_packets``),
+    each chip responds to both copies, so every config read reply is
+    received twice. The filter remembers the 64-bit word, io group, and io
+    channel of the last ``window`` received packets of the selected
+    ``packet_types`` and flags any exact repeats as duplicates::
+
+        dedup = DuplicateFilter(window=256)
+        packets = dedup.filter(packets) # remove duplicates from a list of packets
+        dedup.is_duplicate(word, io_group, io_channel) # check a single 64-bit word
+        dedup.n_dropped # number of duplicates found
+
+    Only packets of the selected types are added to the window, so
+    unrelated packets (e.g. data packets) do not push config read replies
+    out of the window.
+
+    Duplicates can only be replies to the same request, so the window
+    should be cleared with ``reset()`` whenever new packets are sent.
+    ``Controller.send`` and ``PACMAN_IO.send`` reset their filters, so a
+    register that is read again in a later transaction is reported again.
+
+    .. note:: Received packets are filtered when they are read, so the
+        replies to an earlier request should be read before the request is
+        repeated. Otherwise the repeated replies are still in the same
+        window and are dropped.
+
+    :param window: number of recent packets to compare against
+
+    :param packet_types: ``Packet_v2`` packet types to filter (default is config read packets only)
+
+    '''
+    def __init__(self, window=256, packet_types=(Packet_v2.CONFIG_READ_PACKET,)):
+        self.window = window
+        self.packet_types = packet_types
+        self.n_dropped = 0
+        self.reset()
+
+    def reset(self):
+        '''
+        Forget all previously seen packets
+
+        '''
+        self._recent = deque()
+        self._seen = set()
+
+    def is_duplicate(self, word, io_group, io_channel):
+        '''
+        Check if a packet is a repeat of a recent packet, and add it to the
+        window if it is not.
+
+        :param word: the packet as a 64-bit ``int`` or as 8 little-endian bytes
+
+        :param io_group: io group the packet was received on
+
+        :param io_channel: io channel the packet was received on
+
+        :returns: ``True`` if the packet should be dropped
+
+        '''
+        if isinstance(word, int):
+            packet_type = word & 0b11
+        else:
+            packet_type = word[0] & 0b11
+            word = int.from_bytes(word, 'little')
+        if packet_type not in self.packet_types:
+            return False
+        key = (word, io_group, io_channel)
+        if key in self._seen:
+            self.n_dropped += 1
+            return True
+        self._recent.append(key)
+        self._seen.add(key)
+        while len(self._recent) > self.window:
+            self._seen.discard(self._recent.popleft())
+        return False
+
+    def filter(self, packets):
+        '''
+        Remove duplicate ``Packet_v2`` packets from a list of packets or a
+        ``PacketArray``. Other packet types are always kept.
+
+        :returns: new ``list`` of packets (or ``PacketArray`` if ``packets`` is a ``PacketArray``)
+
+        '''
+        if isinstance(packets, PacketArray):
+            keep = np.ones(len(packets), dtype=bool)
+            candidates = np.flatnonzero(np.isin(packets['packet_type'], self.packet_types))
+            words = packets.words()[candidates].tolist()
+            io_group = packets['io_group'][candidates].tolist()
+            io_channel = packets['io_channel'][candidates].tolist()
+            for i, word, group, channel in zip(candidates.tolist(), words, io_group, io_channel):
+                keep[i] = not self.is_duplicate(word, group, channel)
+            return PacketArray(packets.data[keep], message=packets.message,
+                read_id=packets.read_id)
+        return [
+            packet for packet in packets
+            if not isinstance(packet, Packet_v2)
+            or not self.is_duplicate(packet.as_int(), packet.io_group,
+                packet.io_channel)
+            ]
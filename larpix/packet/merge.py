@@ -0,0 +1,202 @@
+'''
+Streaming time-ordered merge of packet streams.
+
+Packets returned by the PACMAN readout arrive grouped by message and io group
+and are not time-ordered across io channels or io groups. ``merge_packets``
+merges several packet streams (typically one per io group) into a single
+time-ordered stream without holding the full data set in memory::
+
+    from larpix.packet.merge import merge_packets
+
+    streams = [io_group_1_batches, io_group_2_batches] # iterables of packet batches
+    for batch in merge_packets(streams, lookahead=1024):
+        ... # each batch is time ordered and follows the previous batch
+
+Each stream is an iterable of batches, where a batch is either a list of
+packet objects or a ``PacketArray`` (or a numpy structured array with the
+``PacketArray`` dtype). The output batches are of the same kind as the input.
+
+Packets are ordered by ``(receipt_timestamp, timestamp)``. The 32-bit
+``receipt_timestamp`` is unwrapped within each stream to account for
+rollovers. ``SyncPacket`` and ``TriggerPacket`` are ordered by their
+(PACMAN) ``timestamp``, and packets without a PACMAN timestamp (e.g.
+``TimestampPacket``) are kept directly after the packet that preceded them
+in their stream.
+
+'''
+import itertools
+
+import numpy as np
+
+from .packet_v2 import Packet_v2
+from .sync_packet import SyncPacket
+from .trigger_packet import TriggerPacket
+from .packet_array import PacketArray
+
+#: rollover period of the PACMAN ``receipt_timestamp``
+receipt_timestamp_rollover = 2**32
+
+class _StreamState(object):
+    def __init__(self):
+        self.pending = None # sorted (key0, key1, payload) held back
+        self.frontier = None # key of the last released packet
+        self.last_raw = None # last receipt timestamp before unwrapping
+        self.n_rollovers = 0
+        self.last_key = (-1, 0)
+
+def _packet_raw_key(packet):
+    if isinstance(packet, Packet_v2):
+        return getattr(packet, 'receipt_timestamp', None), packet.timestamp
+    if isinstance(packet, (SyncPacket, TriggerPacket)):
+        return packet.timestamp, 0
+    return None, 0
+
+def _raw_keys(payload):
+    '''
+    :returns: tuple of primary (PACMAN) timestamp, secondary timestamp, and a mask of packets with a PACMAN timestamp
+
+    '''
+    if isinstance(payload, np.ndarray):
+        packet_type = payload['packet_type']
+        is_v2 = packet_type < 4
+        has_key = is_v2 | (packet_type == 6) | (packet_type == 7)
+        primary = np.where(is_v2, payload['receipt_timestamp'],
+            payload['timestamp']).astype(np.int64)
+        secondary = np.where(is_v2, payload['timestamp'], 0).astype(np.int64)
+        return primary, secondary, has_key
+    keys = [_packet_raw_key(packet) for packet in payload]
+    has_key = np.array([key[0] is not None for key in keys], dtype=bool)
+    primary = np.array([key[0] or 0 for key in keys], dtype=np.int64)
+    secondary = np.array([key[1] or 0 for key in keys], dtype=np.int64)
+    return primary, secondary, has_key
+
+def _keys(payload, state):
+    '''
+    Calculate the sort keys of a batch, unwrapping the receipt timestamp
+    and updating the stream state
+
+    '''
+    primary, secondary, has_key = _raw_keys(payload)
+    n = len(primary)
+    if not n:
+        return primary, secondary
+    values = primary[has_key]
+    if len(values):
+        prev = np.empty_like(values)
+        prev[0] = values[0] if state.last_raw is None else state.last_raw
+        prev[1:] = values[:-1]
+        diff = values - prev
+        half = receipt_timestamp_rollover // 2
+        # late packets from before a rollover step back down
+        n_rollovers = state.n_rollovers + np.cumsum(
+            (diff < -half).astype(np.int64) - (diff > half).astype(np.int64))
+        primary[has_key] = values + n_rollovers * receipt_timestamp_rollover
+        state.last_raw = values[-1]
+        state.n_rollovers = n_rollovers[-1]
+    # packets without a timestamp follow the preceding packet
+    index = np.maximum.accumulate(np.where(has_key, np.arange(n), -1))
+    filled = index >= 0
+    primary = np.where(filled, primary[index], state.last_key[0])
+    secondary = np.where(filled, secondary[index], state.last_key[1])
+    state.last_key = (primary[-1], secondary[-1])
+    return primary, secondary
+
+def _concatenate(payloads):
+    if isinstance(payloads[0], np.ndarray):
+        return np.concatenate(payloads)
+    return list(itertools.chain.from_iterable(payloads))
+
+def _take(payload, index):
+    if isinstance(payload, np.ndarray):
+        return payload[index]
+    return [payload[i] for i in index]
+
+def _join(chunks):
+    '''
+    Combine a list of (key0, key1, payload) chunks into a single chunk
+
+    '''
+    if len(chunks) == 1:
+        return chunks[0]
+    return (np.concatenate([chunk[0] for chunk in chunks]),
+        np.concatenate([chunk[1] for chunk in chunks]),
+        _concatenate([chunk[2] for chunk in chunks]))
+
+def _sorted(chunk):
+    order = np.lexsort((chunk[1], chunk[0]))
+    return chunk[0][order], chunk[1][order], _take(chunk[2], order)
+
+def _split(chunk, index):
+    return ((chunk[0][:index], chunk[1][:index], chunk[2][:index]),
+        (chunk[0][index:], chunk[1][index:], chunk[2][index:]))
+
+def merge_packets(streams, lookahead=1024):
+    '''
+    Merge packet streams into a single time-ordered stream (see module
+    description).
+
+    Within each stream, up to ``lookahead`` packets are held back to
+    correct for packets that arrive out of order (e.g. across io channels).
+    Packets that are further out of order within their stream are not
+    guaranteed to be emitted in order. Across streams, a packet is only
+    emitted once every unfinished stream has released a later packet, so
+    memory use is bounded by ``lookahead`` plus about one batch per stream.
+
+    :param streams: list of iterables of packet batches (lists of packets or ``PacketArray``)
+
+    :param lookahead: number of packets held back in each stream
+
+    :yields: time-ordered batches of packets (``list`` or ``PacketArray``, matching the input)
+
+    '''
+    iterators = [iter(stream) for stream in streams]
+    states = [_StreamState() for _ in iterators]
+    active = list(range(len(iterators)))
+    ready = []
+    wrap_array = None
+    while active:
+        # pull from a stream that has not released anything yet, or else
+        # from the one that is furthest behind
+        waiting = [i for i in active if states[i].frontier is None]
+        if waiting:
+            i = waiting[0]
+        else:
+            i = min(active, key=lambda i: states[i].frontier)
+        state = states[i]
+        try:
+            batch = next(iterators[i])
+        except StopIteration:
+            active.remove(i)
+            if state.pending is not None and len(state.pending[0]):
+                ready.append(state.pending)
+            state.pending = None
+        else:
+            if isinstance(batch, PacketArray):
+                batch = batch.data
+            if wrap_array is None:
+                wrap_array = isinstance(batch, np.ndarray)
+            key0, key1 = _keys(batch, state)
+            chunk = (key0, key1, batch)
+            if state.pending is not None:
+                chunk = _join([state.pending, chunk])
+            chunk = _sorted(chunk)
+            release, state.pending = _split(chunk, max(len(chunk[0]) - lookahead, 0))
+            if len(release[0]):
+                ready.append(release)
+                state.frontier = (release[0][-1], release[1][-1])
+
+        if not ready:
+            continue
+        if active and any(states[i].frontier is None for i in active):
+            continue
+        chunk = _sorted(_join(ready))
+        if active:
+            watermark = min(states[i].frontier for i in active)
+            n_emit = np.count_nonzero((chunk[0] < watermark[0])
+                | ((chunk[0] == watermark[0]) & (chunk[1] <= watermark[1])))
+        else:
+            n_emit = len(chunk[0])
+        emit, remaining = _split(chunk, n_emit)
+        ready = [remaining] if len(remaining[0]) else []
+        if len(emit[0]):
+            yield PacketArray(emit[2]) if wrap_array else emit[2]
@@ -0,0 +1,432 @@
+'''
+A columnar container for large numbers of packets.
+
+A ``PacketArray`` stores packets in a numpy structured array that uses the
+same layout as the ``packets`` dataset of the LArPix+HDF5 format (see
+``larpix.format.hdf5format.dtypes``). Each field can be accessed as a numpy
+array view without creating any packet objects::
+
+    arr = PacketArray.from_packets(packets)
+    arr['dataword'] # numpy array of datawords
+    data = arr[arr['packet_type'] == Packet_v2.DATA_PACKET] # boolean selection
+    first_ten = arr[:10] # a view, no copy is made
+    by_key = arr.by_chip_key() # { chip_key: PacketArray }
+
+A ``PacketArray`` can be converted losslessly to and from a list of
+``Packet_v2``, ``TimestampPacket``, ``SyncPacket``, and ``TriggerPacket``
+objects::
+
+    arr = PacketArray.from_packets(packets)
+    packets == arr.to_packets() # True
+
+'''
+import numpy as np
+
+from ..key import Key
+from .packet_v2 import Packet_v2
+from .parity import compute_parity
+
+#: LArPix+HDF5 format version used for the ``PacketArray`` layout
+packet_array_version = '2.4'
+
+# (field, shift, mask) describing how the 64-bit Packet_v2 word is
+# spread across the structured array columns
+_word_fields = [
+    (name,) + getattr(Packet_v2, '_' + name + '_shift_mask')
+    for name in ('packet_type', 'chip_id', 'channel_id', 'timestamp',
+        'first_packet', 'dataword', 'trigger_type', 'local_fifo',
+        'shared_fifo', 'downstream_marker', 'parity')
+    ]
+_fifo_diagnostics_word_fields = [
+    (name,) + getattr(Packet_v2, '_' + name + '_shift_mask')
+    for name in ('packet_type', 'chip_id', 'channel_id',
+        'fifo_diagnostics_timestamp', 'shared_fifo_events',
+        'local_fifo_events', 'first_packet', 'dataword', 'trigger_type',
+        'local_fifo', 'shared_fifo', 'downstream_marker', 'parity')
+    ]
+
+_dtype = None
+def packet_dtype():
+    '''
+    :returns: the numpy structured dtype used by ``PacketArray``
+
+    '''
+    global _dtype
+    if _dtype is None:
+        # imported here to avoid a circular import at package load
+        from ..format.hdf5format import dtypes
+        _dtype = np.dtype(dtypes[packet_array_version]['packets'])
+    return _dtype
+
+def words_to_array(words, io_group=0, io_channel=0, receipt_timestamp=0):
+    '''
+    Decode an array of 64-bit Packet_v2 words into a packet structured array.
+
+    :param words: array-like of ``uint64`` packet words (bit 0 is the least significant bit)
+
+    :param io_group: scalar or array of io group for each word
+
+    :param io_channel: scalar or array of io channel for each word
+
+    :param receipt_timestamp: scalar or array of receipt timestamp for each word
+
+    :returns: numpy structured array with dtype ``packet_dtype()``
+
+    '''
+    words = np.asarray(words, dtype=np.uint64)
+    arr = np.zeros(words.shape, dtype=packet_dtype())
+    arr['io_group'] = io_group
+    arr['io_channel'] = io_channel
+    arr['receipt_timestamp'] = receipt_timestamp
+    for name, shift, mask in _word_fields:
+        arr[name] = (words >> np.uint64(shift)) & np.uint64(mask)
+    arr['valid_parity'] = arr['parity'] == compute_parity(words)
+    # register fields overlap with the data fields
+    shift, mask = Packet_v2._register_address_shift_mask
+    arr['register_address'] = (words >> np.uint64(shift)) & np.uint64(mask)
+    shift, mask = Packet_v2._register_data_shift_mask
+    arr['register_data'] = (words >> np.uint64(shift)) & np.uint64(mask)
+    return arr
+
+def array_to_words(arr):
+    '''
+    Encode the Packet_v2 rows of a packet structured array into 64-bit words.
+    Rows that do not represent a Packet_v2 (``packet_type > 3``) have
+    undefined values.
+
+    :param arr: numpy structured array with dtype ``packet_dtype()``
+
+    :returns: numpy ``uint64`` array
+
+    '''
+    words = np.zeros(arr.shape, dtype=np.uint64)
+    fifo_diagnostics = arr['fifo_diagnostics_enabled'].astype(bool)
+    for name, shift, mask in _word_fields:
+        words |= (arr[name].astype(np.uint64) & np.uint64(mask)) << np.uint64(shift)
+    if np.any(fifo_diagnostics):
+        fifo_words = np.zeros(np.count_nonzero(fifo_diagnostics), dtype=np.uint64)
+        for name, shift, mask in _fifo_diagnostics_word_fields:
+            column = name if name != 'fifo_diagnostics_timestamp' else 'timestamp'
+            fifo_words |= (arr[column][fifo_diagnostics].astype(np.uint64) & np.uint64(mask)) << np.uint64(shift)
+        words[fifo_diagnostics] = fifo_words
+    return words
+
+class PacketArray(object):
+    '''
+    Represents a group of packets stored as a numpy structured array (using
+    the ``larpix.format.hdf5format`` ``'packets'`` layout).
+
+    Index into the PacketArray to access data:
+
+        >>> arr['timestamp'] # a field view (numpy array)
+        >>> arr[:10] # a PacketArray view of the first 10 packets
+        >>> arr[arr['chip_id'] == 12] # a PacketArray of packets from chip 12
+        >>> arr[0] # the first row converted into a packet object
+
+    :param data: optional, a numpy structured array with dtype ``packet_dtype()`` (additional fields, e.g. ``abs_timestamp``, are allowed) or an integer number of (zeroed) packets
+
+    :param message: optional, message associated with the packets
+
+    :param read_id: optional, read id associated with the packets
+
+    '''
+    def __init__(self, data=None, message='', read_id=None):
+        if data is None:
+            data = 0
+        if isinstance(data, (int, np.integer)):
+            data = np.zeros((data,), dtype=packet_dtype())
+        elif data.dtype != packet_dtype() and (data.dtype.names is None or not all(
+                name in data.dtype.names and data.dtype[name] == packet_dtype()[name]
+                for name in packet_dtype().names)):
+            raise ValueError('invalid dtype for PacketArray')
+        self.data = data
+        self.message = message
+        self.read_id = read_id
+        self.parent = None
+
+    def __eq__(self, other):
+        '''
+        Return True if the packet data and message compare equal.
+
+        '''
+        if not isinstance(other, PacketArray):
+            return False
+        return (self.message == other.message and
+                np.array_equal(self.data, other.data))
+
+    def __ne__(self, other):
+        return not (self == other)
+
+    def __repr__(self):
+        return '<%s with %d packets, read_id %s, "%s">' % (self.__class__.__name__,
+                len(self), self.read_id, self.message)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, key):
+        '''
+        Get the specified item(s).
+
+        If key is a str, return a view of that field.
+
+        If key is an int, return the packet object at that index.
+
+        If key is a slice, return a PacketArray view into the specified
+        packets.
+
+        If key is a boolean mask or an array of indices, return a
+        PacketArray with a copy of the specified packets.
+
+        '''
+        if isinstance(key, str):
+            return self.data[key]
+        if isinstance(key, (int, np.integer)):
+            row = self.data[[key]]
+            return self._row_to_packet(row[0], array_to_words(row)[0])
+        items = PacketArray(self.data[key])
+        if isinstance(key, slice):
+            items.message = '%s | subset %s' % (self.message, key)
+        else:
+            items.message = '%s | subset' % self.message
+        items.parent = self
+        items.read_id = self.read_id
+        return items
+
+    @property
+    def dtype(self):
+        return self.data.dtype
+
+    @property
+    def fields(self):
+        return self.data.dtype.names
+
+    @classmethod
+    def from_packets(cls, packets, **kwargs):
+        '''
+        Create a PacketArray from a list of packet objects. Valid packet
+        objects are ``Packet_v2``, ``TimestampPacket``, ``SyncPacket``, and
+        ``TriggerPacket``. Other objects are skipped.
+
+        :param packets: list of packet objects
+
+        :param kwargs: additional keyword arguments passed to ``PacketArray()``
+
+        '''
+        from ..format.hdf5format import _encode_packet, _format_method_lookup
+        valid_classes = _format_method_lookup[packet_array_version]['packets']
+        packets = [
+            packet for packet in packets
+            if packet.__class__ in valid_classes and packet.packet_type != 5
+            ]
+        data = np.zeros(len(packets), dtype=packet_dtype())
+        # plain Packet_v2 packets are decoded from their words in one pass
+        from_words = np.array([
+            isinstance(packet, Packet_v2)
+            and not packet.fifo_diagnostics_enabled
+            and getattr(packet, 'valid_parity', None) is None
+            for packet in packets
+            ], dtype=bool)
+        word_packets = [packet for packet, is_word in zip(packets, from_words) if is_word]
+        if word_packets:
+            words = np.fromiter((packet.as_int() for packet in word_packets),
+                dtype=np.uint64, count=len(word_packets))
+            word_data = words_to_array(words,
+                io_group=[packet.io_group or 0 for packet in word_packets],
+                io_channel=[packet.io_channel or 0 for packet in word_packets],
+                receipt_timestamp=[getattr(packet, 'receipt_timestamp', None) or 0
+                    for packet in word_packets])
+            word_data['direction'] = [getattr(packet, 'direction', None) or 0
+                for packet in word_packets]
+            data[from_words] = word_data
+        if not np.all(from_words):
+            data[~from_words] = np.array([
+                _encode_packet(packet, packet_array_version, 'packets')
+                for packet, is_word in zip(packets, from_words) if not is_word
+                ], dtype=packet_dtype())
+        return cls(data, **kwargs)
+
+    @classmethod
+    def from_words(cls, words, io_group=0, io_channel=0, receipt_timestamp=0, **kwargs):
+        '''
+        Create a PacketArray of Packet_v2 packets from 64-bit words. See
+        ``words_to_array``.
+
+        '''
+        return cls(words_to_array(words, io_group=io_group,
+            io_channel=io_channel, receipt_timestamp=receipt_timestamp),
+            **kwargs)
+
+    @classmethod
+    def concatenate(cls, arrays, **kwargs):
+        '''
+        Join a sequence of PacketArrays (or structured arrays) into a new
+        PacketArray
+
+        '''
+        data = [arr.data if isinstance(arr, PacketArray) else arr for arr in arrays]
+        if not len(data):
+            return cls(**kwargs)
+        return cls(np.concatenate(data), **kwargs)
+
+    def words(self):
+        '''
+        :returns: a ``uint64`` array of Packet_v2 words, see ``array_to_words``
+
+        '''
+        return array_to_words(self.data)
+
+    @staticmethod
+    def _word_to_packet(word, io_group, io_channel, receipt_timestamp,
+            direction, fifo_diagnostics_enabled):
+        p = Packet_v2(int(word).to_bytes(Packet_v2.num_bytes, 'little'))
+        if fifo_diagnostics_enabled:
+            p.fifo_diagnostics_enabled = True
+        p.io_group = int(io_group)
+        p.io_channel = int(io_channel)
+        p.receipt_timestamp = int(receipt_timestamp)
+        p.direction = int(direction)
+        return p
+
+    @staticmethod
+    def _row_to_packet(row, word):
+        packet_type = row['packet_type']
+        if packet_type < 4:
+            return PacketArray._word_to_packet(word, row['io_group'],
+                row['io_channel'], row['receipt_timestamp'], row['direction'],
+                row['fifo_diagnostics_enabled'] != 0)
+        if packet_type == 5:
+            # message packets are not supported
+            return None
+        from ..format.hdf5format import _parse_method_lookup
+        return _parse_method_lookup[packet_array_version]['packets'](row, None)
+
+    def to_packets(self):
+        '''
+        Convert to a list of packet objects, inverse of
+        ``PacketArray.from_packets``
+
+        '''
+        columns = [self.data[name].tolist() for name in ('packet_type',
+            'io_group', 'io_channel', 'receipt_timestamp', 'direction',
+            'fifo_diagnostics_enabled')]
+        packets = []
+        for i, (word, packet_type, *row) in enumerate(zip(self.words().tolist(), *columns)):
+            if packet_type < 4:
+                p = self._word_to_packet(word, *row)
+            else:
+                p = self._row_to_packet(self.data[i], word)
+            if p is not None:
+                packets.append(p)
+        return packets
+
+    def _selection_mask(self, **selection):
+        mask = np.ones(len(self), dtype=bool)
+        for key, value in selection.items():
+            if key == 'chip_key':
+                key = Key(value)
+                mask &= self._v2_mask()
+                mask &= self.data['io_group'] == key.io_group
+                mask &= self.data['io_channel'] == key.io_channel
+                mask &= self.data['chip_id'] == key.chip_id
+            else:
+                mask &= self.data[key] == value
+        return mask
+
+    def _v2_mask(self):
+        return self.data['packet_type'] < 4
+
+    def extract(self, *attrs, **selection):
+        '''
+        Extract the given field(s) from packets specified by selection
+        and return a numpy array (or a list of arrays for multiple fields).
+
+        Usage:
+
+        >>> # Return an array of adc counts from any data packets
+        >>> dataword = arr.extract('dataword', packet_type=0)
+        >>> # Return arrays of chip id and channel id
+        >>> chip_ids, channel_ids = arr.extract('chip_id', 'channel_id')
+
+        '''
+        mask = self._selection_mask(**selection)
+        if len(attrs) > 1:
+            return [self.data[attr][mask] for attr in attrs]
+        return self.data[attrs[0]][mask]
+
+    def _packed_chip_key(self):
+        return ((self.data['io_group'].astype(np.uint32) << 16)
+            | (self.data['io_channel'].astype(np.uint32) << 8)
+            | self.data['chip_id'].astype(np.uint32))
+
+    def _grouped(self, values):
+        '''
+        Group rows by ``values``
+
+        :returns: list of ``(value, sorted indices)`` pairs
+
+        '''
+        if not len(values):
+            return []
+        unique, inverse = np.unique(values, return_inverse=True)
+        order = np.argsort(inverse, kind='stable')
+        splits = np.cumsum(np.bincount(inverse.ravel(), minlength=len(unique)))[:-1]
+        return list(zip(unique, np.split(order, splits)))
+
+    def _subset(self, index, message):
+        new_array = PacketArray(self.data[index])
+        new_array.message = message
+        new_array.read_id = self.read_id
+        new_array.parent = self
+        return new_array
+
+    def with_chip_key(self, chip_key):
+        '''
+        Return a PacketArray of Packet_v2 packets with the specified chip key.
+
+        '''
+        return self._subset(self._selection_mask(chip_key=chip_key),
+            self.message + ' | chip {}'.format(Key(chip_key)))
+
+    def by_chip_key(self):
+        '''
+        Return a dict of { chip_key: PacketArray }. Packets that are not
+        Packet_v2 packets (timestamp, sync, trigger) are grouped under
+        ``None``.
+
+        '''
+        is_v2 = self._v2_mask()
+        v2_index = np.flatnonzero(is_v2)
+        to_return = {}
+        for packed_key, index in self._grouped(self._packed_chip_key()[v2_index]):
+            chip_key = Key.from_packed(int(packed_key))
+            to_return[chip_key] = self._subset(v2_index[index],
+                self.message + ' | chip {}'.format(chip_key))
+        if not np.all(is_v2):
+            to_return[None] = self._subset(~is_v2,
+                self.message + ' | chip {}'.format(None))
+        return to_return
+
+    def with_chipid(self, chipid):
+        '''
+        Return a PacketArray of Packet_v2 packets with the specified chip ID.
+
+        '''
+        return self._subset(self._v2_mask() & (self.data['chip_id'] == chipid),
+            self.message + ' | chip %s' % chipid)
+
+    def by_chipid(self):
+        '''
+        Return a dict of { chipid: PacketArray } of the Packet_v2 packets.
+
+        '''
+        v2_index = np.flatnonzero(self._v2_mask())
+        to_return = {}
+        for chipid, index in self._grouped(self.data['chip_id'][v2_index]):
+            to_return[int(chipid)] = self._subset(v2_index[index],
+                self.message + ' | chip %s' % chipid)
+        return to_return
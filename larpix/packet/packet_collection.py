@@ -1,9 +1,12 @@
 from bitarray import bitarray
 import struct
 
+import numpy as np
+
 from .. import bitarrayhelper as bah
 from ..key import Key
 from . import Packet
+from .packet_array import PacketArray
 
 class PacketCollection(object):
     '''
@@ -30,8 +33,23 @@ class PacketCollection(object):
         >>> type(bits_format_first_10[0])
         str
 
+    Queries on the attributes in ``indexed_attrs`` (used by ``extract``,
+    ``with_chip_key``, and ``by_chip_key``) are answered from secondary
+    indexes that are built the first time each attribute is queried. The
+    indexes are rebuilt if packets are replaced or removed with
+    ``collection[i] = packet`` / ``del collection[i]``, if a new list is
+    assigned to ``collection.packets``, or if the length of
+    ``collection.packets`` changes (e.g. ``collection.packets.append(...)``).
+    The indexes are a snapshot of the packet attribute values, so they are
+    not rebuilt if a packet is modified in place (e.g. ``packet.chip_key =
+    ...``) or replaced directly in the list (``collection.packets[i] =
+    packet``); call ``reset_indexes()`` after such modifications.
 
     '''
+    #: packet attributes that are indexed on first use
+    indexed_attrs = ('packet_type', 'chip_key', 'chip_id', 'io_channel',
+        'channel_id')
+
     def __init__(self, packets, bytestream=None, message='',
             read_id=None, skipped=None):
         self.packets = packets
@@ -40,6 +58,7 @@ class PacketCollection(object):
         self.message = message
         self.read_id = read_id
         self.parent = None
+        self.reset_indexes()
 
     def __eq__(self, other):
         '''
@@ -102,6 +121,14 @@ class PacketCollection(object):
         else:
             return self.packets[key]
 
+    def __setitem__(self, key, value):
+        self.packets[key] = value
+        self.reset_indexes()
+
+    def __delitem__(self, key):
+        del self.packets[key]
+        self.reset_indexes()
+
     def _bits_getitem(self, key):
         '''
         Replace each packet with a string of the packet bits grouped 8
@@ -146,13 +173,107 @@ class PacketCollection(object):
             packet = Packet()
             packet.bits = bitarray(bits)
             self.packets.append(packet)
+        self.reset_indexes()
+
+    def to_array(self):
+        '''
+        Export the packets in this PacketCollection to a ``PacketArray``.
+        This is a compact binary alternative to ``to_dict()`` (excluding the
+        bytestream).
+
+        :raises ValueError: if the collection contains packets that cannot be stored in a ``PacketArray`` (valid packets are ``Packet_v2``, ``TimestampPacket``, ``SyncPacket``, and ``TriggerPacket``)
+
+        '''
+        arr = PacketArray.from_packets(self.packets, message=str(self.message),
+            read_id=self.read_id)
+        if len(arr) != len(self.packets):
+            raise ValueError('{} packet(s) cannot be stored in a PacketArray'.format(
+                len(self.packets) - len(arr)))
+        return arr
+
+    def from_array(self, arr, bytestream=None):
+        '''
+        Load the information in the ``PacketArray`` into this
+        PacketCollection.
+
+        '''
+        self.message = arr.message
+        self.read_id = arr.read_id
+        self.bytestream = bytestream
+        self.parent = None
+        self.packets = arr.to_packets()
+        self.reset_indexes()
+
+    def reset_indexes(self):
+        '''
+        Discard the secondary indexes, they will be rebuilt on next use
+
+        '''
+        self._indexes = dict()
+        self._indexed_packets = None
+        self._indexed_len = None
 
-    def extract(self, *attrs, **selection):
+    def _index(self, attr):
+        '''
+        Get the index for ``attr`` as a dict of ``{ value: indices }``,
+        building it if necessary. Packets without ``attr`` are not indexed.
+
+        :returns: ``dict`` or ``None`` if the attribute values cannot be indexed
+
+        '''
+        # cheap checks for a new packet list or a change in its length,
+        # other modifications must be followed by reset_indexes()
+        if (self._indexed_packets is not self.packets
+                or self._indexed_len != len(self.packets)):
+            self.reset_indexes()
+            self._indexed_packets = self.packets
+            self._indexed_len = len(self.packets)
+        if attr not in self._indexes:
+            index = dict()
+            try:
+                for i, p in enumerate(self.packets):
+                    try:
+                        value = getattr(p, attr)
+                    except AttributeError:
+                        continue
+                    index.setdefault(value, []).append(i)
+                index = dict((value, np.array(indices, dtype=int))
+                    for value, indices in index.items())
+            except TypeError:
+                # unhashable attribute values
+                index = None
+            self._indexes[attr] = index
+        return self._indexes[attr]
+
+    def _index_lookup(self, attr, value):
+        '''
+        :returns: sorted array of the indices of packets with ``attr == value``, or ``None`` if the query cannot be answered from the index
+
+        '''
+        if attr not in self.indexed_attrs:
+            return None
+        index = self._index(attr)
+        if index is None:
+            return None
+        if attr == 'chip_key' and value is not None:
+            # tuples and strings are equal to, but do not hash like, keys
+            try:
+                value = Key(*value) if isinstance(value, tuple) else Key(value)
+            except (ValueError, TypeError):
+                return None
+        try:
+            return index.get(value, np.zeros(0, dtype=int))
+        except TypeError:
+            return None
+
+    def extract(self, *attrs, as_array=False, **selection):
         '''
         Extract the given attribute(s) from packets specified by selection
         and return a list.
 
-        Any attribute of a Packet is a valid attribute or selection
+        Any attribute of a Packet is a valid attribute or selection.
+        Selections on the ``indexed_attrs`` use the collection indexes
+        rather than checking every packet.
 
         Usage:
 
@@ -164,20 +285,44 @@ class PacketCollection(object):
         >>> threshold = collection.extract('register_value', register_address=32, packet_type=3, chip_id=5)[-1]
         >>> # Return multiple attributes
         >>> chip_keys, channel_ids = zip(*collection.extract('chip_key','channel_id'))
+        >>> # Return a numpy array
+        >>> dataword = collection.extract('dataword', chip_id=2, channel_id=5, as_array=True)
+
+        :param as_array: if ``True``, return a numpy array of values (or a list of arrays, one for each attribute, if multiple attributes are requested)
 
         .. note:: selecting on ``timestamp`` will also select
             TimestampPacket values.
         '''
+        selected = None
+        remaining = dict()
+        for key, value in selection.items():
+            indices = self._index_lookup(key, value)
+            if indices is None:
+                remaining[key] = value
+            elif selected is None:
+                selected = indices
+            else:
+                selected = np.intersect1d(selected, indices, assume_unique=True)
+        if selected is None:
+            packets = self.packets
+        else:
+            packets = [self.packets[i] for i in selected]
+
         values = []
-        for p in self.packets:
+        for p in packets:
             try:
-                if all(getattr(p,key) == value for key, value in selection.items()):
+                if all(getattr(p,key) == value for key, value in remaining.items()):
                     if len(attrs) > 1:
                         values.append([getattr(p,attr) for attr in attrs])
                     else:
                         values.append(getattr(p,attrs[0]))
             except AttributeError:
                 continue
+        if as_array:
+            if len(attrs) > 1:
+                return [np.array([value[i] for value in values])
+                    for i in range(len(attrs))]
+            return np.array(values)
         return values
 
     def origin(self):
@@ -206,8 +351,11 @@ class PacketCollection(object):
         Return packets with the specified chip key.
 
         '''
-        return [packet for packet in self.packets \
-            if packet.chip_key == chip_key]
+        indices = self._index_lookup('chip_key', chip_key)
+        if indices is None:
+            return [packet for packet in self.packets \
+                if packet.chip_key == chip_key]
+        return [self.packets[i] for i in indices]
 
     def by_chip_key(self):
         '''
@@ -215,11 +363,17 @@ class PacketCollection(object):
 
         '''
         chip_groups = {}
-        for packet in self.packets:
-            # append packet to list if list exists, else append to empty
-            # list as a default
-            key = packet.chip_key
-            chip_groups.setdefault(key, []).append(packet)
+        index = self._index('chip_key')
+        if index is not None and len(index) and \
+                sum(len(indices) for indices in index.values()) == len(self.packets):
+            for key, indices in index.items():
+                chip_groups[key] = [self.packets[i] for i in indices]
+        else:
+            for packet in self.packets:
+                # append packet to list if list exists, else append to empty
+                # list as a default
+                key = packet.chip_key
+                chip_groups.setdefault(key, []).append(packet)
         to_return = {}
         for chip_key in chip_groups:
             new_collection = PacketCollection(chip_groups[chip_key])
@@ -3,17 +3,6 @@ from bitarray import bitarray
 from .. import bitarrayhelper as bah
 from ..key import Key
 
-def _clears_cached_int(func):
-    '''
-    Modify a class function so that it deletes the cached `_int` attribute, if it
-    exists
-
-    '''
-    def new_func(self, *args, **kwargs):
-        self._int = None
-        return func(self, *args, **kwargs)
-    return new_func
-
 def _clears_cached_chip_key(func):
     '''
     Modify a class function so that it deletes the cached `_chip_key` attribute, if it
@@ -26,19 +15,81 @@ def _clears_cached_chip_key(func):
         return func(self,*args,**kwargs)
     return new_func
 
+class _PacketBits(bitarray):
+    '''
+    A little-endian ``bitarray`` copy of a packet that writes any in-place
+    modification straight back into the packet integer
+
+    '''
+    # slices and copies are plain detached bitarrays
+    _packet = None
+
+    def __new__(cls, packet):
+        self = super().__new__(cls, endian=packet.endian)
+        self.frombytes(packet.as_int().to_bytes(packet.num_bytes, 'little'))
+        self._packet = packet
+        return self
+
+    def _write_back(self):
+        packet = self._packet
+        if packet is None:
+            return
+        if hasattr(packet, '_chip_key'):
+            del packet._chip_key
+        packet._int = int.from_bytes(self.tobytes(), 'little')
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._write_back()
+
+    def setall(self, value):
+        super().setall(value)
+        self._write_back()
+
+    def invert(self, *args):
+        super().invert(*args)
+        self._write_back()
+
+    def __ior__(self, other):
+        super().__ior__(other)
+        self._write_back()
+        return self
+
+    def __iand__(self, other):
+        super().__iand__(other)
+        self._write_back()
+        return self
+
+    def __ixor__(self, other):
+        super().__ixor__(other)
+        self._write_back()
+        return self
+
+def _shift_mask(bit_slice):
+    '''
+    Convert a bit slice into a ``(shift, mask)`` pair for integer field access
+
+    '''
+    return bit_slice.start, (1 << (bit_slice.stop - bit_slice.start)) - 1
+
 class Packet_v2(object):
     '''
     Representation of a 64 bit LArPix v2 (or LightPix v1) UART data packet.
 
-    Packet_v2 objects are internally represented as bitarrays, but a variety of
-    helper properties allow one to access and set the data stored in the bitarrays in
-    a natural fashion. E.g.::
+    Packet_v2 objects are internally represented as a single 64-bit unsigned
+    integer, but a variety of helper properties allow one to access and set the
+    data stored in the packet in a natural fashion. E.g.::
 
         p = Packet_v2() # initialize a packet of zeros
         p.packet_type # fetch packet type bits and convert to uint
         p.packet_type = 2 # set the packet type to a config write packet
         print(p.bits) # the bits have been updated!
 
+    The ``bits`` attribute is a transient little-endian ``bitarray`` view of
+    the packet that is built on each access. Modifying the view in place
+    (e.g. ``p.bits[0] = 1``) modifies the packet, but a view that is held on
+    to does not follow later changes to the packet.
+
     Packet_v2 objects don't enforce any value validation, so set these fields with caution!
 
     In FIFO diagnostics mode, the bits are to be interpreted in a different way.
@@ -50,6 +101,11 @@ class Packet_v2(object):
     it will no longer use the default.
 
     '''
+    # commonly assigned attributes are slotted, anything else (e.g.
+    # ``valid_parity`` or a per-packet ``fifo_diagnostics_enabled``) falls
+    # back to an instance dict that is only created when first needed
+    __slots__ = ('_int', '_chip_key', '_io_group', '_io_channel',
+        'receipt_timestamp', 'direction', '__dict__')
 
     asic_version = 2
     size = 64
@@ -93,20 +149,21 @@ class Packet_v2(object):
 
     endian = 'little'
 
+    _parity_calc_mask = (1 << 63) - 1
+
     def __init__(self, bytestream=None):
-        self._int = None
         if bytestream is None:
-            self.bits = bitarray(self.size,endian=self.endian)
-            self.bits.setall(False)
+            self._int = 0
             return
         elif len(bytestream) == self.num_bytes:
-            self.bits = bitarray(endian=self.endian)
-            self.bits.frombytes(bytestream)
+            self._int = int.from_bytes(bytestream, 'little')
         else:
             raise ValueError('Invalid number of bytes: %s' %
                     len(bytestream))
 
     def __eq__(self, other):
+        if isinstance(other, Packet_v2):
+            return self.as_int() == other.as_int()
         return self.bits == other.bits
 
     def __ne__(self, other):
@@ -175,7 +232,16 @@ class Packet_v2(object):
         Byte 0 is still the first byte to send out and contains bits [0:7]
 
         '''
-        return self.bits.tobytes() #[::-1]
+        return self.as_int().to_bytes(self.num_bytes, 'little')
+
+    def to01(self):
+        '''
+        Return a string of ``'0'`` and ``'1'`` characters representing the
+        packet bits (bit 0 first), equivalent to ``packet.bits.to01()``
+        but without building the ``bits`` view
+
+        '''
+        return format(self.as_int(), '064b')[::-1]
 
     def export(self):
         '''
@@ -193,7 +259,7 @@ class Packet_v2(object):
         d['chip_key'] = str(self.chip_key) if self.chip_key else None
         d['io_group'] = self.io_group
         d['io_channel'] = self.io_channel
-        d['bits'] = self.bits.to01()
+        d['bits'] = self.to01()
         d['type_str'] = type_map[self.packet_type]
         d['packet_type'] = self.packet_type
         d['chip_id'] = self.chip_id
@@ -246,21 +312,36 @@ class Packet_v2(object):
                 setattr(self, key, value)
 
     def as_int(self):
-        if self._int is None:
-            self._int = bah.touint(self.bits, endian=self.endian)
+        '''
+        Return the packet as a 64-bit unsigned integer (bit 0 is the least
+        significant bit)
+
+        '''
         return self._int
 
     @property
-    @_clears_cached_int
-    @_clears_cached_chip_key
     def bits(self):
-        return self._bits
+        '''
+        A little-endian ``bitarray`` view of the packet, in-place
+        modifications of which are written back to the packet
+
+        '''
+        return _PacketBits(self)
 
     @bits.setter
-    @_clears_cached_int
-    @_clears_cached_chip_key    
+    @_clears_cached_chip_key
     def bits(self, value):
-        self._bits = value
+        self._int = bah.touint(value, endian=self.endian)
+
+    def _get_field(self, shift, mask):
+        # go through as_int, subclasses (e.g. PacketView) may decode lazily
+        return (self.as_int() >> shift) & mask
+
+    def _set_field(self, shift, mask, value):
+        if isinstance(value, bitarray):
+            value = bah.touint(value, endian=self.endian)
+        value = int(value)
+        self._int = (self._int & ~(mask << shift)) | ((value & mask) << shift)
 
     @property
     def chip_key(self):
@@ -273,7 +354,6 @@ class Packet_v2(object):
         return self._chip_key
 
     @chip_key.setter
-    @_clears_cached_int
     @_clears_cached_chip_key
     def chip_key(self, value):
         if value is None:
@@ -324,23 +404,21 @@ class Packet_v2(object):
     @property
     def timestamp(self):
         if self.fifo_diagnostics_enabled:
-            return bah.touint(self.bits[self.fifo_diagnostics_timestamp_bits], endian=self.endian)
-        return bah.touint(self.bits[self.timestamp_bits], endian=self.endian)
+            return self._get_field(*self._fifo_diagnostics_timestamp_shift_mask)
+        return self._get_field(*self._timestamp_shift_mask)
 
     @timestamp.setter
-    @_clears_cached_int
     def timestamp(self, value):
         if self.fifo_diagnostics_enabled:
-            self.bits[self.fifo_diagnostics_timestamp_bits] = bah.fromuint(value, self.fifo_diagnostics_timestamp_bits, endian=self.endian)
+            self._set_field(*self._fifo_diagnostics_timestamp_shift_mask, value)
         else:
-            self.bits[self.timestamp_bits] = bah.fromuint(value, self.timestamp_bits, endian=self.endian)
+            self._set_field(*self._timestamp_shift_mask, value)
 
     @property
     def local_fifo_half(self):
         return self.local_fifo%2
 
     @local_fifo_half.setter
-    @_clears_cached_int
     def local_fifo_half(self, value):
         self.local_fifo = self.local_fifo_full*2 + value
 
@@ -349,7 +427,6 @@ class Packet_v2(object):
         return self.local_fifo//2
 
     @local_fifo_full.setter
-    @_clears_cached_int
     def local_fifo_full(self, value):
         self.local_fifo = value*2 + self.local_fifo_half
 
@@ -358,7 +435,6 @@ class Packet_v2(object):
         return self.shared_fifo%2
 
     @shared_fifo_half.setter
-    @_clears_cached_int
     def shared_fifo_half(self, value):
         self.shared_fifo = self.shared_fifo_full*2 + value
 
@@ -367,14 +443,12 @@ class Packet_v2(object):
         return self.shared_fifo//2
 
     @shared_fifo_full.setter
-    @_clears_cached_int
     def shared_fifo_full(self, value):
         self.shared_fifo = value*2 + self.shared_fifo_half
 
     def compute_parity(self):
-        return 1 - (self.bits[self.parity_calc_bits].count(True) % 2)
+        return 1 - (bin(self.as_int() & self._parity_calc_mask).count('1') % 2)
 
-    @_clears_cached_int
     def assign_parity(self):
         self.parity = self.compute_parity()
 
@@ -384,59 +458,58 @@ class Packet_v2(object):
     @property
     def local_fifo_events(self):
         if self.fifo_diagnostics_enabled:
-            bit_slice = self.local_fifo_events_bits
-            return bah.touint(self.bits[bit_slice], endian=self.endian)
+            return self._get_field(*self._local_fifo_events_shift_mask)
         return None
 
     @local_fifo_events.setter
-    @_clears_cached_int
     def local_fifo_events(self, value):
         if self.fifo_diagnostics_enabled:
-            bit_slice = self.local_fifo_events_bits
-            self.bits[bit_slice] = bah.fromuint(value, bit_slice, endian=self.endian)
+            self._set_field(*self._local_fifo_events_shift_mask, value)
 
     @property
     def shared_fifo_events(self):
         if self.fifo_diagnostics_enabled:
-            bit_slice = self.shared_fifo_events_bits
-            return bah.touint(self.bits[bit_slice], endian=self.endian)
+            return self._get_field(*self._shared_fifo_events_shift_mask)
         return None
 
     @shared_fifo_events.setter
-    @_clears_cached_int
     def shared_fifo_events(self, value):
         if self.fifo_diagnostics_enabled:
-            bit_slice = self.shared_fifo_events_bits
-            self.bits[bit_slice] = bah.fromuint(value, bit_slice, endian=self.endian)
+            self._set_field(*self._shared_fifo_events_shift_mask, value)
 
     @property
     def chip_id(self):
-        bit_slice = self.chip_id_bits
-        return bah.touint(self.bits[bit_slice], endian=self.endian)
+        return self._get_field(*self._chip_id_shift_mask)
 
     @chip_id.setter
-    @_clears_cached_int
     @_clears_cached_chip_key
     def chip_id(self, value):
-        bit_slice = self.chip_id_bits
-        self.bits[bit_slice] = bah.fromuint(value, bit_slice, endian=self.endian)
+        self._set_field(*self._chip_id_shift_mask, value)
 
     @classmethod
     def _basic_getter(cls, name):
-        bit_slice = getattr(cls, name + '_bits')
-        mask = (~(((2**cls.size)-1 << (bit_slice.stop-bit_slice.start))) & (2**cls.size)-1)
+        shift, mask = getattr(cls, '_' + name + '_shift_mask')
         def basic_getter_func(self):
-            return (self.as_int() >> bit_slice.start) & mask
+            return (self.as_int() >> shift) & mask
         return basic_getter_func
 
     @classmethod
     def _basic_setter(cls, name):
-        bit_slice = getattr(cls, name + '_bits')
-        @_clears_cached_int
+        shift, mask = getattr(cls, '_' + name + '_shift_mask')
         def basic_setter_func(self, value):
-            self.bits[bit_slice] = bah.fromuint(value, bit_slice, endian=self.endian)
+            self._set_field(shift, mask, value)
         return basic_setter_func
 
+# precomputed (shift, mask) tables for each field
+for _name in ('packet_type', 'chip_id', 'downstream_marker', 'parity',
+        'channel_id', 'timestamp', 'first_packet', 'dataword', 'trigger_type',
+        'local_fifo', 'shared_fifo', 'fifo_diagnostics_timestamp',
+        'local_fifo_events', 'shared_fifo_events', 'register_address',
+        'register_data'):
+    setattr(Packet_v2, '_' + _name + '_shift_mask',
+        _shift_mask(getattr(Packet_v2, _name + '_bits')))
+del _name
+
 Packet_v2.packet_type = property(Packet_v2._basic_getter('packet_type'),Packet_v2._basic_setter('packet_type'))
 Packet_v2.downstream_marker = property(Packet_v2._basic_getter('downstream_marker'),Packet_v2._basic_setter('downstream_marker'))
 Packet_v2.parity = property(Packet_v2._basic_getter('parity'),Packet_v2._basic_setter('parity'))
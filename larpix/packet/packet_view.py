@@ -0,0 +1,103 @@
+from .packet_v2 import Packet_v2
+
+class PacketView(Packet_v2):
+    '''
+    A read-only ``Packet_v2`` that refers to 8 bytes at an offset within a
+    shared buffer (e.g. a received PACMAN message) rather than holding its
+    own copy of the packet data.
+
+    Packet fields are only decoded when they are first accessed, so creating
+    a ``PacketView`` is cheap. The view implements the same property API as
+    ``Packet_v2``, but the packet bits cannot be modified. Metadata that is
+    not contained in the packet bits (``io_group``, ``io_channel``,
+    ``receipt_timestamp``, ``direction``) can still be set. E.g.::
+
+        msg = b'...' # a received message
+        p = PacketView(msg, offset=16, io_group=1, io_channel=2)
+        p.chip_id # decoded from msg[16:24]
+        p.chip_id = 1 # raises AttributeError
+
+    Use ``to_packet()`` to create a modifiable ``Packet_v2`` copy.
+
+    .. note:: The buffer is referenced, not copied, so the contents of a
+        mutable buffer (e.g. a ``bytearray``) should not be changed while
+        views into it are in use.
+
+    :param buffer: a ``bytes``-like object containing the packet
+
+    :param offset: position of the first byte of the packet within ``buffer``
+
+    :param io_group: optional, io group of the packet
+
+    :param io_channel: optional, io channel of the packet
+
+    :param receipt_timestamp: optional, receipt timestamp of the packet
+
+    '''
+    __slots__ = ('_buffer', '_offset')
+
+    def __init__(self, buffer, offset=0, io_group=None, io_channel=None,
+            receipt_timestamp=None):
+        if len(buffer) < offset + self.num_bytes:
+            raise ValueError('Invalid offset {} for buffer of {} bytes'.format(
+                offset, len(buffer)))
+        self._buffer = buffer
+        self._offset = offset
+        self._int = None
+        if io_group is not None:
+            self._io_group = io_group
+        if io_channel is not None:
+            self._io_channel = io_channel
+        if receipt_timestamp is not None:
+            self.receipt_timestamp = receipt_timestamp
+
+    def __reduce__(self):
+        # don't pickle the full shared buffer
+        state = dict()
+        for attr in ('direction',) + tuple(getattr(self, '__dict__', dict()).keys()):
+            if hasattr(self, attr):
+                state[attr] = getattr(self, attr)
+        return (self.__class__, (self.bytes(), 0, self.io_group,
+            self.io_channel, getattr(self, 'receipt_timestamp', None)),
+            (None, state))
+
+    def __repr__(self):
+        return 'PacketView(' + str(self.bytes()) + ')'
+
+    def as_int(self):
+        if self._int is None:
+            self._int = int.from_bytes(
+                self._buffer[self._offset:self._offset + self.num_bytes],
+                'little')
+        return self._int
+
+    @property
+    def bits(self):
+        '''
+        A copy of the packet bits as a little-endian ``bitarray``. Modifying
+        the copy does not modify the packet.
+
+        '''
+        return Packet_v2(self.bytes()).bits
+
+    @bits.setter
+    def bits(self, value):
+        raise AttributeError('PacketView is read-only')
+
+    def _set_field(self, shift, mask, value):
+        raise AttributeError('PacketView is read-only')
+
+    def to_packet(self):
+        '''
+        Create a modifiable ``Packet_v2`` copy of this packet
+
+        '''
+        p = Packet_v2(self.bytes())
+        p.io_group = self.io_group
+        p.io_channel = self.io_channel
+        for attr in ('receipt_timestamp', 'direction'):
+            if hasattr(self, attr):
+                setattr(p, attr, getattr(self, attr))
+        if 'fifo_diagnostics_enabled' in getattr(self, '__dict__', dict()):
+            p.fifo_diagnostics_enabled = self.fifo_diagnostics_enabled
+        return p
@@ -0,0 +1,106 @@
+'''
+Vectorized parity calculations for batches of ``Packet_v2`` packets.
+
+LArPix v2 packets use odd parity: bit 63 is chosen such that the total
+number of set bits in the 64-bit word is odd. The functions in this module
+operate on a whole batch of packets in one pass, either as a numpy array of
+``uint64`` words (bit 0 is the least significant bit) or as a list of
+``Packet_v2`` objects::
+
+    words = np.array([...], dtype=np.uint64)
+    words = parity.assign_parity(words) # new array with parity bits set
+    parity.has_valid_parity(words) # array of True
+
+    packets = [Packet_v2(...), ...]
+    parity.assign_parity(packets) # sets the parity of each packet
+    parity.has_valid_parity(packets) # array of True
+
+'''
+import numpy as np
+
+from .packet_v2 import Packet_v2
+
+_parity_shift = np.uint64(Packet_v2._parity_shift_mask[0])
+_parity_calc_mask = np.uint64(Packet_v2._parity_calc_mask)
+
+def _is_packet_batch(words):
+    return (not isinstance(words, np.ndarray) and len(words) > 0
+        and isinstance(words[0], Packet_v2))
+
+def packets_to_words(packets):
+    '''
+    Convert a list of ``Packet_v2`` objects to a ``uint64`` array
+
+    :param packets: list of ``Packet_v2`` objects
+
+    :returns: numpy ``uint64`` array of packet words
+
+    '''
+    return np.fromiter((p.as_int() for p in packets), dtype=np.uint64,
+        count=len(packets))
+
+def words_to_packets(words):
+    '''
+    Convert an array of 64-bit words to a list of ``Packet_v2`` objects
+
+    :param words: array-like of ``uint64`` packet words
+
+    :returns: list of ``Packet_v2``
+
+    '''
+    data = np.asarray(words, dtype='<u8').tobytes()
+    nbytes = Packet_v2.num_bytes
+    return [Packet_v2(data[i:i+nbytes]) for i in range(0, len(data), nbytes)]
+
+def _as_words(words):
+    if _is_packet_batch(words):
+        return packets_to_words(words)
+    return np.asarray(words, dtype=np.uint64)
+
+def compute_parity(words):
+    '''
+    Calculate the odd parity bit of each packet over bits [0:63] using an
+    XOR-fold
+
+    :param words: array-like of ``uint64`` packet words or list of ``Packet_v2``
+
+    :returns: numpy ``uint8`` array of parity bits
+
+    '''
+    x = _as_words(words) & _parity_calc_mask
+    for shift in (32, 16, 8, 4, 2, 1):
+        x = x ^ (x >> np.uint64(shift))
+    return (np.uint64(1) - (x & np.uint64(1))).astype(np.uint8)
+
+def has_valid_parity(words):
+    '''
+    Check the parity bit of each packet
+
+    :param words: array-like of ``uint64`` packet words or list of ``Packet_v2``
+
+    :returns: numpy boolean array, ``True`` where the parity bit is valid
+
+    '''
+    words = _as_words(words)
+    return (words >> _parity_shift).astype(np.uint8) == compute_parity(words)
+
+def assign_parity(words):
+    '''
+    Set the parity bit of each packet.
+
+    If ``words`` is a list of ``Packet_v2`` objects, the parity of each
+    packet is modified in place and the list is returned. Otherwise a new
+    ``uint64`` array with the parity bits set is returned.
+
+    :param words: array-like of ``uint64`` packet words or list of ``Packet_v2``
+
+    :returns: ``words`` with valid parity bits
+
+    '''
+    if _is_packet_batch(words):
+        for packet, parity in zip(words, compute_parity(words).tolist()):
+            packet.parity = parity
+        return words
+    words = np.asarray(words, dtype=np.uint64)
+    parity = compute_parity(words).astype(np.uint64)
+    return (words & _parity_calc_mask) | (parity << _parity_shift)
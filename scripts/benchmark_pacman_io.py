@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+'''
+Measures the read throughput of ``Controller`` + ``PACMAN_IO`` against local
+``PACMANEmulator`` instances (one per io group, bound to 127.0.0.1,
+127.0.0.2, ...) and reports the received messages/s, packets/s, and the
+number of messages that were published but not received. Unless ports are
+given, the emulators bind to a random free port (the same port on each
+address).
+
+'''
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+import larpix
+from larpix.io import PACMAN_IO, PACMANEmulator
+
+def run_emulator(address, emulator_kwargs, msg_rate, duration, ports, start, done, counts):
+    emulator = PACMANEmulator(address=address, **emulator_kwargs)
+    try:
+        emulator.start()
+    except Exception:
+        ports.put(None)
+        raise
+    ports.put((emulator.cmdserver_port, emulator.dataserver_port))
+    start.wait()
+    emulator.start_data(msg_rate)
+    time.sleep(duration)
+    emulator.stop_data()
+    counts.put((address, emulator.n_data_msgs, emulator.n_data_packets))
+    done.wait()
+    emulator.stop()
+
+def count(packets, as_array):
+    if as_array:
+        return (int((packets['packet_type'] == 4).sum()),
+            int((packets['packet_type'] < 4).sum()))
+    n_msgs = sum(isinstance(p, larpix.TimestampPacket) for p in packets)
+    return n_msgs, sum(isinstance(p, larpix.Packet_v2) for p in packets)
+
+def main(io_groups=1, msg_rate=0, packets_per_msg=64, duration=5., as_array=False,
+        receiver_thread=False, raw_directory=None, cmdserver_port=None,
+        dataserver_port=None):
+    addresses = ['127.0.0.{}'.format(i+1) for i in range(io_groups)]
+
+    # start the emulators before any zmq objects exist in this process
+    start = multiprocessing.Event()
+    done = multiprocessing.Event()
+    counts = multiprocessing.Queue()
+    ports = multiprocessing.Queue()
+    emulators = list()
+    for address in addresses:
+        # the first emulator picks the ports (if not given), the others follow
+        emulator_kwargs = dict(cmdserver_port=cmdserver_port,
+            dataserver_port=dataserver_port, packets_per_msg=packets_per_msg)
+        emulators.append(multiprocessing.Process(target=run_emulator, args=(address,
+            emulator_kwargs, msg_rate, duration, ports, start, done, counts)))
+        emulators[-1].start()
+        bound = ports.get()
+        if bound is None:
+            done.set()
+            start.set()
+            raise RuntimeError('Could not bind emulator to {}'.format(address))
+        cmdserver_port, dataserver_port = bound
+
+    tmpdir = tempfile.mkdtemp()
+    config_filename = os.path.join(tmpdir, 'io.json')
+    with open(config_filename, 'w') as f:
+        json.dump(dict(_config_type='io', io_class='PACMAN_IO',
+            io_group=[[i+1, address] for i, address in enumerate(addresses)]), f)
+
+    class _PACMAN_IO(PACMAN_IO):
+        pass
+    _PACMAN_IO.cmdserver_port = str(cmdserver_port)
+    _PACMAN_IO.dataserver_port = str(dataserver_port)
+    _PACMAN_IO.enable_receiver_thread = receiver_thread
+    _PACMAN_IO.enable_raw_file_writing = raw_directory is not None
+
+    c = larpix.Controller()
+    c.io = _PACMAN_IO(config_filepath=config_filename, timeout=5000,
+        raw_directory=raw_directory if raw_directory is not None else tmpdir)
+    try:
+        if not all(c.io.ping().values()):
+            raise RuntimeError('Could not reach emulators')
+        c.start_listening()
+        time.sleep(0.5) # wait for the data sockets to connect
+        start.set()
+        t0 = time.time()
+        n_msgs, n_packets = 0, 0
+        while time.time() < t0 + duration + 0.5:
+            packets, bytestream = c.read(as_array=as_array)
+            msgs, pkts = count(packets, as_array)
+            n_msgs += msgs
+            n_packets += pkts
+            if not len(packets):
+                time.sleep(0.001)
+        c.stop_listening()
+        packets, bytestream = c.read(as_array=as_array)
+        msgs, pkts = count(packets, as_array)
+        n_msgs += msgs
+        n_packets += pkts
+        n_sent = sum(counts.get()[1] for _ in addresses)
+    finally:
+        done.set()
+        for emulator in emulators:
+            emulator.join()
+        c.io.cleanup()
+        c.io.join()
+
+    print('io groups: {}, packets per message: {}, requested rate: {} msgs/s per io group'.format(
+        io_groups, packets_per_msg, msg_rate if msg_rate else 'max'))
+    print('received {} msgs ({:.0f} msgs/s), {} packets ({:.0f} packets/s)'.format(
+        n_msgs, n_msgs / duration, n_packets, n_packets / duration))
+    print('dropped {} of {} msgs ({:.2%})'.format(n_sent - n_msgs, n_sent,
+        (n_sent - n_msgs) / max(n_sent, 1)))
+    if receiver_thread:
+        print('receiver thread buffer: {} msgs dropped, high water {} msgs'.format(
+            c.io.n_dropped_msgs, c.io.receive_buffer_high_water))
+    return dict(n_msgs=n_msgs, n_packets=n_packets, n_sent=n_sent)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--io_groups', type=int, default=1, help='''Number of emulated PACMANs (default=%(default)s)''')
+    parser.add_argument('--msg_rate', type=float, default=0, help='''Data messages per second per PACMAN, 0 to send as fast as possible (default=%(default)s)''')
+    parser.add_argument('--packets_per_msg', type=int, default=64, help='''Data packets per message (default=%(default)s)''')
+    parser.add_argument('--duration', type=float, default=5., help='''Duration of the data taking in seconds (default=%(default)s)''')
+    parser.add_argument('--as_array', action='store_true', help='''Read packets with Controller.read(as_array=True)''')
+    parser.add_argument('--receiver_thread', action='store_true', help='''Enable the PACMAN_IO receiver thread''')
+    parser.add_argument('--raw_directory', type=str, default=None, help='''Enable raw file writing into this directory''')
+    parser.add_argument('--cmdserver_port', type=str, default=None, help='''(default=random free port)''')
+    parser.add_argument('--dataserver_port', type=str, default=None, help='''(default=random free port)''')
+    args = parser.parse_args()
+    main(**vars(args))
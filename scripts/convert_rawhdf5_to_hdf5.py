@@ -8,7 +8,7 @@ import larpix.format.rawhdf5format
 import larpix.format.pacman_msg_format
 import larpix.format.hdf5format
 from larpix.format.rawhdf5format import from_rawfile, len_rawfile
-from larpix.format.pacman_msg_format import parse
+from larpix.format.pacman_msg_format import parse_many
 from larpix.format.hdf5format import to_file
 from larpix.format.hdf5format_direct import to_file_direct
 
@@ -30,16 +30,13 @@ def main(input_filename, output_filename, block_size, direct, max_blocks):
         if direct:
             to_file_direct(output_filename, rd['msgs'], rd['msg_headers']['io_groups'])
         else:
-            pkts = list()
-            for i_msg,data in enumerate(zip(rd['msg_headers']['io_groups'], rd['msgs'])):
-                io_group,msg = data
-                pkts.extend(parse(msg, io_group=io_group))
+            pkts = parse_many(rd['msgs'], io_group=rd['msg_headers']['io_groups'])
             to_file(output_filename, packet_list=pkts)
     print()
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
-    parser.add_argument('--input_filename', '-i', type=str, help='''Input hdf5 file, formatted with larpix.format.rawhdf5format using the larpix.io.PACMAN_IO class''')
+    parser.add_argument('--input_filename', '-i', type=str, help='''Input hdf5 file, formatted with larpix.format.rawhdf5format using the larpix.io.PACMAN_IO class, or the index (*_shards.json) of a data set sharded by io group''')
     parser.add_argument('--output_filename', '-o', type=str, help='''Output hdf5 file,
         to be formatted with larpix.format.hdf5format''')
     parser.add_argument('--block_size', default=10240, type=int, help='''Max number of messages to store in working memory (default=%(default)s)''')
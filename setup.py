@@ -49,7 +49,8 @@ setup(
         'scripts/gen_hydra_simple.py',
         'scripts/convert_rawhdf5_to_hdf5.py',
         'scripts/packet_hdf5_tool.py',
-        'scripts/raw_hdf5_tool.py'
+        'scripts/raw_hdf5_tool.py',
+        'scripts/benchmark_pacman_io.py'
     ],
     package_data={
         'larpix.configs': ['*/*.json'],
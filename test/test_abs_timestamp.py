@@ -0,0 +1,101 @@
+import random
+
+import numpy as np
+import pytest
+
+from larpix import Packet_v2, SyncPacket, TimestampPacket, TriggerPacket, PacketArray
+from larpix.format.hdf5format import to_file as hdf5_to_file
+import larpix.format.abs_timestamp as abs_timestamp
+
+@pytest.fixture
+def packets_and_expected():
+    random.seed(42)
+    packets = []
+    expected = []
+    for io_group in (1, 2):
+        packets.append(TimestampPacket(timestamp=1600000000))
+        packets[-1].io_group = io_group
+        expected.append(0)
+    offsets = {1: 0, 2: 0}
+    timestamps = {1: 0, 2: 0}
+    for i in range(2000):
+        io_group = random.choice((1, 2))
+        if random.random() < 0.01:
+            # sync closes the period
+            period = timestamps[io_group] + random.randint(0, 2**20)
+            packets.append(SyncPacket(sync_type=b'S', timestamp=period % 2**31, io_group=io_group))
+            offsets[io_group] += period
+            timestamps[io_group] = 0
+            expected.append(offsets[io_group])
+            continue
+        if random.random() < 0.01:
+            packets.append(SyncPacket(sync_type=b'H', timestamp=123, io_group=io_group))
+            expected.append(0)
+            continue
+        timestamps[io_group] += random.randint(0, 2**25)
+        p = Packet_v2()
+        p.io_group = io_group
+        p.io_channel = 1
+        p.timestamp = timestamps[io_group] % 2**31 # rolls over without a sync
+        packets.append(p)
+        expected.append(offsets[io_group] + timestamps[io_group])
+    return packets, expected
+
+def test_calc_abs_timestamp(packets_and_expected):
+    packets, expected = packets_and_expected
+    arr = PacketArray.from_packets(packets)
+    assert list(abs_timestamp.calc_abs_timestamp(arr)) == expected
+
+    state = dict()
+    chunks = [abs_timestamp.add_abs_timestamp(arr[i:i+97], state=state)
+        for i in range(0, len(arr), 97)]
+    assert all(isinstance(chunk, PacketArray) for chunk in chunks)
+    assert list(PacketArray.concatenate(chunks)['abs_timestamp']) == expected
+
+def _data_packet(timestamp, io_group=1):
+    p = Packet_v2()
+    p.io_group = io_group
+    p.io_channel = 1
+    p.timestamp = timestamp
+    return p
+
+def test_calc_abs_timestamp_forward_jump():
+    # a large jump early in a period is not a late packet from before a rollover
+    packets = [_data_packet(10), _data_packet(2**31 - 5), _data_packet(20)]
+    expected = [10, 2**31 - 5, 2**31 + 20]
+    arr = PacketArray.from_packets(packets)
+    assert list(abs_timestamp.calc_abs_timestamp(arr)) == expected
+    state = dict()
+    assert [abs_timestamp.calc_abs_timestamp(arr[i:i+1], state=state)[0]
+        for i in range(len(arr))] == expected
+
+def test_calc_abs_timestamp_trigger():
+    # trigger timestamps roll over after 32 bits, data timestamps after 31 bits
+    packets = [
+        TriggerPacket(trigger_type=b'\x01', timestamp=2**31 + 100, io_group=1),
+        _data_packet(2**31 - 10),
+        TriggerPacket(trigger_type=b'\x01', timestamp=2**32 - 10, io_group=1),
+        _data_packet(5),
+        TriggerPacket(trigger_type=b'\x01', timestamp=50, io_group=1),
+        SyncPacket(sync_type=b'S', timestamp=100, io_group=1),
+        TriggerPacket(trigger_type=b'\x01', timestamp=20, io_group=1),
+        _data_packet(30),
+        ]
+    offset = 2**31 + 100
+    expected = [2**31 + 100, 2**31 - 10, 2**32 - 10, 2**31 + 5, 2**32 + 50,
+        offset, offset + 20, offset + 30]
+    arr = PacketArray.from_packets(packets)
+    assert list(abs_timestamp.calc_abs_timestamp(arr)) == expected
+    state = dict()
+    chunks = [abs_timestamp.calc_abs_timestamp(arr[i:i+3], state=state)
+        for i in range(0, len(arr), 3)]
+    assert list(np.concatenate(chunks)) == expected
+
+def test_to_file(tmpdir, packets_and_expected):
+    packets, expected = packets_and_expected
+    filename = str(tmpdir.join('test.h5'))
+    hdf5_to_file(filename, packets)
+    abs_timestamp.to_file(filename, chunk_size=100)
+    import h5py
+    with h5py.File(filename, 'r') as f:
+        assert list(f['abs_timestamp'][:]) == expected
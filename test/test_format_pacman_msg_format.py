@@ -46,3 +46,82 @@ def test_packets():
 
     assert packets[1:] == new_packets[1:]
     assert isinstance(new_packets[0], TimestampPacket)
+
+def test_parse_duplicate_filter():
+    from larpix import DuplicateFilter
+    packets = []
+    for i in range(4):
+        p = Packet_v2()
+        p.packet_type = Packet_v2.CONFIG_READ_PACKET if i < 3 else Packet_v2.DATA_PACKET
+        p.io_channel = 1 + i % 2
+        p.register_address = 10
+        packets += [p, p]
+    msg = format(packets, msg_type='DATA')
+    for views in (False, True):
+        dedup = DuplicateFilter()
+        new_packets = parse(msg, io_group=1, views=views, duplicate_filter=dedup)
+        # only the first two config reads are unique
+        assert new_packets[1:] == packets[0:1] + packets[2:3] + packets[6:]
+        assert dedup.n_dropped == 4
+
+def test_parse_many():
+    import numpy as np
+    from larpix import PacketArray
+    msgs = []
+    for i in range(5):
+        packets = []
+        for j in range(i):
+            p = Packet_v2()
+            p.chip_id = i
+            p.channel_id = j
+            p.io_channel = j
+            p.receipt_timestamp = 100 * i + j
+            p.assign_parity()
+            packets.append(p)
+        packets.append(SyncPacket(sync_type=b'S', clk_source=1, timestamp=i))
+        packets.append(TriggerPacket(trigger_type=b'\x02', timestamp=i))
+        msgs.append(format(packets, msg_type='DATA'))
+    msgs.append(format_msg('REP', [('WRITE', 1, 2), ('PONG',)]))
+    io_groups = [1, 2, 1, 2, 1, 2]
+
+    expected = PacketArray.from_packets([
+        p for msg, io_group in zip(msgs, io_groups)
+        for p in parse(msg, io_group=io_group)
+        ]).data
+    assert np.array_equal(parse_many(msgs, io_group=io_groups), expected)
+
+    buffer = b'abc' + b''.join(msgs)
+    offsets = 3 + np.cumsum([len(msg) for msg in msgs]) - [len(msg) for msg in msgs]
+    assert np.array_equal(parse_many(buffer, offsets=offsets, io_group=io_groups), expected)
+    assert len(parse_many([])) == 0
+
+def test_format_words():
+    import numpy as np
+    packets = []
+    for i in range(10):
+        p = Packet_v2()
+        p.chip_id = i
+        p.io_channel = i % 4
+        p.receipt_timestamp = i
+        p.assign_parity()
+        packets.append(p)
+    words = np.array([p.as_int() for p in packets], dtype=np.uint64)
+    io_channels = [p.io_channel for p in packets]
+
+    msg = format_words(words, io_channel=io_channels)
+    assert msg[8:] == format_msg('REQ', [('TX', p.io_channel, p.bytes()) for p in packets])[8:]
+    assert parse(msg, io_group=1)[1:] == packets
+
+    msg = format_words(words, io_channel=io_channels, msg_type='DATA',
+        receipt_timestamp=range(10))
+    assert msg[8:] == format(packets, msg_type='DATA')[8:]
+    assert [p.receipt_timestamp for p in parse(msg)[1:]] == list(range(10))
+
+def test_parse_memoryview():
+    packets = [Packet_v2(), SyncPacket(sync_type=b'S', timestamp=1)]
+    packets[0].chip_id = 12
+    msg = format(packets, msg_type='DATA')
+    buffer = memoryview(bytearray(msg)) # writable, like a zmq frame
+    for views in (False, True):
+        assert parse(buffer, io_group=1, views=views)[1:] == parse(msg, io_group=1)[1:]
+    assert parse_msg(buffer)[1] == parse_msg(msg)[1]
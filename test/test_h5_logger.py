@@ -46,6 +46,22 @@ def test_record(tmpdir):
     logger.record([TimestampPacket(timestamp=123)])
     assert len(logger._buffer['packets']) == 2
 
+def test_record_packet_array(tmpdir):
+    from larpix import PacketArray
+    from larpix.format.hdf5format import from_file
+    logger = HDF5Logger(directory=str(tmpdir), enabled=True)
+    logger.record([TimestampPacket(timestamp=123)])
+    p = Packet_v2()
+    p.chip_id = 12
+    logger.record(PacketArray.from_packets([p]*2), direction=logger.READ)
+    assert len(logger._buffer['packets']) == 0
+    logger.flush()
+    packets = from_file(logger.filename)['packets']
+    assert len(packets) == 3
+    assert isinstance(packets[0], TimestampPacket)
+    assert [packet.chip_id for packet in packets[1:]] == [12, 12]
+    assert [packet.direction for packet in packets[1:]] == [logger.READ]*2
+
 @pytest.mark.filterwarnings("ignore:no IO object")
 def test_controller_write_capture(tmpdir, chip):
     controller = Controller()
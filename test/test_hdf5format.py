@@ -434,6 +434,18 @@ def test_from_file_v2_3_many_packets(tmpfile, data_packet_v2,
     assert new_packets[4] == sync_packet
     assert new_packets[5] == trigger_packet
 
+def test_to_file_v2_4_packet_array(tmpfile, data_packet_v2,
+                                   config_read_packet_v2, timestamp_packet,
+                                   sync_packet, trigger_packet):
+    from larpix import PacketArray
+    packets = [data_packet_v2, config_read_packet_v2, timestamp_packet,
+               sync_packet, trigger_packet]
+    to_file(tmpfile, packets)
+    to_file(tmpfile, PacketArray.from_packets(packets))
+    f = h5py.File(tmpfile, 'r')
+    assert len(f['packets']) == 10
+    assert (f['packets'][:5] == f['packets'][5:]).all()
+
 def test_to_file_v2_4_chips(tmpfile, chip):
     chips = [copy.deepcopy(chip) for i in range(10)]
     for i,chip in enumerate(chips):
@@ -12,6 +12,7 @@ from bitarray import bitarray
 import larpix.bitarrayhelper as bah
 import json
 import os
+import numpy as np
 
 @pytest.fixture
 def timestamp_packet():
@@ -1849,6 +1850,50 @@ def test_packetcollection_v2_extract():
     expected = [[10,36],[9,38]]
     assert pc.extract('chip_id','dataword', packet_type=Packet_v2.DATA_PACKET) == expected
 
+def test_packetcollection_v2_extract_indexed():
+    packets = [TimestampPacket(123)]
+    for i in range(12):
+        p = Packet_v2()
+        p.chip_key = Key(1, 1 + i % 2, 10 + i % 3)
+        p.channel_id = i % 4
+        p.packet_type = Packet_v2.DATA_PACKET
+        p.dataword = i
+        packets.append(p)
+    pc = PacketCollection(packets)
+    assert pc.extract('dataword', chip_id=10, channel_id=0) == [0]
+    assert pc.extract('dataword', chip_key=(1,1,10)) == [0, 6]
+    assert pc.extract('dataword', chip_key='1-1-10', dataword=6) == [6]
+    assert pc.extract('timestamp', packet_type=4) == [123]
+    assert pc.extract('dataword', chip_id=99) == []
+    assert pc.with_chip_key('1-2-11') == packets[2:13:6]
+    datawords = pc.extract('dataword', chip_id=11, as_array=True)
+    assert isinstance(datawords, np.ndarray)
+    assert list(datawords) == [1, 4, 7, 10]
+    chip_ids, datawords = pc.extract('chip_id', 'dataword', channel_id=1, as_array=True)
+    assert list(chip_ids) == [11, 12, 10]
+    assert list(datawords) == [1, 5, 9]
+
+    # indexes are rebuilt when packets are added
+    pc.packets.append(packets[2])
+    assert pc.extract('dataword', chip_id=11) == [1, 4, 7, 10, 1]
+    # or replaced through the collection
+    pc[-1] = packets[3]
+    assert pc.extract('dataword', chip_id=11) == [1, 4, 7, 10]
+    # but not when replaced directly in the packet list
+    pc.packets[-1] = packets[2]
+    assert pc.extract('dataword', chip_id=11) == [1, 4, 7, 10]
+    pc.reset_indexes()
+    assert pc.extract('dataword', chip_id=11) == [1, 4, 7, 10, 1]
+    pc[-1] = packets[2]
+    assert pc.extract('dataword', chip_id=11) == [1, 4, 7, 10, 1]
+    del pc[-1]
+    assert pc.extract('dataword', chip_id=11) == [1, 4, 7, 10]
+    # packet modifications require an explicit reset
+    packets[2].chip_id = 12
+    assert pc.extract('dataword', chip_id=11) == [1, 4, 7, 10]
+    pc.reset_indexes()
+    assert pc.extract('dataword', chip_id=11) == [4, 7, 10]
+
 def test_packetcollection_to_dict():
     packet = Packet()
     packet.chip_id = 246
@@ -2005,3 +2050,105 @@ def test_key():
     d = {}
     d[k] = 'test'
     assert d[k] == 'test'
+
+def test_key_interned():
+    import pickle
+    k = Key(1,2,3)
+    assert Key('1-2-3') is k
+    assert Key(b'1-2-3') is k
+    assert Key(k) is k
+    assert Key.from_packed(k.packed) is k
+    assert k.packed == (1 << 16) | (2 << 8) | 3
+    assert pickle.loads(pickle.dumps(k)) is k
+    assert k != Key(3,2,1)
+    assert hash(k) == hash('1-2-3')
+    d = { k: 'test' }
+    assert d['1-2-3'] == 'test'
+    assert d[Key(1,2,3)] == 'test'
+    with pytest.raises(AttributeError):
+        k.packed = 0
+
+def test_controller_save_output_binary(tmpdir, chip):
+    controller = Controller()
+    controller.add_chip(chip.chip_key)
+    packets = [TimestampPacket(123)]
+    for i in range(10):
+        p = Packet_v2()
+        p.chip_key = chip.chip_key
+        p.dataword = i
+        p.assign_parity()
+        packets.append(p)
+    controller.reads.append(PacketCollection(packets, b'\x00\x01', 'hi', 0))
+    controller.reads.append(PacketCollection(packets[2:5], None, 'hello', 1))
+    controller.reads.append(PacketCollection([], None, 'empty'))
+    name = str(tmpdir.join('test.npz'))
+    controller.save_output_binary(name, 'this is a test')
+    result = Controller.load_output_binary(name)
+    assert result['message'] == 'this is a test'
+    assert result['chips'] == [repr(chip)]
+    assert result['reads'] == controller.reads
+    assert [read.read_id for read in result['reads']] == [0, 1, None]
+    assert result['reads'][0].packets[1].chip_key == chip.chip_key
+    assert result['reads'][1].bytestream is None
+
+    controller.reads.append(PacketCollection([Packet_v1()]))
+    with pytest.raises(ValueError):
+        controller.save_output_binary(name, 'this is a test')
+
+def test_controller_read_duplicate_filter(chip):
+    from larpix import DuplicateFilter
+    controller = Controller()
+    controller.io = FakeIO()
+    controller.duplicate_filter = DuplicateFilter(window=2)
+    conf_data = chip.get_configuration_packets(Packet.CONFIG_READ_PACKET)[:3]
+    for p in conf_data:
+        p.io_group, p.io_channel = 1, 1
+    data_packet = Packet_v2()
+    doubled = [p for p in conf_data for _ in range(2)] + [data_packet]*2 + conf_data[:1]
+    controller.io.queue.append((doubled, b''))
+    controller.start_listening()
+    packets, _ = controller.read()
+    controller.stop_listening()
+    # first packet has dropped out of the window by the end
+    assert packets == conf_data + [data_packet]*2 + conf_data[:1]
+    assert controller.duplicate_filter.n_dropped == 3
+
+def test_controller_read_duplicate_filter_repeat(chip):
+    from larpix import DuplicateFilter
+    controller = Controller()
+    controller.io = FakeIO()
+    controller.duplicate_filter = DuplicateFilter()
+    conf_data = chip.get_configuration_packets(Packet.CONFIG_READ_PACKET)[:1]
+    for p in conf_data:
+        p.io_group, p.io_channel = 1, 1
+    controller.start_listening()
+    # a doubled reply split across two reads is still dropped
+    controller.send(conf_data)
+    controller.io.queue.append((conf_data, b''))
+    controller.io.queue.append((conf_data, b''))
+    assert controller.read()[0] == conf_data
+    assert controller.read()[0] == []
+    # but the reply to a repeated request is kept
+    controller.send(conf_data)
+    controller.io.queue.append((conf_data, b''))
+    assert controller.read()[0] == conf_data
+    controller.stop_listening()
+    assert controller.duplicate_filter.n_dropped == 1
+
+def test_controller_read_as_array(chip):
+    from larpix import DuplicateFilter, PacketArray
+    controller = Controller()
+    controller.io = FakeIO()
+    controller.duplicate_filter = DuplicateFilter(window=2)
+    conf_data = chip.get_configuration_packets(Packet.CONFIG_READ_PACKET)[:2]
+    for p in conf_data:
+        p.io_group, p.io_channel = 1, 1
+    data_packet = Packet_v2()
+    controller.io.queue.append(([p for p in conf_data for _ in range(2)] + [data_packet]*2, b'\x00'))
+    controller.start_listening()
+    packets, bytestream = controller.read(as_array=True)
+    controller.stop_listening()
+    assert isinstance(packets, PacketArray)
+    assert bytestream == b'\x00'
+    assert packets == PacketArray.from_packets(conf_data + [data_packet]*2)
+    assert controller.duplicate_filter.n_dropped == 2
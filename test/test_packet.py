@@ -160,3 +160,42 @@ def test_parity():
     assert p.parity == 1
     p.bits[-1] = 0
     assert p.parity == 0
+
+def test_bits_view():
+    p = Packet_v2(b'\x01' + b'\x00'*7)
+    assert p.as_int() == 1
+    assert p.to01() == p.bits.to01()
+
+    # modifying the bits view modifies the packet
+    p.bits[p.chip_id_bits] = bah.fromuint(5, p.chip_id_bits, endian=p.endian)
+    assert p.chip_id == 5
+    assert p.as_int() == 1 + (5 << 2)
+
+    # the view is rebuilt from the packet on each access
+    bits = p.bits
+    p.dataword = 3
+    assert bah.touint(p.bits[p.dataword_bits], endian=p.endian) == 3
+    assert bah.touint(bits[p.dataword_bits], endian=p.endian) == 0
+    assert Packet_v2(p.bytes()) == p
+
+    # reading the bits does not leave a cached copy behind
+    p.bits[-1] = 1
+    assert p.parity == 1
+    p.parity = 0
+    assert p.bits[-1] == 0
+    assert p.as_int() >> 63 == 0
+
+    # assigning the bits replaces the packet contents
+    p.bits = bitarray('1' + '0'*63)
+    assert p.as_int() == 1
+    assert p.chip_id == 0
+
+def test_slots():
+    p = Packet_v2()
+    assert not hasattr(p, 'direction')
+    assert not hasattr(p, 'receipt_timestamp')
+    p.receipt_timestamp = 1234
+    p.direction = 1
+    assert p.receipt_timestamp == 1234
+    assert 'receipt_timestamp' not in p.__dict__
+    assert p.export()['receipt_timestamp'] == 1234
@@ -0,0 +1,108 @@
+import pytest
+import numpy as np
+
+from larpix import Packet_v2, TimestampPacket, SyncPacket, TriggerPacket, Key
+from larpix.packet.packet_array import PacketArray, packet_dtype, words_to_array, array_to_words
+from larpix.format.hdf5format import dtypes
+
+@pytest.fixture
+def packets():
+    packets = [TimestampPacket(timestamp=1234)]
+    for i in range(20):
+        p = Packet_v2()
+        p.packet_type = i % 4
+        p.chip_id = 10 + i % 3
+        p.io_group = 1
+        p.io_channel = 1 + i % 2
+        p.channel_id = i
+        p.timestamp = 1000 + i
+        p.dataword = i * 2
+        p.receipt_timestamp = 5000 + i
+        p.assign_parity()
+        packets.append(p)
+    packets.append(SyncPacket(sync_type=b'S', clk_source=1, timestamp=123, io_group=1))
+    packets.append(TriggerPacket(trigger_type=b'\x02', timestamp=456, io_group=1))
+    return packets
+
+def test_dtype():
+    assert packet_dtype() == np.dtype(dtypes['2.4']['packets'])
+
+def test_words_round_trip():
+    words = np.random.randint(0, 2**63, size=100, dtype=np.uint64)
+    arr = words_to_array(words, io_group=1, io_channel=2)
+    assert np.all(array_to_words(arr) == words)
+    for word, row in zip(words, arr):
+        p = Packet_v2(int(word).to_bytes(8, 'little'))
+        assert row['chip_id'] == p.chip_id
+        assert row['timestamp'] == p.timestamp
+        assert row['register_data'] == p.register_data
+        assert row['valid_parity'] == p.has_valid_parity()
+
+def test_from_to_packets(packets):
+    arr = PacketArray.from_packets(packets)
+    assert len(arr) == len(packets)
+    assert arr.to_packets() == packets
+    assert arr[1] == packets[1]
+    assert arr[-1] == packets[-1]
+    assert list(arr['timestamp'][1:3]) == [1000, 1001]
+
+def test_fifo_diagnostics_round_trip():
+    p = Packet_v2()
+    p.fifo_diagnostics_enabled = True
+    p.timestamp = 100
+    p.local_fifo_events = 2
+    p.shared_fifo_events = 30
+    arr = PacketArray.from_packets([p])
+    new_p = arr[0]
+    assert new_p == p
+    assert new_p.fifo_diagnostics_enabled
+    assert new_p.shared_fifo_events == 30
+
+def test_slice_mask(packets):
+    arr = PacketArray.from_packets(packets, message='hello')
+    sub = arr[:10]
+    assert len(sub) == 10
+    assert sub.parent is arr
+    assert np.shares_memory(sub.data, arr.data)
+    sub['dataword'][1] = 255
+    assert arr['dataword'][1] == 255
+
+    data = arr[arr['packet_type'] == Packet_v2.DATA_PACKET]
+    assert len(data) == 5
+    assert np.all(data['packet_type'] == 0)
+
+def test_extract(packets):
+    arr = PacketArray.from_packets(packets)
+    assert list(arr.extract('dataword', packet_type=0, chip_id=10)) == [0, 24]
+    chip_ids, datawords = arr.extract('chip_id', 'dataword', packet_type=0)
+    assert len(chip_ids) == len(datawords) == 5
+    assert len(arr.extract('timestamp', chip_key='1-1-10')) == 4
+
+def test_by_chip_key(packets):
+    arr = PacketArray.from_packets(packets, message='hello')
+    groups = arr.by_chip_key()
+    assert set(groups.keys()) == set([Key(1,1,10), Key(1,2,11), Key(1,1,12),
+        Key(1,2,10), Key(1,1,11), Key(1,2,12), None])
+    assert len(groups[None]) == 3
+    for key, group in groups.items():
+        assert group.parent is arr
+        if key is None:
+            continue
+        assert np.all(group['chip_id'] == key.chip_id)
+        assert np.all(group['io_channel'] == key.io_channel)
+        assert [p for p in packets if getattr(p, 'chip_key', None) == key] == group.to_packets()
+    assert arr.with_chip_key('1-1-10') == groups[Key(1,1,10)]
+
+def test_by_chipid(packets):
+    arr = PacketArray.from_packets(packets)
+    groups = arr.by_chipid()
+    assert sorted(groups.keys()) == [10, 11, 12]
+    assert sum([len(group) for group in groups.values()]) == 20
+    assert np.all(groups[11]['chip_id'] == 11)
+    assert len(arr.with_chipid(11)) == len(groups[11])
+
+def test_concatenate(packets):
+    arr = PacketArray.from_packets(packets)
+    new_arr = PacketArray.concatenate([arr[:5], arr[5:]])
+    assert np.array_equal(new_arr.data, arr.data)
+    assert len(PacketArray.concatenate([])) == 0
@@ -0,0 +1,69 @@
+import random
+
+import pytest
+
+from larpix import Packet_v2, TimestampPacket, SyncPacket, PacketArray
+from larpix.packet.merge import merge_packets
+
+def unwrapped_key(packet):
+    receipt_timestamp = packet.receipt_timestamp
+    if receipt_timestamp < 2**31:
+        receipt_timestamp += 2**32
+    return (receipt_timestamp, packet.timestamp)
+
+@pytest.fixture
+def streams():
+    random.seed(1234)
+    streams = []
+    for io_group in range(1, 4):
+        packets = []
+        receipt_timestamp = 2**32 - 5000 # rolls over mid-stream
+        for i in range(1000):
+            receipt_timestamp += random.randint(0, 10)
+            p = Packet_v2()
+            p.io_group = io_group
+            p.io_channel = random.randint(1, 4)
+            p.timestamp = random.randint(0, 1000)
+            p.receipt_timestamp = receipt_timestamp % 2**32
+            packets.append(p)
+        # shuffle packets locally
+        for i in range(0, len(packets), 8):
+            segment = packets[i:i+8]
+            random.shuffle(segment)
+            packets[i:i+8] = segment
+        streams.append(packets)
+    return streams
+
+def batched(packets):
+    i = 0
+    while i < len(packets):
+        n = random.randint(1, 100)
+        yield packets[i:i+n]
+        i += n
+
+def test_merge_packets(streams):
+    merged = [p for batch in merge_packets([batched(s) for s in streams], lookahead=16)
+        for p in batch]
+    assert len(merged) == sum(len(s) for s in streams)
+    keys = [unwrapped_key(p) for p in merged]
+    assert keys == sorted(keys)
+
+def test_merge_packet_arrays(streams):
+    merged = [p for batch in merge_packets([batched(s) for s in streams], lookahead=16)
+        for p in batch]
+    arrays = [PacketArray.from_packets(s) for s in streams]
+    merged_arrays = list(merge_packets([batched(arr) for arr in arrays], lookahead=16))
+    assert all(isinstance(arr, PacketArray) for arr in merged_arrays)
+    assert PacketArray.concatenate(merged_arrays).to_packets() == merged
+
+def test_merge_untimed_packets():
+    packets = [TimestampPacket(100)]
+    for i in range(4):
+        p = Packet_v2()
+        p.receipt_timestamp = 10 * i
+        packets.append(p)
+        if i == 1:
+            packets.append(TimestampPacket(200))
+    sync = SyncPacket(sync_type=b'S', timestamp=15)
+    merged = [p for batch in merge_packets([[packets], [[sync]]], lookahead=0) for p in batch]
+    assert merged == packets[:3] + [packets[3], sync] + packets[4:]
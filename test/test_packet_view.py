@@ -0,0 +1,93 @@
+import pickle
+import pytest
+
+from larpix import Packet_v2, PacketView, PacketCollection, PacketArray, TimestampPacket, Key
+from larpix.format import pacman_msg_format
+
+@pytest.fixture
+def packets():
+    packets = []
+    for i in range(10):
+        p = Packet_v2()
+        p.packet_type = Packet_v2.DATA_PACKET if i % 2 else Packet_v2.CONFIG_READ_PACKET
+        p.chip_id = 10 + i % 3
+        p.io_group = 1
+        p.io_channel = 2
+        p.dataword = i
+        p.receipt_timestamp = 100 + i
+        p.assign_parity()
+        packets.append(p)
+    return packets
+
+def test_view():
+    p = Packet_v2()
+    p.chip_id = 12
+    p.timestamp = 12345
+    p.assign_parity()
+    buffer = b'\xff'*4 + p.bytes() + b'\xff'*4
+    view = PacketView(memoryview(buffer), offset=4, io_group=1, io_channel=2)
+    assert view == p
+    assert view.chip_id == 12
+    assert view.timestamp == 12345
+    assert view.has_valid_parity()
+    assert view.bits == p.bits
+    assert view.chip_key == Key(1,2,12)
+    with pytest.raises(AttributeError):
+        view.chip_id = 1
+    with pytest.raises(AttributeError):
+        view.bits = p.bits
+    view.direction = 1
+    assert view.export()['direction'] == 1
+    with pytest.raises(ValueError):
+        PacketView(buffer, offset=10)
+
+    copy = view.to_packet()
+    assert type(copy) == Packet_v2
+    assert copy == view
+    assert copy.chip_key == view.chip_key
+    copy.chip_id = 1
+    assert view.chip_id == 12
+
+    new_view = pickle.loads(pickle.dumps(view))
+    assert new_view == view
+    assert new_view.chip_key == view.chip_key
+    assert new_view.direction == 1
+
+def test_fresh_view(packets):
+    # fields must be decodable before anything else touches the view
+    msg = pacman_msg_format.format(packets, msg_type='DATA')
+    views = pacman_msg_format.parse(msg, io_group=1, views=True)
+    assert views[1].chip_id == packets[0].chip_id
+    views = pacman_msg_format.parse(msg, io_group=1, views=True)
+    assert views[1].packet_type == packets[0].packet_type
+    views = pacman_msg_format.parse(msg, io_group=1, views=True)
+    assert views[1].chip_key == packets[0].chip_key
+    assert vars(views[1]) == dict()
+
+    views = pacman_msg_format.parse(msg, io_group=1, views=True)
+    arr = PacketArray.from_packets(views[1:2])
+    assert arr['chip_id'][0] == packets[0].chip_id
+    assert arr['packet_type'][0] == packets[0].packet_type
+
+def test_parse_views(packets):
+    msg = pacman_msg_format.format(packets, msg_type='DATA')
+    parsed = pacman_msg_format.parse(msg, io_group=1)
+    views = pacman_msg_format.parse(msg, io_group=1, views=True)
+    assert isinstance(views[0], TimestampPacket)
+    assert all([isinstance(view, PacketView) for view in views[1:]])
+    assert views == parsed
+    assert [view.receipt_timestamp for view in views[1:]] == [p.receipt_timestamp for p in parsed[1:]]
+    assert [view.chip_key for view in views[1:]] == [p.chip_key for p in parsed[1:]]
+
+def test_packet_collection_views(packets):
+    msg = pacman_msg_format.format(packets, msg_type='DATA')
+    collection = PacketCollection(pacman_msg_format.parse(msg, io_group=1))
+    view_collection = PacketCollection(pacman_msg_format.parse(msg, io_group=1, views=True))
+    assert isinstance(view_collection[1], PacketView)
+    assert view_collection[1:] == collection[1:]
+    assert view_collection[1, 'bits'] == collection[1, 'bits']
+    assert view_collection.extract('dataword', packet_type=Packet_v2.DATA_PACKET) == [1, 3, 5, 7, 9]
+    assert view_collection.extract('dataword', chip_key='1-2-10') == [0, 3, 6, 9]
+    by_chip_key = view_collection.by_chip_key()
+    assert set(by_chip_key.keys()) == set(collection.by_chip_key().keys())
+    assert len(by_chip_key[Key(1,2,11)]) == 3
@@ -0,0 +1,571 @@
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+import zmq
+
+import larpix
+from larpix import Packet_v2
+from larpix.io.pacman_io import PACMAN_IO
+import larpix.format.pacman_msg_format as pacman_msg_format
+
+_addresses = ['127.0.0.1', '127.0.0.2']
+
+def _bind_to_random_port(sockets):
+    '''
+    Bind the socket of each of the ``_addresses`` to the same random port
+
+    :returns: port
+
+    '''
+    while True:
+        port = sockets[0].bind_to_random_port('tcp://' + _addresses[0])
+        bound = [(sockets[0], _addresses[0])]
+        try:
+            for sock, address in zip(sockets[1:], _addresses[1:]):
+                sock.bind('tcp://{}:{}'.format(address, port))
+                bound.append((sock, address))
+            return str(port)
+        except zmq.ZMQError:
+            # port is taken on one of the other addresses
+            for sock, address in bound:
+                sock.unbind('tcp://{}:{}'.format(address, port))
+
+def _reply(msg, registers=None):
+    header, words = pacman_msg_format.parse_msg(msg)
+    if registers is not None:
+        # emulate the PACMAN registers
+        for i, word in enumerate(words):
+            if word[0] == 'WRITE':
+                registers[word[1]] = word[2]
+            elif word[0] == 'READ':
+                words[i] = ('READ', word[1], registers.get(word[1], 0))
+    return pacman_msg_format.format_msg('REP', words)
+
+class _Server(threading.Thread):
+    '''
+    Replies to each request after ``delay`` seconds. If ``batch`` is given,
+    waits for ``batch`` requests and replies to them in reverse order.
+
+    '''
+    def __init__(self, context, delay=0, batch=None):
+        super(_Server, self).__init__(daemon=True)
+        self.socket = context.socket(zmq.REP if batch is None else zmq.ROUTER)
+        #: data socket, only used from the test thread
+        self.publisher = context.socket(zmq.PUB)
+        self.delay = delay
+        self.batch = batch
+        self.requests = []
+        self.registers = dict()
+        self.stop = threading.Event()
+
+    def run(self):
+        pending = []
+        while not self.stop.is_set():
+            if not self.socket.poll(10):
+                continue
+            if self.batch is None:
+                msg = self.socket.recv()
+                self.requests.append(msg)
+                time.sleep(self.delay)
+                self.socket.send(_reply(msg, self.registers))
+                continue
+            frames = self.socket.recv_multipart()
+            self.requests.append(frames[-1])
+            pending.append(frames)
+            if len(pending) == self.batch:
+                for frames in pending[::-1]:
+                    self.socket.send_multipart(frames[:-1] + [_reply(frames[-1], self.registers)])
+                pending = []
+        self.socket.close(linger=0)
+
+@pytest.fixture
+def pacman_io(tmpdir):
+    context = zmq.Context()
+    servers = []
+    ios = []
+
+    def make_pacman_io(io_cls=PACMAN_IO, **server_kwargs):
+        new_servers = [_Server(context, **server_kwargs) for _ in _addresses]
+        servers.extend(new_servers)
+        cmdserver_port = _bind_to_random_port([server.socket for server in new_servers])
+        dataserver_port = _bind_to_random_port([server.publisher for server in new_servers])
+        for server in new_servers:
+            server.start()
+
+        config_filename = str(tmpdir.join('io.json'))
+        with open(config_filename, 'w') as f:
+            json.dump(dict(_config_type='io', io_class='PACMAN_IO',
+                io_group=[[i + 1, address] for i, address in enumerate(_addresses)]), f)
+
+        class _PACMAN_IO(io_cls):
+            pass
+        _PACMAN_IO.cmdserver_port = cmdserver_port
+        _PACMAN_IO.dataserver_port = dataserver_port
+
+        ios.append(_PACMAN_IO(config_filepath=config_filename, timeout=5000,
+            raw_directory=str(tmpdir)))
+        return ios[-1], new_servers
+
+    yield make_pacman_io
+    for io in ios:
+        io.cleanup()
+        io.join()
+    for server in servers:
+        server.stop.set()
+        server.join()
+        server.publisher.close(linger=0)
+    context.term()
+
+def _packets(io_groups, n=1):
+    packets = []
+    for io_group in io_groups:
+        for i in range(n):
+            p = Packet_v2()
+            p.io_group = io_group
+            p.io_channel = 1
+            p.chip_id = i
+            packets.append(p)
+    return packets
+
+def test_send_concurrent(pacman_io):
+    io, servers = pacman_io(delay=0.2)
+    io.double_send_packets = True
+
+    start = time.time()
+    io.send(_packets((1, 2)))
+    # each server replies to two messages, 0.2s each
+    assert time.time() - start < 0.6
+    for address, server in zip(_addresses, servers):
+        assert len(server.requests) == 2
+        assert len(io._sender_replies[address]) == 2
+
+def test_send_pipelined(pacman_io):
+    class _ShortMessageIO(PACMAN_IO):
+        max_msg_length = 1
+    # servers only reply once 4 requests are outstanding
+    io, servers = pacman_io(io_cls=_ShortMessageIO, batch=4)
+    io.enable_pipelined_requests = True
+    io.pipeline_window = 4
+
+    packets = _packets((1, 2), n=4)
+    io.send(packets)
+    for i, address in enumerate(_addresses):
+        replies = io._sender_replies[address]
+        assert len(replies) == 4
+        # replies are returned in the order of the requests
+        for packet, reply in zip(packets[4*i:4*i+4], replies):
+            assert pacman_msg_format.parse(reply)[1] == packet
+        assert 1 <= io._pipeline_state[address]['window'] <= io.max_pipeline_window
+
+def test_receiver_thread(pacman_io):
+    io, servers = pacman_io()
+    io.enable_receiver_thread = True
+    io.receive_buffer_length = 5
+    publisher = servers[0].publisher
+    io.start_listening()
+    time.sleep(0.5)
+    for i in range(6):
+        p = Packet_v2()
+        p.chip_id = i
+        publisher.send(pacman_msg_format.format([p], msg_type='DATA'))
+    # not read until the receiver thread is stopped
+    time.sleep(0.5)
+    io.stop_listening()
+    packets, bytestream = io.empty_queue()
+    # the first message was dropped
+    assert io.n_dropped_msgs == 1
+    assert io.receive_buffer_high_water == 5
+    assert len(packets) == 10
+    assert sorted(p.chip_id for p in packets if isinstance(p, Packet_v2)) == [1, 2, 3, 4, 5]
+
+def test_empty_queue_raw_file(pacman_io, tmpdir):
+    from larpix.format.rawhdf5format import from_rawfile
+    io, servers = pacman_io()
+    io.enable_raw_file_writing = True
+    io.disable_bytestream = True
+    publisher = servers[1].publisher
+    msgs = []
+    io.start_listening()
+    time.sleep(0.5)
+    for i in range(3):
+        p = Packet_v2()
+        p.chip_id = i
+        msgs.append(pacman_msg_format.format([p]*(i+1), msg_type='DATA'))
+        publisher.send(msgs[-1])
+    time.sleep(0.5)
+    packets, bytestream = io.empty_queue()
+    io.stop_listening()
+    assert bytestream == b''
+    assert [p.chip_id for p in packets if isinstance(p, Packet_v2)] == [0, 1, 1, 2, 2, 2]
+    io.join()
+    rd = from_rawfile(io.raw_filename)
+    assert rd['msgs'] == msgs
+    assert rd['msg_headers']['io_groups'] == [2, 2, 2]
+
+def test_empty_queue_array(pacman_io):
+    from larpix import PacketArray
+    io, servers = pacman_io()
+    publisher = servers[0].publisher
+    msgs = []
+    io.start_listening()
+    time.sleep(0.5)
+    for i in range(3):
+        p = Packet_v2()
+        p.chip_id = i
+        msgs.append(pacman_msg_format.format([p]*(i+1), msg_type='DATA'))
+        publisher.send(msgs[-1])
+    time.sleep(0.5)
+    packets, bytestream = io.empty_queue_array()
+    io.stop_listening()
+    assert isinstance(packets, PacketArray)
+    assert bytestream == b''.join(msgs)
+    expected = [p for msg in msgs for p in pacman_msg_format.parse(msg, io_group=1)]
+    assert packets == PacketArray.from_packets(expected)
+    assert packets.extract('chip_id', packet_type=0).tolist() == [0, 1, 1, 2, 2, 2]
+
+def test_raw_file_worker(pacman_io):
+    from larpix.format.rawhdf5format import from_rawfile
+    io, servers = pacman_io()
+    io.enable_raw_file_writing = True
+    io.raw_file_flush_interval = 0.1
+    publisher = servers[0].publisher
+    msgs = []
+    io.start_listening()
+    time.sleep(0.5)
+    for i in range(2):
+        msgs.append(pacman_msg_format.format([Packet_v2()]*(i+1), msg_type='DATA'))
+        publisher.send(msgs[-1])
+        time.sleep(0.2)
+        io.empty_queue()
+    # worker stays alive and flushes the open file periodically
+    time.sleep(1.5)
+    assert io._raw_file_worker.is_alive()
+    assert from_rawfile(io.raw_filename)['msgs'] == msgs
+    io.stop_listening()
+    io.join()
+    assert not io._raw_file_worker.is_alive()
+    rd = from_rawfile(io.raw_filename)
+    assert rd['msgs'] == msgs
+    assert rd['msg_headers']['io_groups'] == [1, 1]
+
+def test_raw_file_rotation(pacman_io):
+    from larpix.format.rawhdf5format import from_rawfile, load_manifest
+    io, servers = pacman_io()
+    io.enable_raw_file_writing = True
+    io.enable_raw_file_rotation = True
+    io.raw_file_max_msgs = 2
+    publisher = servers[0].publisher
+    msgs = []
+    io.start_listening()
+    time.sleep(0.5)
+    for i in range(4):
+        msgs.append(pacman_msg_format.format([Packet_v2()]*(i+1), msg_type='DATA'))
+        publisher.send(msgs[-1])
+        time.sleep(0.2)
+        io.empty_queue()
+        if i == 0:
+            io.rotate_raw_file()
+    io.stop_listening()
+    io.join()
+    manifest = load_manifest(io.raw_manifest_filename)
+    assert [entry['n_msgs'] for entry in manifest] == [1, 2, 1]
+    assert [entry['first_msg'] for entry in manifest] == [0, 1, 3]
+    assert [msg for entry in manifest for msg in from_rawfile(entry['filename'])['msgs']] == msgs
+
+@pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(),
+    reason='requires fork')
+def test_raw_file_worker_unguarded_main(tmpdir):
+    # the worker must not re-run a script without a __main__ guard
+    from larpix.format.rawhdf5format import from_rawfile
+    config_filename = str(tmpdir.join('io.json'))
+    with open(config_filename, 'w') as f:
+        json.dump(dict(_config_type='io', io_class='PACMAN_IO',
+            io_group=[[1, _addresses[0]]]), f)
+    script = tmpdir.join('daq.py')
+    script.write('\n'.join([
+        'from larpix.io.pacman_io import PACMAN_IO',
+        'print("main")',
+        'io = PACMAN_IO(config_filepath={!r}, raw_directory={!r}, raw_filename="raw.h5")'.format(
+            config_filename, str(tmpdir)),
+        'io._raw_file_queue.put((b"abc", [3], dict(io_groups=[1])))',
+        'io._launch_raw_file_worker()',
+        'io.join()',
+        'io.cleanup()',
+        ]))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        [os.path.dirname(os.path.dirname(larpix.__file__))]
+        + os.environ.get('PYTHONPATH', '').split(os.pathsep)))
+    output = subprocess.check_output([sys.executable, str(script)], env=env, timeout=60)
+    assert output.decode().split() == ['main']
+    assert from_rawfile(str(tmpdir.join('raw.h5')))['msgs'] == [b'abc']
+
+@pytest.mark.parametrize('rotate', [False, True])
+def test_raw_file_sharding(pacman_io, rotate):
+    from larpix.format.rawhdf5format import from_rawfile, load_shard_index, len_rawfile
+    io, servers = pacman_io()
+    io.enable_raw_file_writing = True
+    io.enable_raw_file_sharding = True
+    io.enable_raw_file_rotation = rotate
+    io.raw_file_max_msgs = 2
+    publishers = [server.publisher for server in servers]
+    msgs = []
+    io.start_listening()
+    time.sleep(0.5)
+    for i in range(5):
+        msgs.append(pacman_msg_format.format([Packet_v2()]*(i+1), msg_type='DATA'))
+        publishers[i % 2].send(msgs[-1])
+        time.sleep(0.2)
+        io.empty_queue()
+    io.stop_listening()
+    assert set(io._raw_file_shards) == {1, 2}
+    io.join()
+    assert not io._raw_file_shards
+    shards = load_shard_index(io.raw_shard_index_filename)
+    assert [shard['io_group'] for shard in shards] == [1, 2]
+    if not rotate:
+        assert from_rawfile(shards[0]['filename'])['msgs'] == msgs[0::2]
+        assert from_rawfile(shards[1]['filename'])['msgs'] == msgs[1::2]
+    assert len_rawfile(io.raw_shard_index_filename) == 5
+    rd = from_rawfile(io.raw_shard_index_filename)
+    assert rd['msgs'] == msgs
+    assert rd['msg_headers']['io_groups'] == [1, 2, 1, 2, 1]
+    assert rd['msg_headers']['stream_index'] == list(range(5))
+
+def test_raw_file_sharding_append(pacman_io, tmpdir):
+    from larpix.format.rawhdf5format import from_rawfile
+    msgs = []
+    for session in range(2):
+        # a second session continues the shard set of the first
+        io, servers = pacman_io()
+        io.enable_raw_file_writing = True
+        io.enable_raw_file_sharding = True
+        io.raw_filename = str(tmpdir.join('sharded.h5'))
+        io.start_listening()
+        time.sleep(0.5)
+        for i in range(3):
+            msgs.append(pacman_msg_format.format([Packet_v2()]*(session+1), msg_type='DATA'))
+            servers[i % 2].publisher.send(msgs[-1])
+            time.sleep(0.2)
+            io.empty_queue()
+        io.stop_listening()
+        io.join()
+    rd = from_rawfile(io.raw_shard_index_filename)
+    assert rd['msg_headers']['stream_index'] == list(range(6))
+    assert rd['msgs'] == msgs
+
+@pytest.mark.parametrize('pipelined', [False, True])
+def test_regs(pacman_io, pipelined):
+    io, servers = pacman_io()
+    io.enable_pipelined_requests = pipelined
+    io.set_regs([(0x10, 1), (0x20, 2)])
+    io.set_regs({2: [(0x20, 3)]})
+    assert io.get_regs([0x10, 0x20]) == {1: [1, 2], 2: [1, 3]}
+    assert io.get_regs([0x20, 0x10], io_group=2) == [3, 1]
+    assert io.get_regs({1: [0x20], 2: [0x10]}) == {1: [2], 2: [1]}
+    assert io.get_reg(0x20) == {1: 2, 2: 3}
+    # one message per io group
+    assert [len(server.requests) for server in servers] == [4, 6]
+
+    assert io.enable_tile([0, 2], io_group=1) == 0b101
+    assert io.disable_tile(0) == {1: 0b100, 2: 0}
+    assert servers[0].registers[io._base_ctrl_reg] == 0b100
+    assert io.set_uart_clock_ratio(1, 4, io_group=2) == 4
+    servers[0].registers[io._clk_ctrl_reg] = 0b10
+    assert io.reset_larpix(length=128) == {1: 0b10, 2: 0}
+    assert servers[0].registers[io._sw_reset_cycles_reg] == 128
+    assert io.reset_tiles([1, 2], io_group=1) == True
+    assert servers[0].registers[0x101c] == 0
+    # the reset bit is set, cleared, and the tile mask restored in separate messages
+    assert [len(server.requests) for server in servers] == [15, 12]
+
+    servers[1].registers[io._vddd_adc_reg] = 1800 // 4 << 19
+    mv, ma = io.get_vddd(io_group=2)
+    assert mv == 1800
+
+def test_telemetry(pacman_io, tmpdir):
+    import h5py
+    io, servers = pacman_io()
+    filename = str(tmpdir.join('telemetry.h5'))
+    for i, server in enumerate(servers):
+        server.registers[io._vddd_adc_reg] = (1800 + 4*i) // 4 << 19
+        server.registers[io._vplus_adc_reg] = 5000 // 4 << 19
+    io.start_telemetry(interval=0.05, buffer_length=3, filename=filename)
+    time.sleep(0.5)
+    # the file is held open by the sampler
+    assert io._telemetry_sampler._file
+    io.stop_telemetry()
+    assert not io._telemetry_sampler._file
+    n_requests = [len(server.requests) for server in servers]
+    # samples are not sent over the io command sockets
+    assert len(io._sender_replies) == 0
+    assert min(n_requests) >= 4
+    telemetry = io.get_telemetry()
+    assert telemetry[1]['vddd'] == (1800, 0)
+    assert telemetry[2]['vddd'] == (1804, 0)
+    assert io.get_telemetry(io_group=2)['vplus'] == (5000, 0)
+    assert telemetry[1]['n_errors'] == 0
+    history = io.get_telemetry_history('vddd', 2)
+    assert history.shape == (3, 3)
+    assert np.all(np.diff(history[:, 0]) > 0)
+    assert np.all(history[:, 1] == 1804)
+    with h5py.File(filename, 'r') as f:
+        dset = f['pacman_telemetry']
+        assert len(dset) == sum(n_requests)
+        assert set(dset['io_group']) == {1, 2}
+        assert set(dset['vplus_mv']) == {5000}
+
+@pytest.fixture
+def emulated_pacman_io(tmpdir):
+    from larpix.io.pacman_emulator import PACMANEmulator
+    ios = []
+    emulators = []
+
+    def make_pacman_io(**emulator_kwargs):
+        while True:
+            # the first emulator picks random ports, the others use the same
+            new_emulators = [PACMANEmulator(address=_addresses[0],
+                cmdserver_port=None, dataserver_port=None, **emulator_kwargs)]
+            new_emulators[0].start()
+            try:
+                for address in _addresses[1:]:
+                    new_emulators.append(PACMANEmulator(address=address,
+                        cmdserver_port=new_emulators[0].cmdserver_port,
+                        dataserver_port=new_emulators[0].dataserver_port,
+                        **emulator_kwargs))
+                    new_emulators[-1].start()
+                break
+            except zmq.ZMQError:
+                for emulator in new_emulators:
+                    emulator.stop()
+        emulators.extend(new_emulators)
+
+        config_filename = str(tmpdir.join('io.json'))
+        with open(config_filename, 'w') as f:
+            json.dump(dict(_config_type='io', io_class='PACMAN_IO',
+                io_group=[[i + 1, address] for i, address in enumerate(_addresses)]), f)
+
+        class _PACMAN_IO(PACMAN_IO):
+            pass
+        _PACMAN_IO.cmdserver_port = new_emulators[0].cmdserver_port
+        _PACMAN_IO.dataserver_port = new_emulators[0].dataserver_port
+
+        ios.append(_PACMAN_IO(config_filepath=config_filename, timeout=5000,
+            raw_directory=str(tmpdir)))
+        return ios[-1], new_emulators
+
+    yield make_pacman_io
+    for emulator in emulators:
+        emulator.stop()
+    for io in ios:
+        io.cleanup()
+        io.join()
+
+def test_emulator(emulated_pacman_io):
+    from larpix import PacketArray
+    io, emulators = emulated_pacman_io(packets_per_msg=8)
+    assert io.ping() == {1: True, 2: True}
+
+    io.set_regs([(0x10, 5)], io_group=2)
+    assert io.get_regs([0x10]) == {1: [0], 2: [5]}
+
+    # config writes are stored by the emulated chips and read back
+    io.start_listening()
+    time.sleep(0.5)
+    write = Packet_v2()
+    write.io_group = 1
+    write.io_channel = 3
+    write.chip_id = 12
+    write.packet_type = Packet_v2.CONFIG_WRITE_PACKET
+    write.register_address = 7
+    write.register_data = 42
+    read = Packet_v2()
+    read.io_group = 1
+    read.io_channel = 3
+    read.chip_id = 12
+    read.packet_type = Packet_v2.CONFIG_READ_PACKET
+    read.register_address = 7
+    io.send([write, read])
+    time.sleep(0.2)
+    packets, bytestream = io.empty_queue_array()
+    assert packets.extract('register_data', packet_type=3).tolist() == [42]
+    assert packets.extract('io_channel', packet_type=3).tolist() == [3]
+
+    emulators[0].start_data(msg_rate=0, max_msgs=10)
+    time.sleep(0.5)
+    packets, bytestream = io.empty_queue_array()
+    io.stop_listening()
+    assert emulators[0].n_data_msgs == 10
+    assert emulators[0].n_data_packets == 80
+    assert isinstance(packets, PacketArray)
+    assert len(packets.extract('packet_type', packet_type=0, io_group=1)) == 80
+    assert emulators[0].n_requests >= 3
+
+def test_reset_order(emulated_pacman_io):
+    io, emulators = emulated_pacman_io()
+    io.larpix_mclk_frequency = 1e4
+    length = 1000 # 0.1s
+    emulators[0].registers[0x101c] = 7
+    assert io.reset_tiles([1, 2], length=length, io_group=1) == True
+    writes = [(t, val) for t, reg, val in emulators[0].register_writes
+        if reg in (io._clk_ctrl_reg, 0x101c)]
+    (t_mask, mask), (t_set, set_val), (t_clear, clear_val), (t_restore, restore) = writes
+    assert mask == 7 + (sum(1 << tile for tile in range(3, 9)) << 15)
+    assert set_val == 4 and clear_val == 0 and restore == 7
+    # the mask is restored only after the reset pulse has finished
+    assert t_clear - t_set >= length / io.larpix_mclk_frequency
+    assert t_restore >= t_clear
+
+    assert io.reset_larpix(length=length, io_group=2) == 0
+    writes = [(t, val) for t, reg, val in emulators[1].register_writes
+        if reg == io._clk_ctrl_reg]
+    (t_set, set_val), (t_clear, clear_val) = writes
+    assert (set_val, clear_val) == (4, 0)
+    assert t_clear - t_set >= length / io.larpix_mclk_frequency
+
+@pytest.mark.parametrize('tx_loss', [0, 0.3])
+def test_reliable_write_configuration(emulated_pacman_io, tx_loss):
+    from larpix import Controller, Key, DuplicateFilter
+    io, emulators = emulated_pacman_io(tx_loss=tx_loss)
+    c = Controller()
+    c.io = io
+    # readbacks of retried registers are not dropped as duplicates
+    io.drop_duplicate_packets = True
+    c.duplicate_filter = DuplicateFilter()
+    keys = [Key(1, 1, 11), Key(1, 2, 12), Key(2, 1, 13)]
+    for key in keys:
+        c.add_chip(key, version=2)
+        c[key].config.pixel_trim_dac = [10] * 64
+    registers = list(c[keys[0]].config.register_map['pixel_trim_dac'])
+    chip_reg_pairs = [(key, registers) for key in keys]
+
+    ok, diff = c.reliable_write_configuration(chip_reg_pairs, timeout=0.05,
+        connection_delay=0.5, max_rounds=30 if tx_loss else 1)
+    assert ok
+    assert diff == dict()
+    n_registers = len(keys) * len(registers)
+    n_tx = sum(emulator.n_tx_packets for emulator in emulators)
+    if not tx_loss:
+        # each register is written and read back once
+        assert n_tx == 2 * n_registers
+    else:
+        assert n_tx > 2 * n_registers
+    for key in keys:
+        emulator = emulators[key.io_group - 1]
+        for register in registers:
+            assert emulator.chip_registers[(key.io_channel, key.chip_id, register)] == 10
+
+    # registers that are never confirmed are reported
+    for emulator in emulators:
+        emulator.tx_loss = 1
+    c[keys[0]].config.pixel_trim_dac = [5] * 64
+    ok, diff = c.reliable_write_configuration([(keys[0], registers)],
+        timeout=0.05, connection_delay=0.5, max_rounds=2)
+    assert not ok
+    assert diff == {keys[0]: dict((register, (5, None)) for register in registers)}
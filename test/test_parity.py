@@ -0,0 +1,44 @@
+import numpy as np
+
+from larpix import Packet_v2, Chip
+from larpix.packet import parity
+
+def test_compute_parity():
+    words = np.random.randint(0, 2**63, size=100, dtype=np.uint64)
+    words[0] = 0
+    words[1] = (1 << 63) - 1
+    packets = [Packet_v2(int(word).to_bytes(8, 'little')) for word in words]
+    expected = [p.compute_parity() for p in packets]
+    assert list(parity.compute_parity(words)) == expected
+    assert list(parity.compute_parity(packets)) == expected
+    assert list(parity.has_valid_parity(words)) == \
+        [p.has_valid_parity() for p in packets]
+
+def test_assign_parity():
+    words = np.random.randint(0, 2**64-1, size=100, dtype=np.uint64)
+    new_words = parity.assign_parity(words)
+    assert np.all(parity.has_valid_parity(new_words))
+    assert np.all((new_words ^ words) & np.uint64((1 << 63) - 1) == 0)
+
+    packets = parity.words_to_packets(words)
+    assert np.all(parity.packets_to_words(packets) == words)
+    assert parity.assign_parity(packets) is packets
+    assert all(p.has_valid_parity() for p in packets)
+    assert np.all(parity.packets_to_words(packets) == new_words)
+
+def test_configuration_packets():
+    chip = Chip('1-2-3')
+    chip.config.threshold_global = 100
+    for packet_type in (Packet_v2.CONFIG_WRITE_PACKET, Packet_v2.CONFIG_READ_PACKET):
+        packets = chip.get_configuration_packets(packet_type)
+        assert len(packets) == chip.config.num_registers
+        for i, (addr, data) in enumerate(zip(*chip.config.some_data(range(chip.config.num_registers)))):
+            p = Packet_v2()
+            p.packet_type = packet_type
+            p.chip_key = chip.chip_key
+            p.register_address = addr
+            if packet_type == Packet_v2.CONFIG_WRITE_PACKET:
+                p.register_data = data
+            p.assign_parity()
+            assert packets[i] == p
+            assert packets[i].chip_key == chip.chip_key
@@ -4,7 +4,9 @@ import pytest
 import h5py
 import numpy as np
 
-from larpix.format.rawhdf5format import (to_rawfile, from_rawfile, len_rawfile)
+from larpix.format.rawhdf5format import (to_rawfile, from_rawfile, len_rawfile,
+    RawFileWriter, RotatingRawFileWriter, load_manifest, shard_filename,
+    write_shard_index, load_shard_index)
 
 @pytest.fixture
 def tmpfile(tmpdir):
@@ -112,3 +114,133 @@ def test_file_append_v0_0(tmpfile, testdata):
     assert set(rd['msg_headers']['io_groups']) == set(io_groups)
 
 
+
+def test_raw_file_writer_v0_0(tmpfile, testdata):
+    test_io_groups, test_msgs = testdata
+    to_rawfile(tmpfile, msgs=test_msgs[:1], msg_headers={'io_groups': test_io_groups[:1]})
+    with RawFileWriter(tmpfile, flush_interval=1e9, flush_size=2*len(test_msgs[0])) as writer:
+        assert writer.n_msgs == 1
+        writer.write(test_msgs[1:2], msg_headers={'io_groups': test_io_groups[1:2]})
+        # not yet flushed, datasets may be larger than the data
+        assert writer.n_msgs == 2
+        writer.write(test_msgs[2:], msg_headers={'io_groups': test_io_groups[2:]})
+        # flushed by size, preallocated rows are kept but not read
+        assert len_rawfile(tmpfile) == 3
+        capacity = writer._capacity
+        assert capacity > 3
+        assert from_rawfile(tmpfile)['msgs'] == test_msgs
+        assert from_rawfile(tmpfile, start=-1)['msgs'] == test_msgs[-1:]
+        assert from_rawfile(tmpfile, mask=[True, False, True])['msgs'] == test_msgs[::2]
+        writer.write(test_msgs, msg_headers={'io_groups': test_io_groups})
+        writer.write(test_msgs)
+        assert writer.n_msgs == 9
+        # datasets are only grown, not trimmed, by flushes
+        assert writer._capacity >= capacity
+        writer.flush()
+        assert writer._capacity >= 9
+        assert writer.n_bytes == len(b''.join(test_msgs)) * 3 - len(test_msgs[0])
+    with h5py.File(tmpfile, 'r') as f:
+        # trimmed on close
+        assert len(f['msgs']) == 9
+    rd = from_rawfile(tmpfile)
+    assert rd['msgs'] == test_msgs * 3
+    assert rd['msg_headers']['io_groups'] == test_io_groups * 2 + [0, 0, 0]
+    assert writer.closed
+
+def test_rotating_raw_file_writer_v0_0(tmpfile, testdata):
+    test_io_groups, test_msgs = testdata
+    headers = {'io_groups': test_io_groups}
+    with RotatingRawFileWriter(tmpfile, max_msgs=4) as writer:
+        for _ in range(3):
+            writer.write(test_msgs, msg_headers=headers)
+        assert len(writer.filenames) == 2
+        writer.rotate()
+        writer.rotate()
+        writer.write(test_msgs[:1], msg_headers={'io_groups': test_io_groups[:1]})
+    assert writer.filenames == [tmpfile[:-3] + '_{:04d}.h5'.format(i) for i in range(3)]
+    manifest = load_manifest(tmpfile)
+    assert [entry['filename'] for entry in manifest] == writer.filenames
+    assert [entry['first_msg'] for entry in manifest] == [0, 6, 9]
+    assert [entry['n_msgs'] for entry in manifest] == [6, 3, 1]
+    assert all(entry['closed'] for entry in manifest)
+    assert all(entry['start_time'] <= entry['end_time'] for entry in manifest)
+    assert from_rawfile(manifest[0]['filename'])['msgs'] == test_msgs * 2
+    assert from_rawfile(manifest[2]['filename'])['msg_headers']['io_groups'] == [0]
+
+    # continue an existing sequence, rotating by size and duration
+    with RotatingRawFileWriter(tmpfile, max_bytes=len(test_msgs[0]) * 2,
+            max_duration=0) as writer:
+        writer.write(test_msgs[:1])
+        writer.write(test_msgs[:1])
+        assert len(writer.filenames) == 5
+    manifest = load_manifest(writer.manifest_filename)
+    assert [entry['first_msg'] for entry in manifest] == [0, 6, 9, 10, 11]
+    assert sum(len_rawfile(entry['filename']) for entry in manifest) == 12
+
+def test_shards_v0_1(tmpfile, testdata):
+    test_io_groups, test_msgs = testdata
+    index_filename = write_shard_index(tmpfile, io_groups=[1, 2, 3])
+    assert index_filename == tmpfile[:-3] + '_shards.json'
+    assert [shard['filename'] for shard in load_shard_index(tmpfile)] == \
+        [shard_filename(tmpfile, io_group) for io_group in [1, 2, 3]]
+    assert shard_filename(tmpfile, 2) == tmpfile[:-3] + '_iog2.h5'
+    # shard 3 is not created
+    assert len_rawfile(index_filename) == 0
+    assert from_rawfile(index_filename)['msgs'] == []
+
+    to_rawfile(shard_filename(tmpfile, 1), msgs=test_msgs[0::2],
+        msg_headers={'io_groups': [1, 1], 'stream_index': [0, 3]}, version='0.1')
+    with RotatingRawFileWriter(shard_filename(tmpfile, 2), max_msgs=1, version='0.1') as writer:
+        writer.write(test_msgs[1:2], msg_headers={'io_groups': [2], 'stream_index': [1]})
+        writer.write(test_msgs[2:], msg_headers={'io_groups': [2], 'stream_index': [2]})
+    msgs = [test_msgs[0], test_msgs[1], test_msgs[2], test_msgs[2]]
+    assert len_rawfile(index_filename) == 4
+    rd = from_rawfile(index_filename)
+    assert rd['version'] == '0.1'
+    assert rd['msgs'] == msgs
+    assert rd['msg_headers']['io_groups'] == [1, 2, 2, 1]
+    assert rd['msg_headers']['stream_index'] == [0, 1, 2, 3]
+    rd = from_rawfile(index_filename, start=1, end=-1)
+    assert rd['msgs'] == msgs[1:-1]
+    rd = from_rawfile(index_filename, mask=[True, False, False, True], msg_headers_only=True)
+    assert rd['msgs'] is None
+    assert rd['msg_headers']['io_groups'] == [1, 1]
+
+    to_rawfile(shard_filename(tmpfile, 3), msgs=test_msgs[:1], version='0.0')
+    with pytest.raises(RuntimeError):
+        from_rawfile(index_filename)
+
+def test_shards_block_read_v0_1(tmpfile, testdata):
+    from larpix.format import rawhdf5format
+    test_io_groups, test_msgs = testdata
+    index_filename = write_shard_index(tmpfile, io_groups=[1, 2])
+    msgs = [test_msgs[i % len(test_msgs)] + bytes([i]) for i in range(20)]
+    for io_group in (1, 2):
+        to_rawfile(shard_filename(tmpfile, io_group), msgs=msgs[io_group-1::2],
+            msg_headers={'io_groups': [io_group]*10, 'stream_index': list(range(io_group-1, 20, 2))},
+            version='0.1')
+
+    # the merged order is computed once and reused for each block
+    blocks = [from_rawfile(index_filename, start=i, end=i+3)['msgs'] for i in range(0, 20, 3)]
+    assert [msg for block in blocks for msg in block] == msgs
+    shard_order = rawhdf5format._shard_order(index_filename)
+    order = shard_order.order
+    assert from_rawfile(index_filename, start=18)['msgs'] == msgs[18:]
+    assert rawhdf5format._shard_order(index_filename) is shard_order
+    assert shard_order.order is order
+
+    # data appended to a shard are merged in
+    to_rawfile(shard_filename(tmpfile, 2), msgs=[b'new'],
+        msg_headers={'io_groups': [2], 'stream_index': [20]})
+    assert len_rawfile(index_filename) == 21
+    rd = from_rawfile(index_filename, start=19, end=21)
+    assert rd['msgs'] == [msgs[19], b'new']
+    assert rd['msg_headers']['stream_index'] == [19, 20]
+
+def test_default_version(tmpfile, testdata):
+    test_io_groups, test_msgs = testdata
+    # unsharded files do not need the stream_index of v0.1
+    to_rawfile(tmpfile, msgs=test_msgs)
+    rd = from_rawfile(tmpfile)
+    assert rd['version'] == '0.0'
+    assert 'stream_index' not in rd['msg_headers']
@@ -0,0 +1,111 @@
+import os
+import time
+
+import pytest
+
+from larpix import Controller, Packet_v2, PacketArray
+from larpix.io import ReplayIO
+import larpix.format.pacman_msg_format as pacman_msg_format
+from larpix.format.rawhdf5format import to_rawfile
+
+def _msg(chip_id, timestamp):
+    p = Packet_v2()
+    p.chip_id = chip_id
+    msg = bytearray(pacman_msg_format.format([p], msg_type='DATA'))
+    header = pacman_msg_format.msg_header_struct.unpack(msg[:pacman_msg_format.HEADER_LEN])
+    pacman_msg_format.msg_header_struct.pack_into(msg, 0, header[0], timestamp, *header[2:])
+    return bytes(msg)
+
+@pytest.fixture
+def raw_file(tmpdir):
+    filename = str(tmpdir.join('raw.h5'))
+    # 2 messages in the first second, 1 in the next
+    msgs = [_msg(1, 1000), _msg(2, 1000), _msg(3, 1001)]
+    to_rawfile(filename, msgs=msgs, msg_headers={'io_groups': [1, 2, 1]})
+    return filename, msgs
+
+def test_replay_max_speed(raw_file):
+    filename, msgs = raw_file
+    io = ReplayIO(filename, speed=None, block_size=2)
+    assert io.n_msgs == 3
+    c = Controller()
+    c.io = io
+    c.start_listening()
+    packets, bytestream = c.read()
+    assert bytestream == b''.join(msgs[:2])
+    assert packets == pacman_msg_format.parse(msgs[0], io_group=1) \
+        + pacman_msg_format.parse(msgs[1], io_group=2)
+    assert not io.is_finished
+    packets, bytestream = c.read(as_array=True)
+    assert isinstance(packets, PacketArray)
+    assert bytestream == msgs[2]
+    assert packets.extract('chip_id', packet_type=0).tolist() == [3]
+    assert io.is_finished
+    assert c.read() == ([], b'')
+    c.stop_listening()
+    assert io.n_replayed == 3
+
+def test_replay_real_time(raw_file):
+    filename, msgs = raw_file
+    io = ReplayIO(filename, speed=4)
+    assert io.empty_queue() == ([], b'') # not listening
+    io.start_listening()
+    packets, bytestream = io.empty_queue()
+    assert bytestream == b''.join(msgs[:2])
+    time.sleep(0.1)
+    assert io.empty_queue()[1] == b''
+    # paused while not listening
+    io.stop_listening()
+    time.sleep(0.3)
+    assert io.empty_queue()[1] == b''
+    io.start_listening()
+    time.sleep(0.3)
+    assert io.empty_queue()[1] == msgs[2]
+    assert io.is_finished
+
+def test_replay_loop(raw_file):
+    filename, msgs = raw_file
+    io = ReplayIO(filename, speed=None, block_size=2, loop=True)
+    io.start_listening()
+    bytestreams = [io.empty_queue()[1] for _ in range(3)]
+    assert b''.join(bytestreams) == b''.join(msgs * 2)
+    assert not io.is_finished
+
+    io = ReplayIO(filename, speed=4, loop=True)
+    io.start_listening()
+    time.sleep(0.6)
+    # first pass at 0 and 1 s, second pass at 2 and 3 s
+    assert io.empty_queue()[1] == b''.join(msgs + msgs[:2])
+
+def test_replay_loop_empty_block(raw_file):
+    filename, msgs = raw_file
+    io = ReplayIO(filename, speed=None, block_size=2, loop=True)
+    # the file is replaced by a shorter one, so the last block is empty
+    os.remove(filename)
+    to_rawfile(filename, msgs=msgs[:2], msg_headers={'io_groups': [1, 2]})
+    io.start_listening()
+    assert io.empty_queue()[1] == b''.join(msgs[:2])
+    assert io.empty_queue()[1] == b''.join(msgs[:2])
+    assert not io.is_finished
+
+def test_replay_shards(tmpdir):
+    from larpix.format import rawhdf5format
+    filename = str(tmpdir.join('raw.h5'))
+    index_filename = rawhdf5format.write_shard_index(filename, io_groups=[1, 2])
+    msgs = [_msg(i, 1000 + i) for i in range(6)]
+    for io_group in (1, 2):
+        to_rawfile(rawhdf5format.shard_filename(filename, io_group),
+            msgs=msgs[io_group-1::2], msg_headers={'io_groups': [io_group]*3,
+            'stream_index': list(range(io_group-1, 6, 2))}, version='0.1')
+    io = ReplayIO(index_filename, speed=None, block_size=2)
+    io.start_listening()
+    assert io.empty_queue()[1] == b''.join(msgs[:2])
+    # later blocks reuse the merged order of the shards
+    shard_order = rawhdf5format._shard_order(index_filename)
+    order = shard_order.order
+    packets, bytestream = io.empty_queue()
+    assert bytestream == b''.join(msgs[2:4])
+    assert [p.io_group for p in packets if isinstance(p, Packet_v2)] == [1, 2]
+    assert io.empty_queue()[1] == b''.join(msgs[4:])
+    assert io.is_finished
+    assert rawhdf5format._shard_order(index_filename).order is order
@@ -53,6 +53,27 @@ def test_convert_rawhdf5_to_hdf5(tmpdir, raw_hdf5_tmpfile):
     orig_packets = [p_msg_fmt.parse(msg) for msg in r_h5_fmt.from_rawfile(raw_hdf5_tmpfile)['msgs']]
     assert new_packets == [p for pkts in orig_packets for p in pkts]
 
+def test_convert_rawhdf5_shards_to_hdf5(tmpdir, test_packets):
+    msgs = [p_msg_fmt.format([pkts]) for pkts in test_packets]
+    test_filename = os.path.join(tmpdir, 'raw_test.h5')
+    index_filename = r_h5_fmt.write_shard_index(test_filename, io_groups=[1, 2])
+    for io_group in (1, 2):
+        r_h5_fmt.to_rawfile(
+            r_h5_fmt.shard_filename(test_filename, io_group), msgs=msgs[io_group-1::2],
+            msg_headers={'io_groups': [io_group] * len(msgs[io_group-1::2]),
+                'stream_index': list(range(len(msgs)))[io_group-1::2]},
+            version=r_h5_fmt.shard_version
+            )
+    out_filename = os.path.join(tmpdir, 'datalog_convert_test.h5')
+    proc = subprocess.run(
+        ['python', os.path.join(_dir_,'../scripts/convert_rawhdf5_to_hdf5.py'), '-i', index_filename, '-o', out_filename, '--block_size', '10'],
+        check=True
+        )
+
+    new_packets = p_h5_fmt.from_file(out_filename)['packets']
+    orig_packets = [p for i, msg in enumerate(msgs) for p in p_msg_fmt.parse(msg, io_group=i % 2 + 1)]
+    assert new_packets == orig_packets
+
 def test_packet_hdf5_tool(tmpdir, packet_hdf5_tmpfile, test_packets):
     out_filename = os.path.join(tmpdir, 'datalog_tool_test.h5')
 
@@ -90,3 +111,10 @@ def test_raw_hdf5_tool(tmpdir, raw_hdf5_tmpfile, test_packets):
     # test read data
     assert r_h5_fmt.from_rawfile(raw_hdf5_tmpfile)['msgs'] + r_h5_fmt.from_rawfile(raw_hdf5_tmpfile)['msgs'] == r_h5_fmt.from_rawfile(out_filename)['msgs']
 
+
+def test_benchmark_pacman_io():
+    proc = subprocess.run(
+        ['python', os.path.join(_dir_,'../scripts/benchmark_pacman_io.py'), '--msg_rate', '100', '--duration', '1', '--as_array', '--packets_per_msg', '8', '--io_groups', '2'],
+        check=True, capture_output=True, text=True
+        )
+    assert 'received' in proc.stdout